@@ -1,2 +1,10 @@
 # -*- coding: utf-8 -*-
+from . import controllers
 from . import models
+from . import wizard
+
+
+def post_load():
+    """Rattache l'exécuteur de travaux au démarrage du serveur (module chargé via server_wide_modules)"""
+    from .jobrunner import install_runner
+    install_runner()
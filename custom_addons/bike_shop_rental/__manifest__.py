@@ -9,8 +9,15 @@
     'data': [
         'security/ir.model.access.csv',
         'data/bike_category_data.xml',
+        'data/ir_cron_data.xml',
         'views/bike_views.xml',
+        'views/bike_maintenance_views.xml',
+        'wizard/category_rate_wizard_views.xml',
         'views/rental_order_views.xml',
+        'views/rental_order_archive_views.xml',
+        'views/rental_lifecycle_views.xml',
+        'views/job_views.xml',
+        'views/profiling_views.xml',
         'views/menu_views.xml',
         'views/reports/rental_report_views.xml',
         'reports/rental_contract_report.xml',
@@ -22,8 +29,10 @@
     'assets': {
         'web.assets_backend': [
             'bike_shop_rental/static/src/scss/bike_shop.scss',
+            'bike_shop_rental/static/src/planning/*',
         ],
     },
+    'post_load': 'post_load',
     'installable': True,
     'application': True,
     'license': 'LGPL-3',
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+from werkzeug.exceptions import BadRequest
+from odoo import http, exceptions
+from odoo.http import request
+
+
+class FleetPlanningController(http.Controller):
+    """Planning de la flotte au format JSON, avec cache HTTP (ETag)"""
+
+    @http.route('/bike_shop_rental/planning', type='http', auth='user', methods=['GET'], readonly=True)
+    def planning(self, start, end, category_ids='', offset=0, limit=100):
+        """Contrats d'une page de vélos sur la fenêtre [start, end[ (dates UTC).
+
+        L'ETag est calculé à partir de l'empreinte de la fenêtre (vélos et
+        contrats modifiés) : un rechargement sans changement coûte un 304.
+        """
+        Bike = request.env['bike.bike']
+        Bike.check_access('read')
+        request.env['rental.order'].check_access('read')
+        try:
+            category_ids = [int(category_id) for category_id in category_ids.split(',') if category_id]
+            offset, limit = max(int(offset), 0), min(max(int(limit), 1), 500)
+            fingerprint = Bike._get_planning_fingerprint(start, end, category_ids)
+        except (ValueError, exceptions.ValidationError) as e:
+            raise BadRequest(str(e))
+
+        key = json.dumps([fingerprint, start, end, category_ids, offset, limit, request.env.uid])
+        etag = hashlib.sha1(key.encode()).hexdigest()
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache')]
+        if etag in request.httprequest.if_none_match:
+            return request.make_response('', headers=headers, status=304)
+        data = Bike.get_planning(start, end, category_ids, offset, limit)
+        return request.make_json_response(data, headers=headers)
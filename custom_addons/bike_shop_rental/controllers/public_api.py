@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import json
+from odoo import http, exceptions
+from odoo.http import request
+
+
+class BikeShopPublicApi(http.Controller):
+    """API publique : catégories, vélos disponibles et devis (lecture seule, JSON)"""
+
+    def _respond(self, kind, **params):
+        """Limite le débit puis sert la réponse depuis le cache partagé"""
+        Cache = request.env['bike.shop.api.cache'].sudo()
+        if not Cache._check_rate_limit(request.httprequest.remote_addr):
+            return self._error("Trop de requêtes, réessayez dans une minute.", 429, [('Retry-After', '60')])
+        try:
+            payload = Cache._serve(kind, **params)
+        except exceptions.ValidationError as e:
+            return self._error(str(e), 400)
+        except exceptions.MissingError as e:
+            return self._error(str(e), 404)
+        return request.make_response(payload, headers=[
+            ('Content-Type', 'application/json; charset=utf-8'),
+            ('Cache-Control', 'public, max-age=30'),
+        ])
+
+    def _error(self, message, status, headers=()):
+        return request.make_response(json.dumps({'error': message}), status=status, headers=[
+            ('Content-Type', 'application/json; charset=utf-8'), *headers,
+        ])
+
+    def _to_int(self, value):
+        try:
+            return int(value) if value else None
+        except ValueError:
+            raise exceptions.ValidationError(f"Identifiant invalide : {value}")
+
+    @http.route('/bike_shop_rental/api/categories', type='http', auth='public', methods=['GET'], cors='*')
+    def categories(self):
+        """Catégories et tarifs par défaut"""
+        return self._respond('categories')
+
+    @http.route('/bike_shop_rental/api/availability', type='http', auth='public', methods=['GET'], cors='*')
+    def availability(self, start=None, end=None, category_id=None, frame_size=None):
+        """Vélos libres sur [start, end] (UTC, AAAA-MM-JJ HH:MM:SS), filtrables par catégorie et taille"""
+        try:
+            category_id = self._to_int(category_id)
+        except exceptions.ValidationError as e:
+            return self._error(str(e), 400)
+        return self._respond('availability', start=start, end=end, category_id=category_id,
+                             frame_size=frame_size or None)
+
+    @http.route('/bike_shop_rental/api/quote', type='http', auth='public', methods=['GET'], cors='*')
+    def quote(self, start=None, end=None, category_id=None, bike_id=None):
+        """Tarif le moins cher d'un vélo ou d'une catégorie sur [start, end]"""
+        try:
+            category_id, bike_id = self._to_int(category_id), self._to_int(bike_id)
+        except exceptions.ValidationError as e:
+            return self._error(str(e), 400)
+        if not category_id and not bike_id:
+            return self._error("bike_id ou category_id est requis.", 400)
+        return self._respond('quote', start=start, end=end, category_id=category_id, bike_id=bike_id)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Exécuteur dédié de la file de travaux bike.shop.job.
+
+Rattaché au démarrage du serveur par le post_load du module lorsqu'il est
+chargé comme module serveur (server_wide_modules) et que bike_shop_job_runner
+est activé dans odoo.conf : il ne tourne que dans le serveur multi-thread ou
+dans les workers cron (prefork), jamais dans le processus maître, odoo-bin
+shell ni une mise à jour avec --stop-after-init. Plusieurs workers cron
+peuvent l'exécuter : les travaux sont pris avec SKIP LOCKED. Il écoute le canal PostgreSQL bike_shop_job (LISTEN) sur une connexion à part
+et vide la file à chaque notification, sans scruter la base à intervalles
+réguliers ; les workers HTTP ne sont jamais occupés par les travaux.
+
+Options odoo.conf :
+    bike_shop_job_runner = True
+    bike_shop_job_runner_db = bike_shop   (par défaut : db_name)
+"""
+import logging
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+import odoo
+from odoo import tools
+from odoo.tools import config
+
+from .models.job_queue import JOB_CHANNEL
+
+_logger = logging.getLogger(__name__)
+
+# Réveil de sécurité (travaux différés par eta) même sans notification
+IDLE_TIMEOUT = 60
+
+
+class JobRunner(threading.Thread):
+    """Thread d'exécution des travaux d'une base"""
+
+    def __init__(self, dbname):
+        super().__init__(name=f'bike_shop_job_runner.{dbname}', daemon=True)
+        self.dbname = dbname
+
+    def _listen(self):
+        """Connexion dédiée en autocommit abonnée au canal des travaux"""
+        __, connection_info = odoo.sql_db.connection_info_for(self.dbname)
+        connection = psycopg2.connect(**connection_info)
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cr:
+            cr.execute(f'LISTEN {JOB_CHANNEL}')
+        return connection
+
+    def _drain(self):
+        """Traite les travaux en file jusqu'à ce qu'elle soit vide"""
+        registry = odoo.modules.registry.Registry(self.dbname)
+        with registry.cursor() as cr:
+            env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+            if 'bike.shop.job' not in env:
+                return
+            while env['bike.shop.job']._process_next():
+                pass
+
+    def run(self):
+        while True:
+            connection = None
+            try:
+                connection = self._listen()
+                _logger.info("Exécuteur de travaux démarré sur la base %s", self.dbname)
+                while True:
+                    self._drain()
+                    if select.select([connection], [], [], IDLE_TIMEOUT) != ([], [], []):
+                        connection.poll()
+                        connection.notifies.clear()
+            except Exception:
+                _logger.exception("Exécuteur de travaux interrompu sur la base %s, reprise dans 10 s", self.dbname)
+                time.sleep(10)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def _with_runner(start):
+    """Enveloppe la méthode start d'un serveur ou d'un worker pour démarrer l'exécuteur ensuite"""
+    def start_with_runner(self, *args, **kwargs):
+        res = start(self, *args, **kwargs)
+        if not kwargs.get('stop'):
+            start_runner()
+        return res
+    return start_with_runner
+
+
+def install_runner():
+    """Démarre l'exécuteur avec le serveur multi-thread et avec chaque worker cron"""
+    from odoo.service import server
+    server.ThreadedServer.start = _with_runner(server.ThreadedServer.start)
+    server.WorkerCron.start = _with_runner(server.WorkerCron.start)
+
+
+def start_runner():
+    """Démarre l'exécuteur si activé dans la configuration (jamais pour --stop-after-init)"""
+    if not tools.str2bool(config.get('bike_shop_job_runner', False)) or config.get('stop_after_init'):
+        return
+    dbname = config.get('bike_shop_job_runner_db') or config.get('db_name')
+    if not dbname:
+        _logger.warning("bike_shop_job_runner activé sans base (bike_shop_job_runner_db / db_name)")
+        return
+    JobRunner(dbname.split(',')[0]).start()
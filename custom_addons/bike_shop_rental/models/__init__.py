@@ -1,5 +1,17 @@
 # -*- coding: utf-8 -*-
+from . import validation_mixin
+from . import numbering
+from . import job_queue
+from . import public_api
+from . import pricing_cache
 from . import bike_category
 from . import bike
+from . import bike_maintenance
 from . import rental_order
+from . import rental_order_archive
+from . import rental_lifecycle_run
 from . import rental_report
+from . import importer
+from . import dataset
+from . import benchmark
+from . import profiling
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import math
+import platform
+import statistics
+import time
+from datetime import timedelta
+from odoo import models, fields, api, exceptions, release
+
+_logger = logging.getLogger(__name__)
+
+
+class BikeShopBenchmark(models.AbstractModel):
+    """Mesure des chemins critiques sur la base courante.
+
+    Chaque mesure est une méthode _bench_<nom>(sample) qui prépare ses
+    données puis retourne la fonction à chronométrer ; seule cette fonction
+    (écritures en base comprises) est mesurée. Chaque exécution a lieu dans
+    un point de sauvegarde annulé ensuite : la base n'est pas modifiée.
+
+    À lancer depuis odoo-bin shell après bike.shop.dataset.generate :
+        env['bike.shop.benchmark'].run(output='/tmp/bench.json', label='<commit>')
+    """
+    _name = 'bike.shop.benchmark'
+    _description = 'Mesures de Performance Bike Shop'
+
+    @api.model
+    def run(self, names=None, repeat=5, sample=100, output=None, label=None):
+        """Exécute les mesures et retourne (et écrit si output) le résultat en JSON.
+
+        :param names: mesures à exécuter (toutes par défaut)
+        :param repeat: exécutions par mesure
+        :param sample: nombre d'enregistrements traités par exécution
+        :param output: chemin du fichier JSON produit
+        :param label: libellé de l'exécution (révision, branche...) pour comparer les runs
+        :return: dict {'label', 'date', 'environment', 'sizes', 'results', 'pricing_cache'}
+        """
+        if not self.env.is_system():
+            raise exceptions.AccessError("Les mesures de performance sont réservées aux administrateurs.")
+        available = sorted(name[len('_bench_'):] for name in dir(self) if name.startswith('_bench_'))
+        names = names or available
+        unknown = set(names) - set(available)
+        if unknown:
+            raise exceptions.UserError(f"Mesures inconnues : {', '.join(sorted(unknown))}")
+
+        self.env.flush_all()
+        report = {
+            'label': label,
+            'date': fields.Datetime.to_string(fields.Datetime.now()),
+            'environment': {
+                'odoo': release.version,
+                'python': platform.python_version(),
+                'database': self._cr.dbname,
+                'repeat': repeat,
+                'sample': sample,
+            },
+            'sizes': self._get_table_sizes(),
+            'results': {},
+        }
+        for name in names:
+            report['results'][name] = self._measure(name, repeat, sample)
+            _logger.info("Mesure %s : médiane %.3f s", name, report['results'][name]['median'])
+        report['pricing_cache'] = self.env['bike.shop.pricing.cache'].get_stats()
+        if output:
+            with open(output, 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2, ensure_ascii=False)
+        return report
+
+    @api.model
+    def _get_table_sizes(self):
+        """Volumes des tables mesurées"""
+        sizes = {}
+        for model in self._get_sized_models():
+            self._cr.execute(f'SELECT count(*) FROM "{self.env[model]._table}"')
+            sizes[model] = self._cr.fetchone()[0]
+        return sizes
+
+    @api.model
+    def _get_sized_models(self):
+        return ['bike.bike', 'rental.order', 'rental.order.archive', 'bike.maintenance',
+                'rental.report.daily', 'bike.occupancy.report']
+
+    @api.model
+    def _measure(self, name, repeat, sample):
+        """Chronomètre repeat exécutions de _bench_<name>, chacune annulée ensuite"""
+        durations = []
+        queries = []
+        for __ in range(repeat):
+            self._cr.execute("SAVEPOINT bike_shop_benchmark")
+            try:
+                func = getattr(self, f'_bench_{name}')(sample)
+                self.env.flush_all()
+                count_before = self._cr.sql_log_count
+                started = time.perf_counter()
+                func()
+                self.env.flush_all()
+                durations.append(time.perf_counter() - started)
+                queries.append(self._cr.sql_log_count - count_before)
+            finally:
+                self._cr.execute("ROLLBACK TO SAVEPOINT bike_shop_benchmark")
+                self.env.invalidate_all()
+        durations.sort()
+        return {
+            'runs': durations,
+            'min': durations[0],
+            'median': statistics.median(durations),
+            'p95': durations[max(0, math.ceil(0.95 * len(durations)) - 1)],
+            'max': durations[-1],
+            'queries': statistics.median(queries),
+        }
+
+    # ------------------------------------------------------------------
+    # Location
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_sample_bikes(self, sample):
+        """sample vélos actifs et confirmés tirés au hasard"""
+        self._cr.execute("""
+            SELECT id FROM bike_bike
+             WHERE active AND confirmation_state = 'confirmed' AND state != 'maintenance'
+             ORDER BY random()
+             LIMIT %s
+        """, [sample])
+        return self.env['bike.bike'].browse([row[0] for row in self._cr.fetchall()])
+
+    @api.model
+    def _get_sample_rental_vals(self, sample):
+        """Contrats d'un jour dans un an, un par vélo (aucun chevauchement possible)"""
+        start = fields.Datetime.now().replace(microsecond=0) + timedelta(days=365)
+        return [{
+            'bike_id': bike.id,
+            'customer_name': 'Client Mesure',
+            'start_date': start,
+            'end_date': start + timedelta(days=1),
+            'rental_type': 'daily',
+        } for bike in self._get_sample_bikes(sample)]
+
+    @api.model
+    def _bench_search_available(self, sample):
+        """sample recherches de disponibilité sur 3 jours, catégorie par catégorie (flotte du jeu généré)"""
+        Bike = self.env['bike.bike']
+        windows = self._get_sample_windows(sample)
+        category_ids = self.env['bike.category'].search([]).ids or [None]
+        # Flotte sélectionnable déjà dans le cache du worker
+        for category_id in category_ids:
+            Bike.search_available(*windows[0], category_id=category_id)
+
+        def search():
+            for i, (start, end) in enumerate(windows):
+                Bike.search_available(start, end, category_id=category_ids[i % len(category_ids)])
+        return search
+
+    @api.model
+    def _bench_rental_create(self, sample):
+        vals_list = self._get_sample_rental_vals(sample)
+        return lambda: self.env['rental.order'].create(vals_list)
+
+    @api.model
+    def _bench_rental_confirm(self, sample):
+        rentals = self.env['rental.order'].create(self._get_sample_rental_vals(sample))
+        return rentals.action_confirm
+
+    @api.model
+    def _bench_rental_start(self, sample):
+        rentals = self.env['rental.order'].create(self._get_sample_rental_vals(sample))
+        rentals.action_confirm()
+        return rentals.action_start_rental
+
+    @api.model
+    def _bench_rental_end(self, sample):
+        rentals = self.env['rental.order'].create(self._get_sample_rental_vals(sample))
+        rentals.action_confirm()
+        rentals.action_start_rental()
+        return rentals.action_end_rental
+
+    # Transitions mesurées du cycle de vie, dans l'ordre
+    _LIFECYCLE_ACTIONS = ('action_start_rental', 'action_end_rental', 'action_invoice', 'action_pay')
+
+    @api.model
+    def _bench_lifecycle_batched(self, sample):
+        """Démarrage, retour, facturation et paiement de sample contrats, par lot (_apply_transition)"""
+        rentals = self.env['rental.order'].create(self._get_sample_rental_vals(sample))
+        rentals.action_confirm()
+
+        def lifecycle():
+            for action in self._LIFECYCLE_ACTIONS:
+                getattr(rentals, action)()
+        return lifecycle
+
+    @api.model
+    def _bench_lifecycle_per_record(self, sample):
+        """Même cycle contrat par contrat, comme une boucle sur les enregistrements"""
+        rentals = self.env['rental.order'].create(self._get_sample_rental_vals(sample))
+        rentals.action_confirm()
+
+        def lifecycle():
+            for action in self._LIFECYCLE_ACTIONS:
+                for rental in rentals:
+                    getattr(rental, action)()
+        return lifecycle
+
+    @api.model
+    def _bench_rental_quote(self, sample):
+        """Devis de sample vélos sur 10 jours (tarifs servis par le cache du worker)"""
+        start = fields.Datetime.now()
+        requests = [{'bike_id': bike.id, 'start': start, 'end': start + timedelta(days=10)}
+                    for bike in self._get_sample_bikes(sample)]
+        return lambda: self.env['rental.order'].quote_batch(requests)
+
+    @api.model
+    def _bench_rental_quote_orm(self, sample):
+        """Mêmes devis par l'ORM (tarif journalier) : new() puis _compute_unit_price, _quantity et _subtotal"""
+        start = fields.Datetime.now()
+        bikes = self._get_sample_bikes(sample)
+        RentalOrder = self.env['rental.order']
+
+        def quote():
+            rentals = [RentalOrder.new({
+                'bike_id': bike.id,
+                'start_date': start,
+                'end_date': start + timedelta(days=10),
+                'rental_type': 'daily',
+            }) for bike in bikes]
+            return [rental.total_amount for rental in rentals]
+        return quote
+
+    @api.model
+    def _get_validation_samples(self, sample):
+        """Lots d'enregistrements new() dont les règles métier sont mesurées"""
+        RentalOrder = self.env['rental.order']
+        return [RentalOrder.concat(*[RentalOrder.new(dict(
+            vals, partner_email='client.mesure@example.com', partner_phone='+33 6 12 34 56 78',
+        )) for vals in self._get_sample_rental_vals(sample)])]
+
+    @api.model
+    def _bench_validation_mixin(self, sample):
+        """Règles métier de sample contrats (et commandes) évaluées en une passe (bike.shop.validation.mixin)"""
+        batches = self._get_validation_samples(sample)
+
+        def validate():
+            for records in batches:
+                records._run_validation_rules([rule for __, rule in records._validation_rules])
+        return validate
+
+    @api.model
+    def _bench_validation_constrains(self, sample):
+        """Mêmes règles à la manière des méthodes @api.constrains : une passe sur le lot par règle"""
+        batches = self._get_validation_samples(sample)
+
+        def validate():
+            for records in batches:
+                for __, rule in records._validation_rules:
+                    records._run_validation_rules([rule])
+        return validate
+
+    @api.model
+    def _bench_late_fees(self, sample):
+        """Un lot de sample contrats en retard (passe du planificateur)"""
+        RentalOrder = self.env['rental.order']
+        return lambda: RentalOrder._accrue_late_fees(fields.Datetime.now(), limit=sample)
+
+    @api.model
+    def _bench_maintenance_plan(self, sample):
+        """Planification de l'entretien de sample vélos ayant atteint le seuil de leur catégorie"""
+        bikes = self._get_sample_bikes(sample)
+        bikes.write({'hours_since_service': 1000.0})
+        bikes.category_id.write({'service_interval_hours': 100.0, 'service_duration': 4.0})
+        Maintenance = self.env['bike.maintenance']
+        now = fields.Datetime.now()
+
+        def plan():
+            for category in bikes.category_id:
+                Maintenance._plan_category(category, now, now + timedelta(days=30))
+        return plan
+
+    @api.model
+    def _bench_report_pivot(self, sample):
+        """Pivots du rapport de locations (catégorie x état, type x état)"""
+        Report = self.env['rental.report']
+
+        def pivot():
+            Report._read_group([], ['bike_category_id', 'state'], ['total_amount:sum', '__count'])
+            Report._read_group([], ['rental_type', 'state'], ['subtotal:sum', 'duration_days:sum'])
+        return pivot
+
+    @api.model
+    def _bench_occupancy_refresh(self, sample):
+        """Rafraîchissement de l'occupation de sample vélos"""
+        Occupancy = self.env['bike.occupancy.report']
+        Occupancy._mark_bikes_dirty(self._get_sample_bikes(sample).ids)
+        return lambda: Occupancy._refresh(limit=sample)
+
+    @api.model
+    def _bench_occupancy_pivot(self, sample):
+        Occupancy = self.env['bike.occupancy.report']
+        return lambda: Occupancy._read_group(
+            [('period_type', '=', 'month')], ['bike_category_id', 'period_start:month'], ['utilization:avg'])
+
+    # ------------------------------------------------------------------
+    # API publique
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_sample_windows(self, sample):
+        """sample fenêtres de 3 jours distinctes, dans les 6 prochains mois"""
+        start = fields.Datetime.now().replace(minute=0, second=0, microsecond=0)
+        return [(start + timedelta(hours=i * 43), start + timedelta(hours=i * 43, days=3)) for i in range(sample)]
+
+    @api.model
+    def _bench_api_availability_miss(self, sample):
+        """sample disponibilités calculées (cache vide)"""
+        Cache = self.env['bike.shop.api.cache']
+        windows = self._get_sample_windows(sample)
+        self._cr.execute("DELETE FROM bike_shop_api_cache")
+        return lambda: [Cache._serve('availability', start, end) for start, end in windows]
+
+    @api.model
+    def _bench_api_availability_hit(self, sample):
+        """sample disponibilités servies par le cache"""
+        Cache = self.env['bike.shop.api.cache']
+        windows = self._get_sample_windows(sample)
+        for start, end in windows:
+            Cache._serve('availability', start, end)
+        return lambda: [Cache._serve('availability', start, end) for start, end in windows]
+
+    @api.model
+    def load_test_api(self, base_url='http://localhost:8069', concurrency=8, seconds=10, output=None):
+        """Charge l'API publique d'un serveur en marche et mesure le débit soutenu.
+
+        concurrency clients HTTP enchaînent pendant seconds secondes des
+        requêtes de catégories, disponibilités et devis sur 50 fenêtres.
+        Désactiver le limiteur (bike_shop_rental.api_rate_limit = 0) avant
+        la mesure, tous les clients partageant la même adresse.
+
+        :return: dict {'requests', 'rps', 'statuses', 'p50', 'p95', 'max'} (latences en s)
+        """
+        import requests
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not self.env.is_system():
+            raise exceptions.AccessError("Les mesures de performance sont réservées aux administrateurs.")
+        category_ids = self.env['bike.category'].search([]).ids
+        paths = ['/bike_shop_rental/api/categories']
+        for start, end in self._get_sample_windows(50):
+            window = f"start={fields.Datetime.to_string(start)}&end={fields.Datetime.to_string(end)}"
+            paths.append(f"/bike_shop_rental/api/availability?{window}")
+            for category_id in category_ids:
+                paths.append(f"/bike_shop_rental/api/availability?{window}&category_id={category_id}")
+                paths.append(f"/bike_shop_rental/api/quote?{window}&category_id={category_id}")
+
+        deadline = time.monotonic() + seconds
+
+        def client(offset):
+            latencies, statuses = [], {}
+            session = requests.Session()
+            i = offset
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = session.get(base_url + paths[i % len(paths)], timeout=30)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                i += 1
+            return latencies, statuses
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(client, [i * len(paths) // concurrency for i in range(concurrency)]))
+        elapsed = time.monotonic() - started
+        latencies = sorted(latency for result in results for latency in result[0])
+        statuses = {}
+        for __, result_statuses in results:
+            for status, count in result_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+        report = {
+            'base_url': base_url,
+            'concurrency': concurrency,
+            'seconds': elapsed,
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed,
+            'statuses': statuses,
+            'p50': statistics.median(latencies) if latencies else None,
+            'p95': latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)] if latencies else None,
+            'max': latencies[-1] if latencies else None,
+        }
+        _logger.info("API publique : %.0f requêtes/s (%s clients)", report['rps'], concurrency)
+        if output:
+            with open(output, 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2)
+        return report
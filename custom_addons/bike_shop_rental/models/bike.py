@@ -1,5 +1,11 @@
 # -*- coding: utf-8 -*-
+import logging
+from collections import Counter
 from odoo import models, fields, api, exceptions
+from .public_api import FLEET_KINDS
+from .rental_order_archive import RENTAL_HISTORY_SQL
+
+_logger = logging.getLogger(__name__)
 
 
 class Bike(models.Model):
@@ -9,7 +15,7 @@ class Bike(models.Model):
     _order = 'name'
 
     name = fields.Char(string='Nom', required=True)
-    category_id = fields.Many2one('bike.category', string='Catégorie', required=True)
+    category_id = fields.Many2one('bike.category', string='Catégorie', required=True, index=True)
 
     # Caractéristiques
     model = fields.Char(string='Modèle')
@@ -37,39 +43,406 @@ class Bike(models.Model):
         ('maintenance', 'En Maintenance'),
     ], string='État', default='available', required=True)
 
-    # Tarification (hérite de la catégorie)
+    # Tarification (hérite de la catégorie sauf tarif personnalisé)
     hourly_rate = fields.Float(string='Tarif Horaire (€)', compute='_compute_rates', store=True, readonly=False)
     daily_rate = fields.Float(string='Tarif Journalier (€)', compute='_compute_rates', store=True, readonly=False)
     weekly_rate = fields.Float(string='Tarif Hebdomadaire (€)', compute='_compute_rates', store=True, readonly=False)
     monthly_rate = fields.Float(string='Tarif Mensuel (€)', compute='_compute_rates', store=True, readonly=False)
+    hourly_rate_override = fields.Boolean(string='Tarif horaire personnalisé')
+    daily_rate_override = fields.Boolean(string='Tarif journalier personnalisé')
+    weekly_rate_override = fields.Boolean(string='Tarif hebdomadaire personnalisé')
+    monthly_rate_override = fields.Boolean(string='Tarif mensuel personnalisé')
 
     # Informations complémentaires
     description = fields.Text(string='Description')
 
     # Statistiques
-    rental_count = fields.Integer(string='Nombre de Locations', compute='_compute_rental_count')
+    # Maintenu incrémentalement par rental.order (create / write / unlink)
+    rental_count = fields.Integer(string='Nombre de Locations', default=0, readonly=True, copy=False)
+
+    # Usage (maintenu incrémentalement au retour de chaque location, cf. _apply_usage_deltas)
+    usage_hours = fields.Float(string="Heures d'Utilisation", default=0.0, readonly=True, copy=False)
+    hours_since_service = fields.Float(string="Heures depuis l'Entretien", default=0.0, readonly=True, copy=False)
+    rentals_since_service = fields.Integer(string="Locations depuis l'Entretien", default=0, readonly=True, copy=False)
+    last_service_date = fields.Datetime(string='Dernier Entretien', readonly=True, copy=False)
+    maintenance_ids = fields.One2many('bike.maintenance', 'bike_id', string='Entretiens')
+
+    # Disponibilité sur la période passée en contexte (rental_start / rental_end)
+    is_available = fields.Boolean(
+        string='Disponible sur la période',
+        compute='_compute_is_available',
+        search='_search_is_available',
+    )
 
     active = fields.Boolean(string='Actif', default=True)
 
-    @api.depends('category_id.hourly_rate', 'category_id.daily_rate',
-                 'category_id.weekly_rate', 'category_id.monthly_rate')
+    # Tarifs hérités de la catégorie
+    _RATE_FIELDS = ('hourly_rate', 'daily_rate', 'weekly_rate', 'monthly_rate')
+
+    # Champs exposés ou filtrés par l'API publique (cf. bike.shop.api.cache)
+    _API_FIELDS = {'name', 'category_id', 'model', 'year', 'frame_size', 'color',
+                   'confirmation_state', 'state', 'active', *_RATE_FIELDS}
+
+    # Compteurs de flotte, recherche de disponibilité et regroupements du kanban
+    _category_state_idx = models.Index('(category_id, state) WHERE active')
+
+    def init(self):
+        """Marque comme personnalisés les tarifs qui diffèrent déjà de leur catégorie"""
+        for rate in self._RATE_FIELDS:
+            self._cr.execute(f"""
+                UPDATE bike_bike b
+                   SET {rate}_override = TRUE
+                  FROM bike_category c
+                 WHERE b.category_id = c.id
+                   AND NOT COALESCE(b.{rate}_override, FALSE)
+                   AND b.{rate} IS DISTINCT FROM c.{rate}
+            """)
+
+    @api.depends('category_id', 'hourly_rate_override', 'daily_rate_override',
+                 'weekly_rate_override', 'monthly_rate_override')
     def _compute_rates(self):
-        """Hérite les tarifs de la catégorie"""
+        """Hérite les tarifs de la catégorie, sauf ceux personnalisés sur le vélo.
+
+        Les changements de tarif d'une catégorie sont propagés en une seule
+        requête par bike.category.write (cf. _propagate_rates).
+        """
         for bike in self:
             if bike.category_id:
-                if not bike.hourly_rate:
-                    bike.hourly_rate = bike.category_id.hourly_rate
-                if not bike.daily_rate:
-                    bike.daily_rate = bike.category_id.daily_rate
-                if not bike.weekly_rate:
-                    bike.weekly_rate = bike.category_id.weekly_rate
-                if not bike.monthly_rate:
-                    bike.monthly_rate = bike.category_id.monthly_rate
-
-    def _compute_rental_count(self):
-        """Compte le nombre de locations pour ce vélo"""
+                for rate in self._RATE_FIELDS:
+                    if not bike[f'{rate}_override']:
+                        bike[rate] = bike.category_id[rate]
+
+    @api.model
+    def _apply_rental_count_deltas(self, deltas):
+        """Applique des variations au nombre de locations.
+
+        :param deltas: dict {bike_id: variation}
+        """
+        deltas = {bike_id: delta for bike_id, delta in deltas.items() if bike_id and delta}
+        if not deltas:
+            return
+        self._cr.execute("""
+            UPDATE bike_bike b
+               SET rental_count = b.rental_count + d.delta
+              FROM unnest(%s::int[], %s::int[]) AS d(id, delta)
+             WHERE b.id = d.id
+        """, [list(deltas), list(deltas.values())])
+        self.invalidate_model(['rental_count'])
+
+    def _recompute_rental_count(self):
+        """Recalcule le nombre de locations, archivées comprises (tous les vélos si vide), en une requête groupée.
+
+        :return: ids des vélos dont le compteur était faux
+        """
+        self.env['rental.order'].flush_model(['bike_id'])
+        self.flush_model(['rental_count'])
+        # Le filtre est répété dans le regroupement pour ne lire que l'index bike_id des vélos demandés
+        where_ids = "AND b.id IN %(ids)s" if self else ""
+        where_history_ids = "AND bike_id IN %(ids)s" if self else ""
+        self._cr.execute(f"""
+            UPDATE bike_bike b
+               SET rental_count = COALESCE(g.total, 0)
+              FROM bike_bike b2
+              LEFT JOIN (
+                    SELECT bike_id, COUNT(*) AS total
+                      FROM {RENTAL_HISTORY_SQL} ro
+                     WHERE bike_id IS NOT NULL {where_history_ids}
+                     GROUP BY bike_id
+                   ) g ON g.bike_id = b2.id
+             WHERE b.id = b2.id {where_ids}
+               AND b.rental_count IS DISTINCT FROM COALESCE(g.total, 0)
+         RETURNING b.id
+        """, {'ids': tuple(self.ids)})
+        stale_ids = [row[0] for row in self._cr.fetchall()]
+        self.invalidate_model(['rental_count'])
+        return stale_ids
+
+    @api.model
+    def _apply_usage_deltas(self, deltas):
+        """Ajoute l'usage des locations terminées aux compteurs des vélos.
+
+        :param deltas: dict {bike_id: (heures, locations)}
+        """
+        deltas = {bike_id: delta for bike_id, delta in deltas.items() if bike_id and any(delta)}
+        if not deltas:
+            return
+        self._cr.execute("""
+            UPDATE bike_bike b
+               SET usage_hours = COALESCE(b.usage_hours, 0) + d.hours,
+                   hours_since_service = COALESCE(b.hours_since_service, 0) + d.hours,
+                   rentals_since_service = COALESCE(b.rentals_since_service, 0) + d.rentals
+              FROM unnest(%s::int[], %s::float8[], %s::int[]) AS d(id, hours, rentals)
+             WHERE b.id = d.id
+        """, [list(deltas), [delta[0] for delta in deltas.values()], [delta[1] for delta in deltas.values()]])
+        self.invalidate_model(['usage_hours', 'hours_since_service', 'rentals_since_service'])
+
+    def _recompute_usage(self):
+        """Recalcule les compteurs d'usage depuis l'historique, archives comprises (tous les vélos si vide).
+
+        :return: ids des vélos dont un compteur était faux
+        """
+        self.env['rental.order'].flush_model(['bike_id', 'state', 'start_date', 'actual_return_date'])
+        self.flush_model(['usage_hours', 'hours_since_service', 'rentals_since_service', 'last_service_date'])
+        where_ids = "AND b.id IN %s" if self else ""
+        self._cr.execute(f"""
+            UPDATE bike_bike b
+               SET usage_hours = COALESCE(g.hours, 0),
+                   hours_since_service = COALESCE(g.hours_since, 0),
+                   rentals_since_service = COALESCE(g.rentals_since, 0)
+              FROM bike_bike b2
+              LEFT JOIN (
+                    SELECT ro.bike_id,
+                           SUM(ro.hours) AS hours,
+                           SUM(ro.hours) FILTER (WHERE ro.since_service) AS hours_since,
+                           COUNT(*) FILTER (WHERE ro.since_service) AS rentals_since
+                      FROM (
+                            SELECT h.bike_id,
+                                   GREATEST(EXTRACT(EPOCH FROM h.actual_return_date - h.start_date) / 3600, 0) AS hours,
+                                   bb.last_service_date IS NULL OR h.actual_return_date > bb.last_service_date
+                                       AS since_service
+                              FROM {RENTAL_HISTORY_SQL} h
+                              JOIN bike_bike bb ON bb.id = h.bike_id
+                             WHERE h.state IN ('done', 'invoiced', 'paid')
+                               AND h.start_date IS NOT NULL
+                               AND h.actual_return_date IS NOT NULL
+                           ) ro
+                     GROUP BY ro.bike_id
+                   ) g ON g.bike_id = b2.id
+             WHERE b.id = b2.id {where_ids}
+               AND (round(COALESCE(b.usage_hours, 0)::numeric, 2),
+                    round(COALESCE(b.hours_since_service, 0)::numeric, 2),
+                    COALESCE(b.rentals_since_service, 0))
+                   IS DISTINCT FROM (round(COALESCE(g.hours, 0)::numeric, 2),
+                                     round(COALESCE(g.hours_since, 0)::numeric, 2),
+                                     COALESCE(g.rentals_since, 0))
+         RETURNING b.id
+        """, [tuple(self.ids)] if self else [])
+        stale_ids = [row[0] for row in self._cr.fetchall()]
+        self.invalidate_model(['usage_hours', 'hours_since_service', 'rentals_since_service'])
+        return stale_ids
+
+    def _mark_serviced(self):
+        """Remet à zéro les compteurs depuis l'entretien et clôt les entretiens en cours"""
+        now = fields.Datetime.now()
+        self.write({'hours_since_service': 0.0, 'rentals_since_service': 0, 'last_service_date': now})
+        self.env['bike.maintenance'].search([
+            ('bike_id', 'in', self.ids),
+            ('state', '=', 'ongoing'),
+        ])._mark_done()
+
+    def _get_pricing_namespaces(self, vals):
+        """Espaces du cache des tarifs (bike.shop.pricing.cache) que vals rend périmés"""
+        namespaces = []
+        # Le cache ne lit que les tarifs eux-mêmes (cf. _get_rates)
+        if set(self._RATE_FIELDS) & set(vals):
+            namespaces.append('rates')
+        # Loué / disponible ne change pas la flotte sélectionnable, la maintenance si
+        if {'category_id', 'active', 'confirmation_state', 'frame_size'} & set(vals) or (
+                'state' in vals and 'maintenance' in [vals['state'], *self.mapped('state')]):
+            namespaces.append('fleet')
+        return namespaces
+
+    def _invalidate_api_cache(self):
+        """Invalide les réponses de l'API publique des catégories de ces vélos"""
+        self.env['bike.shop.api.cache']._invalidate(
+            FLEET_KINDS, [(category.id, None, None) for category in self.category_id])
+
+    def _get_fleet_count_keys(self):
+        """Retourne le nombre de vélos actifs par (catégorie, état)"""
+        return Counter((bike.category_id.id, bike.state) for bike in self if bike.active)
+
+    @api.model
+    def _cron_reconcile_counters(self):
+        """Vérifie les compteurs stockés contre les données réelles et corrige les écarts"""
+        bikes = self.with_context(active_test=False).browse()
+        stale_bikes = set(bikes._recompute_rental_count()) | set(bikes._recompute_usage())
+        stale_categories = self.env['bike.category'].browse()._recompute_fleet_counts()
+        if stale_bikes or stale_categories:
+            _logger.warning(
+                "Compteurs corrigés : %s vélo(s), %s catégorie(s)",
+                len(stale_bikes), len(stale_categories),
+            )
+
+    def _get_context_period(self):
+        """Retourne la période (début, fin) transmise par le contexte du formulaire de location"""
+        start = self.env.context.get('rental_start')
+        end = self.env.context.get('rental_end')
+        if start and end:
+            return fields.Datetime.to_datetime(start), fields.Datetime.to_datetime(end)
+        now = fields.Datetime.now()
+        return now, now
+
+    def _compute_is_available(self):
+        """Indique si le vélo est libre sur la période du contexte (une seule requête)"""
+        start, end = self._get_context_period()
+        available = self.search_available(start, end)
         for bike in self:
-            bike.rental_count = self.env['rental.order'].search_count([('bike_id', '=', bike.id)])
+            bike.is_available = bike in available
+
+    def _search_is_available(self, operator, value):
+        """Permet d'utiliser is_available dans un domaine (sélection du vélo sur un contrat)"""
+        if operator not in ('=', '!=') or not isinstance(value, bool):
+            raise exceptions.UserError("Opération non supportée sur la disponibilité.")
+        start, end = self._get_context_period()
+        available_ids = self.search_available(start, end).ids
+        if (operator == '=') == value:
+            return [('id', 'in', available_ids)]
+        return [('id', 'not in', available_ids)]
+
+    @api.model
+    def search_available(self, start, end, category_id=None, frame_size=None):
+        """Retourne les vélos libres entre start et end.
+
+        Les vélos sélectionnables viennent du cache du worker
+        (bike.shop.pricing.cache) ; une seule requête SQL sur la colonne
+        rental_order.rental_period (tsrange) indexée en GiST écarte ceux
+        qu'un contrat confirmé ou en cours, ou un entretien planifié, occupe
+        sur la période demandée.
+        """
+        start = fields.Datetime.to_datetime(start)
+        end = fields.Datetime.to_datetime(end)
+        if not start or not end or end < start:
+            raise exceptions.ValidationError("La période de disponibilité demandée n'est pas valide.")
+        candidate_ids = [
+            bike_id for bike_id, bike_frame_size in self.env['bike.shop.pricing.cache']._get_fleet(category_id)
+            if not frame_size or bike_frame_size == frame_size
+        ]
+        if not candidate_ids:
+            return self.browse()
+        busy_ids = self._get_busy_bike_ids(candidate_ids, start, end)
+        return self.browse([bike_id for bike_id in candidate_ids if bike_id not in busy_ids])
+
+    @api.model
+    def _get_busy_bike_ids(self, bike_ids, start, end):
+        """Ids des vélos de bike_ids occupés entre start et end (contrat bloquant ou entretien planifié)"""
+        RentalOrder = self.env['rental.order']
+        RentalOrder.flush_model(['bike_id', 'start_date', 'end_date', 'state'])
+        self.env['bike.maintenance'].flush_model(['bike_id', 'start_date', 'end_date', 'state'])
+        # Une période de durée nulle est traitée comme un instant ('[]')
+        bounds = '[)' if end > start else '[]'
+        self._cr.execute("""
+            SELECT bike_id
+              FROM rental_order
+             WHERE bike_id = ANY(%(bike_ids)s)
+               AND state IN %(states)s
+               AND rental_period && tsrange(%(start)s, %(end)s, %(bounds)s)
+             UNION
+            SELECT bike_id
+              FROM bike_maintenance
+             WHERE bike_id = ANY(%(bike_ids)s)
+               AND state = 'planned'
+               AND tsrange(start_date, end_date, '[)') && tsrange(%(start)s, %(end)s, %(bounds)s)
+        """, {
+            'bike_ids': list(bike_ids),
+            'states': tuple(RentalOrder._BLOCKING_STATES),
+            'start': start,
+            'end': end,
+            'bounds': bounds,
+        })
+        return {row[0] for row in self._cr.fetchall()}
+
+    # ------------------------------------------------------------------
+    # Planning de la flotte
+    # ------------------------------------------------------------------
+
+    _PLANNING_STATES = ('confirmed', 'ongoing', 'done', 'invoiced', 'paid')
+
+    @api.model
+    def _get_planning_window(self, start, end):
+        """Valide la fenêtre du planning (92 jours au plus)"""
+        start = fields.Datetime.to_datetime(start)
+        end = fields.Datetime.to_datetime(end)
+        if not start or not end or end <= start or (end - start).days > 92:
+            raise exceptions.ValidationError("La période du planning n'est pas valide (92 jours au plus).")
+        return start, end
+
+    @api.model
+    def _get_planning_fingerprint(self, start, end, category_ids=None):
+        """Empreinte du planning : nombre et dernière modification des vélos et des contrats de la fenêtre.
+
+        Deux requêtes d'index ; sert d'ETag pour répondre 304 sans recalculer le planning.
+        """
+        start, end = self._get_planning_window(start, end)
+        self.env['rental.order'].flush_model(['bike_id', 'start_date', 'end_date', 'state'])
+        self.flush_model(['active', 'state', 'category_id', 'name'])
+        category_filter = "AND b.category_id IN %(category_ids)s" if category_ids else ""
+        self._cr.execute(f"""
+            SELECT (SELECT concat(count(*), '/', max(b.write_date))
+                      FROM bike_bike b
+                     WHERE b.active {category_filter}),
+                   (SELECT concat(count(*), '/', max(ro.write_date))
+                      FROM rental_order ro
+                      JOIN bike_bike b ON b.id = ro.bike_id
+                     WHERE ro.state IN %(states)s
+                       AND ro.rental_period && tsrange(%(start)s, %(end)s, '[)')
+                       AND b.active {category_filter})
+        """, {
+            'states': self._PLANNING_STATES,
+            'start': start,
+            'end': end,
+            'category_ids': tuple(category_ids or ()),
+        })
+        return '|'.join(self._cr.fetchone())
+
+    @api.model
+    def get_planning(self, start, end, category_ids=None, offset=0, limit=100):
+        """Planning d'une page de vélos actifs sur [start, end[ en une requête.
+
+        Les contrats sont bornés à la fenêtre ; les dates sont en UTC.
+
+        :return: {'total': nombre de vélos, 'bikes': [{'id', 'name', 'state',
+                  'category_id', 'rentals': [{'id', 'name', 'customer', 'state', 'start', 'end'}]}]}
+        """
+        start, end = self._get_planning_window(start, end)
+        self.env['rental.order'].flush_model(['bike_id', 'start_date', 'end_date', 'state', 'name', 'customer_name'])
+        self.flush_model(['active', 'state', 'category_id', 'name'])
+        category_filter = "AND b.category_id IN %(category_ids)s" if category_ids else ""
+        self._cr.execute(f"""
+            WITH page AS (
+                SELECT b.id, b.name, b.state, b.category_id, count(*) OVER () AS total
+                  FROM bike_bike b
+                 WHERE b.active {category_filter}
+                 ORDER BY b.category_id, b.name, b.id
+                OFFSET %(offset)s
+                 LIMIT %(limit)s
+            )
+            SELECT page.id, page.name, page.state, page.category_id, page.total,
+                   COALESCE(json_agg(json_build_object(
+                        'id', ro.id,
+                        'name', ro.name,
+                        'customer', ro.customer_name,
+                        'state', ro.state,
+                        'start', to_char(lower(ro.rental_period * w.period), 'YYYY-MM-DD HH24:MI:SS'),
+                        'end', to_char(upper(ro.rental_period * w.period), 'YYYY-MM-DD HH24:MI:SS')
+                   ) ORDER BY lower(ro.rental_period)) FILTER (WHERE ro.id IS NOT NULL), '[]')
+              FROM page
+             CROSS JOIN (SELECT tsrange(%(start)s, %(end)s, '[)') AS period) w
+              LEFT JOIN rental_order ro
+                ON ro.bike_id = page.id
+               AND ro.state IN %(states)s
+               AND ro.rental_period && w.period
+             GROUP BY page.id, page.name, page.state, page.category_id, page.total
+             ORDER BY page.category_id, page.name, page.id
+        """, {
+            'states': self._PLANNING_STATES,
+            'start': start,
+            'end': end,
+            'category_ids': tuple(category_ids or ()),
+            'offset': offset,
+            'limit': limit,
+        })
+        rows = self._cr.fetchall()
+        return {
+            'total': rows[0][4] if rows else self.search_count(
+                [('category_id', 'in', category_ids)] if category_ids else []),
+            'bikes': [{
+                'id': bike_id,
+                'name': name,
+                'state': state,
+                'category_id': category_id,
+                'rentals': rentals,
+            } for bike_id, name, state, category_id, _total, rentals in rows],
+        }
 
     def action_confirm_and_return(self):
         """Confirme le vélo et retourne à la liste"""
@@ -83,8 +456,10 @@ class Bike(models.Model):
         }
 
     def action_set_available(self):
-        """Marque le vélo comme disponible"""
+        """Marque le vélo comme disponible (au retour de maintenance, il est considéré entretenu)"""
+        serviced = self.filtered(lambda bike: bike.state == 'maintenance')
         self.write({'state': 'available'})
+        serviced._mark_serviced()
 
     def action_set_maintenance(self):
         """Envoie le vélo en maintenance"""
@@ -100,13 +475,88 @@ class Bike(models.Model):
             'domain': [('bike_id', '=', self.id)],
         }
 
+    def action_view_maintenances(self):
+        """Ouvre les entretiens de ce vélo"""
+        return {
+            'name': f'Entretiens de {self.name}',
+            'type': 'ir.actions.act_window',
+            'res_model': 'bike.maintenance',
+            'view_mode': 'list,form',
+            'domain': [('bike_id', '=', self.id)],
+            'context': {'default_bike_id': self.id},
+        }
+
     @api.model_create_multi
     def create(self, vals_list):
-        """Génère automatiquement le numéro de série"""
+        """Génère automatiquement les numéros de série (un bloc pour tout le lot)"""
+        self.env['bike.shop.numbering']._assign_numbers(
+            vals_list, 'serial_number', 'bike.bike.serial', False, 'SN000001')
         for vals in vals_list:
-            if not vals.get('serial_number'):
-                vals['serial_number'] = self.env['ir.sequence'].next_by_code('bike.bike.serial') or 'SN000001'
-        return super().create(vals_list)
+            # Un tarif saisi différent de celui de la catégorie est personnalisé
+            category = self.env['bike.category'].browse(vals.get('category_id'))
+            for rate in self._RATE_FIELDS:
+                if rate in vals and f'{rate}_override' not in vals and vals[rate] != category[rate]:
+                    vals[f'{rate}_override'] = True
+        bikes = super().create(vals_list)
+        self.env['bike.category']._apply_fleet_count_deltas(bikes._get_fleet_count_keys())
+        # Un vélo brouillon n'entre pas dans la flotte sélectionnable
+        if any(bike.active and bike.confirmation_state == 'confirmed' and bike.state != 'maintenance'
+               for bike in bikes):
+            self.env['bike.shop.pricing.cache']._invalidate(['fleet'])
+        bikes._invalidate_api_cache()
+        return bikes
+
+    def write(self, vals):
+        """Répercute les changements de catégorie / état / archivage sur les compteurs"""
+        # Un tarif saisi différent de celui de la catégorie cible est personnalisé
+        # (un changement de catégorie renvoie les tarifs recalculés par l'onchange)
+        rates = [rate for rate in self._RATE_FIELDS if rate in vals and f'{rate}_override' not in vals]
+        if rates and self:
+            if 'category_id' in vals:
+                groups = {self.env['bike.category'].browse(vals['category_id']): self}
+            else:
+                groups = self.grouped('category_id')
+            if len(groups) > 1:
+                for bikes in groups.values():
+                    bikes.write(vals)
+                return True
+            [category] = groups
+            vals = dict(vals, **{f'{rate}_override': True for rate in rates if vals[rate] != category[rate]})
+        namespaces = self._get_pricing_namespaces(vals)
+        if namespaces:
+            self.env['bike.shop.pricing.cache']._invalidate(namespaces)
+        if self._API_FIELDS & set(vals):
+            self._invalidate_api_cache()
+            if 'category_id' in vals:
+                self.env['bike.shop.api.cache']._invalidate(FLEET_KINDS, [(vals['category_id'], None, None)])
+        if not {'category_id', 'state', 'active'} & set(vals):
+            return super().write(vals)
+        before = self._get_fleet_count_keys()
+        if 'category_id' in vals:
+            Daily = self.env['rental.report.daily']
+            # Le cumul compte aussi les contrats archivés (mêmes champs que rental.order)
+            rentals = [
+                *self.env['rental.order'].search([('bike_id', 'in', self.ids)]),
+                *self.env['rental.order.archive'].search([('bike_id', 'in', self.ids)]),
+            ]
+            contributions_before = Daily._get_contributions(rentals)
+        res = super().write(vals)
+        after = self._get_fleet_count_keys()
+        after.subtract(before)
+        self.env['bike.category']._apply_fleet_count_deltas(after)
+        if 'category_id' in vals:
+            Daily._apply_contributions(contributions_before, Daily._get_contributions(rentals))
+            self.env['bike.occupancy.report']._mark_bikes_dirty(self.ids)
+        return res
+
+    def unlink(self):
+        """Décrémente les compteurs des catégories"""
+        before = self._get_fleet_count_keys()
+        self.env['bike.shop.pricing.cache']._invalidate(['rates', 'fleet'])
+        self._invalidate_api_cache()
+        res = super().unlink()
+        self.env['bike.category']._apply_fleet_count_deltas({key: -count for key, count in before.items()})
+        return res
 
     @api.constrains('hourly_rate', 'daily_rate', 'weekly_rate', 'monthly_rate')
     def _check_rates(self):
@@ -129,6 +579,4 @@ class Bike(models.Model):
                     "Le tarif mensuel ne peut pas être négatif."
                 )
 
-    _sql_constraints = [
-        ('serial_number_unique', 'UNIQUE(serial_number)', 'Le numéro de série doit être unique!')
-    ]
+    _serial_number_unique = models.Constraint('UNIQUE(serial_number)', 'Le numéro de série doit être unique!')
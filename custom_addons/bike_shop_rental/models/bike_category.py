@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
 from odoo import models, fields, api, exceptions
+from .public_api import FLEET_KINDS
+
+_logger = logging.getLogger(__name__)
 
 
 class BikeCategory(models.Model):
@@ -18,20 +23,211 @@ class BikeCategory(models.Model):
     weekly_rate = fields.Float(string='Tarif Hebdomadaire (€)', default=100.0)
     monthly_rate = fields.Float(string='Tarif Mensuel (€)', default=300.0)
 
-    # Compteurs
-    bike_count = fields.Integer(
-        string='Nombre de Vélos',
-        compute='_compute_bike_count',
-        store=True
-    )
+    # Compteurs (maintenus incrémentalement par bike.bike, vélos actifs uniquement)
+    bike_count = fields.Integer(string='Nombre de Vélos', default=0, readonly=True, copy=False)
+    available_count = fields.Integer(string='Vélos Disponibles', default=0, readonly=True, copy=False)
+    rented_count = fields.Integer(string='Vélos Loués', default=0, readonly=True, copy=False)
+    maintenance_count = fields.Integer(string='Vélos en Maintenance', default=0, readonly=True, copy=False)
 
-    @api.depends('name')
-    def _compute_bike_count(self):
-        """Calcule le nombre de vélos dans cette catégorie"""
-        for category in self:
-            category.bike_count = self.env['bike.bike'].search_count([
-                ('category_id', '=', category.id)
-            ])
+    # Seuils d'entretien (0 : critère désactivé), cf. bike.maintenance._cron_plan
+    service_interval_hours = fields.Float(string="Entretien toutes les (heures d'utilisation)", default=0.0)
+    service_interval_rentals = fields.Integer(string='Entretien toutes les (locations)', default=0)
+    service_duration = fields.Float(string="Durée d'un Entretien (heures)", default=4.0)
+
+    @api.model
+    def _apply_fleet_count_deltas(self, deltas):
+        """Applique des variations (+1/-1) aux compteurs de flotte.
+
+        :param deltas: dict {(category_id, state): variation}
+        """
+        per_category = defaultdict(lambda: [0, 0, 0, 0])
+        for (category_id, state), delta in deltas.items():
+            if not category_id or not delta:
+                continue
+            counters = per_category[category_id]
+            counters[0] += delta
+            if state == 'available':
+                counters[1] += delta
+            elif state == 'rented':
+                counters[2] += delta
+            elif state == 'maintenance':
+                counters[3] += delta
+        per_category = {cid: c for cid, c in per_category.items() if any(c)}
+        if not per_category:
+            return
+        self._cr.execute("""
+            UPDATE bike_category c
+               SET bike_count = c.bike_count + d.total,
+                   available_count = c.available_count + d.available,
+                   rented_count = c.rented_count + d.rented,
+                   maintenance_count = c.maintenance_count + d.maintenance
+              FROM unnest(%s::int[], %s::int[], %s::int[], %s::int[], %s::int[])
+                   AS d(id, total, available, rented, maintenance)
+             WHERE c.id = d.id
+        """, [list(per_category)] + [[c[i] for c in per_category.values()] for i in range(4)])
+        self.invalidate_model(['bike_count', 'available_count', 'rented_count', 'maintenance_count'])
+
+    def _recompute_fleet_counts(self):
+        """Recalcule les compteurs des catégories (toutes si vide) en une requête groupée.
+
+        :return: ids des catégories dont les compteurs étaient faux
+        """
+        self.env['bike.bike'].flush_model(['category_id', 'state', 'active'])
+        self.flush_model(['bike_count', 'available_count', 'rented_count', 'maintenance_count'])
+        where_ids = "AND c.id IN %s" if self else ""
+        self._cr.execute(f"""
+            UPDATE bike_category c
+               SET bike_count = g.total,
+                   available_count = g.available,
+                   rented_count = g.rented,
+                   maintenance_count = g.maintenance
+              FROM (
+                    SELECT cat.id,
+                           COUNT(b.id) AS total,
+                           COUNT(b.id) FILTER (WHERE b.state = 'available') AS available,
+                           COUNT(b.id) FILTER (WHERE b.state = 'rented') AS rented,
+                           COUNT(b.id) FILTER (WHERE b.state = 'maintenance') AS maintenance
+                      FROM bike_category cat
+                      LEFT JOIN bike_bike b ON b.category_id = cat.id AND b.active
+                     GROUP BY cat.id
+                   ) g
+             WHERE c.id = g.id {where_ids}
+               AND (c.bike_count, c.available_count, c.rented_count, c.maintenance_count)
+                   IS DISTINCT FROM (g.total, g.available, g.rented, g.maintenance)
+         RETURNING c.id
+        """, [tuple(self.ids)] if self else [])
+        stale_ids = [row[0] for row in self._cr.fetchall()]
+        self.invalidate_model(['bike_count', 'available_count', 'rented_count', 'maintenance_count'])
+        return stale_ids
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Invalide la liste des catégories de l'API publique"""
+        categories = super().create(vals_list)
+        categories._invalidate_api_cache()
+        return categories
+
+    def write(self, vals):
+        """Propage les nouveaux tarifs aux vélos non personnalisés"""
+        self._invalidate_api_cache()
+        rate_fields = [rate for rate in self.env['bike.bike']._RATE_FIELDS if rate in vals]
+        if rate_fields:
+            self.env['bike.shop.pricing.cache']._invalidate(['rates'])
+        res = super().write(vals)
+        if rate_fields:
+            self._propagate_rates(rate_fields)
+        return res
+
+    def unlink(self):
+        """Invalide les réponses de l'API publique des catégories supprimées"""
+        self._invalidate_api_cache()
+        self.env['bike.shop.pricing.cache']._invalidate(['rates', 'fleet'])
+        return super().unlink()
+
+    def _invalidate_api_cache(self):
+        """Invalide les réponses de l'API publique de ces catégories"""
+        self.env['bike.shop.api.cache']._invalidate(FLEET_KINDS, [(category.id, None, None) for category in self])
+
+    def _propagate_rates(self, rate_fields):
+        """Applique les tarifs des catégories aux vélos non personnalisés en une requête,
+        puis re-tarife les contrats en brouillon de ces vélos.
+
+        :return: ids des vélos modifiés
+        """
+        Bike = self.env['bike.bike']
+        Bike.flush_model()
+        self.flush_recordset(rate_fields)
+        self.env['rental.order'].flush_model(['bike_id', 'state', 'rental_type', 'unit_price'])
+        # Contrats à re-tarifer, choisis avant la mise à jour des vélos (tarif actuel connu)
+        self._cr.execute(f"""
+            SELECT ro.id, ro.rental_type, c.id
+              FROM rental_order ro
+              JOIN bike_bike b ON b.id = ro.bike_id
+              JOIN bike_category c ON c.id = b.category_id
+             WHERE c.id IN %s AND ro.state = 'draft'
+               AND ({self._get_requoted_drafts_condition(rate_fields, lambda rate: f'c.{rate}')})
+        """, [tuple(self.ids)])
+        prices = {
+            rental_id: self.browse(category_id)[f'{rental_type}_rate']
+            for rental_id, rental_type, category_id in self._cr.fetchall()
+        }
+        assignments = ", ".join(
+            f"{rate} = CASE WHEN b.{rate}_override THEN b.{rate} ELSE c.{rate} END"
+            for rate in rate_fields
+        )
+        changed = " OR ".join(
+            f"(NOT b.{rate}_override AND b.{rate} IS DISTINCT FROM c.{rate})"
+            for rate in rate_fields
+        )
+        self._cr.execute(f"""
+            UPDATE bike_bike b
+               SET {assignments}
+              FROM bike_category c
+             WHERE b.category_id = c.id
+               AND c.id IN %s
+               AND ({changed})
+         RETURNING b.id
+        """, [tuple(self.ids)])
+        bike_ids = [row[0] for row in self._cr.fetchall()]
+        Bike.invalidate_model(rate_fields)
+        self.env['rental.order']._requote_drafts(prices)
+        return bike_ids
+
+    @api.model
+    def _get_requoted_drafts_condition(self, rate_fields, new_rate):
+        """Condition SQL (sur ro : rental_order, b : bike_bike) des contrats en brouillon
+        re-tarifés quand les vélos non personnalisés prennent les nouveaux tarifs.
+
+        Un contrat dont le prix a été saisi à la main (différent du tarif actuel
+        de son vélo) garde son prix.
+
+        :param new_rate: fonction donnant l'expression SQL du nouveau tarif d'un champ
+        """
+        return " OR ".join(
+            f"(ro.rental_type = '{rate[:-5]}' AND NOT b.{rate}_override"
+            f" AND b.{rate} IS DISTINCT FROM {new_rate(rate)} AND ro.unit_price = b.{rate})"
+            for rate in rate_fields
+        )
+
+    def _preview_rate_change(self, vals):
+        """Compte les vélos et contrats en brouillon touchés par un changement de tarifs.
+
+        :param vals: nouveaux tarifs {champ: valeur}
+        :return: dict {'bike_count', 'order_count'}
+        """
+        self.ensure_one()
+        self.env['bike.bike'].flush_model()
+        self.env['rental.order'].flush_model(['bike_id', 'state', 'rental_type', 'unit_price'])
+        rate_fields = [rate for rate in self.env['bike.bike']._RATE_FIELDS if rate in vals]
+        if not rate_fields:
+            return {'bike_count': 0, 'order_count': 0}
+        changed = " OR ".join(
+            f"(NOT b.{rate}_override AND b.{rate} IS DISTINCT FROM %({rate})s)"
+            for rate in rate_fields
+        )
+        requoted = self._get_requoted_drafts_condition(rate_fields, lambda rate: f"%({rate})s")
+        params = dict({rate: vals[rate] for rate in rate_fields}, category_id=self.id)
+        self._cr.execute(f"""
+            SELECT (SELECT COUNT(*) FROM bike_bike b
+                     WHERE b.category_id = %(category_id)s AND ({changed})),
+                   (SELECT COUNT(*) FROM rental_order ro
+                      JOIN bike_bike b ON b.id = ro.bike_id
+                     WHERE b.category_id = %(category_id)s AND ro.state = 'draft' AND ({requoted}))
+        """, params)
+        bike_count, order_count = self._cr.fetchone()
+        return {'bike_count': bike_count, 'order_count': order_count}
+
+    def action_open_rate_wizard(self):
+        """Ouvre l'assistant de modification des tarifs avec aperçu"""
+        self.ensure_one()
+        return {
+            'name': 'Modifier les tarifs',
+            'type': 'ir.actions.act_window',
+            'res_model': 'bike.category.rate.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_category_id': self.id},
+        }
 
     @api.constrains('name')
     def _check_name(self):
@@ -64,6 +260,13 @@ class BikeCategory(models.Model):
                     "Le tarif mensuel ne peut pas être négatif."
                 )
 
-    _sql_constraints = [
-        ('name_unique', 'UNIQUE(name)', 'Le nom de la catégorie doit être unique!')
-    ]
+    @api.constrains('service_interval_hours', 'service_interval_rentals', 'service_duration')
+    def _check_service_thresholds(self):
+        """Vérifie que les seuils d'entretien ne sont pas négatifs"""
+        for category in self:
+            if min(category.service_interval_hours, category.service_interval_rentals, category.service_duration) < 0:
+                raise exceptions.ValidationError(
+                    "Les seuils et la durée d'entretien ne peuvent pas être négatifs."
+                )
+
+    _name_unique = models.Constraint('UNIQUE(name)', 'Le nom de la catégorie doit être unique!')
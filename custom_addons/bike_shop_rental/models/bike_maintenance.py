@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+from odoo import models, fields, api, exceptions
+from .public_api import RENTAL_KINDS
+
+_logger = logging.getLogger(__name__)
+
+
+class BikeMaintenance(models.Model):
+    """Fenêtre d'entretien d'un vélo.
+
+    Planifiée par _cron_plan lorsque le vélo atteint un seuil d'usage de sa
+    catégorie, dans le premier intervalle libre entre deux réservations. Une
+    fenêtre planifiée rend le vélo indisponible sur sa période (cf.
+    bike.bike.search_available) ; le vélo passe en maintenance à son début.
+    """
+    _name = 'bike.maintenance'
+    _description = 'Entretien de Vélo'
+    _order = 'start_date desc, id desc'
+
+    # États pour lesquels une fenêtre est encore ouverte (une seule par vélo)
+    _OPEN_STATES = ('planned', 'ongoing')
+
+    bike_id = fields.Many2one('bike.bike', string='Vélo', required=True, index=True, ondelete='cascade')
+    category_id = fields.Many2one(related='bike_id.category_id', string='Catégorie', store=True)
+    start_date = fields.Datetime(string='Début', required=True)
+    end_date = fields.Datetime(string='Fin', required=True)
+    state = fields.Selection([
+        ('planned', 'Planifié'),
+        ('ongoing', 'En cours'),
+        ('done', 'Terminé'),
+        ('cancelled', 'Annulé'),
+    ], string='État', default='planned', required=True)
+    reason = fields.Selection([
+        ('hours', "Heures d'utilisation"),
+        ('rentals', 'Nombre de locations'),
+        ('manual', 'Manuel'),
+    ], string='Motif', default='manual', required=True)
+    hours_since_service = fields.Float(string="Heures depuis l'Entretien", readonly=True)
+    rentals_since_service = fields.Integer(string="Locations depuis l'Entretien", readonly=True)
+    date_done = fields.Datetime(string='Terminé le', readonly=True)
+    notes = fields.Text(string='Notes')
+
+    def init(self):
+        """Index des fenêtres ouvertes (disponibilité, planificateur)"""
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS bike_maintenance_open_bike_idx
+            ON bike_maintenance (bike_id, start_date, end_date)
+            WHERE state IN ('planned', 'ongoing')
+        """)
+        self._cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS bike_maintenance_open_bike_uniq
+            ON bike_maintenance (bike_id)
+            WHERE state IN ('planned', 'ongoing')
+        """)
+
+    @api.constrains('start_date', 'end_date')
+    def _check_dates(self):
+        """Vérifie que la fenêtre se termine après son début"""
+        for maintenance in self:
+            if maintenance.end_date <= maintenance.start_date:
+                raise exceptions.ValidationError("La fin de l'entretien doit être postérieure à son début.")
+
+    @api.constrains('bike_id', 'state')
+    def _check_single_open(self):
+        """Vérifie qu'un vélo n'a qu'un entretien planifié ou en cours"""
+        open_maintenances = self.filtered(lambda maintenance: maintenance.state in self._OPEN_STATES)
+        if not open_maintenances:
+            return
+        counts = dict(self._read_group(
+            [('bike_id', 'in', open_maintenances.bike_id.ids), ('state', 'in', self._OPEN_STATES)],
+            ['bike_id'], ['__count'],
+        ))
+        for bike, count in counts.items():
+            if count > 1:
+                raise exceptions.ValidationError(f"Le vélo '{bike.name}' a déjà un entretien planifié ou en cours.")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Invalide la disponibilité servie par l'API publique"""
+        maintenances = super().create(vals_list)
+        self.env['bike.shop.api.cache']._invalidate(RENTAL_KINDS, maintenances._get_api_cache_scopes())
+        return maintenances
+
+    def write(self, vals):
+        """Invalide la disponibilité servie par l'API publique (avant et après)"""
+        if not {'bike_id', 'start_date', 'end_date', 'state'} & set(vals):
+            return super().write(vals)
+        scopes_before = self._get_api_cache_scopes()
+        res = super().write(vals)
+        self.env['bike.shop.api.cache']._invalidate(RENTAL_KINDS, scopes_before + self._get_api_cache_scopes())
+        return res
+
+    def unlink(self):
+        """Invalide la disponibilité servie par l'API publique"""
+        self.env['bike.shop.api.cache']._invalidate(RENTAL_KINDS, self._get_api_cache_scopes())
+        return super().unlink()
+
+    def _get_api_cache_scopes(self):
+        """Portées (catégorie, début, fin) de l'API publique couvertes par les fenêtres planifiées"""
+        return [
+            (maintenance.bike_id.category_id.id, maintenance.start_date, maintenance.end_date)
+            for maintenance in self if maintenance.state == 'planned'
+        ]
+
+    def action_start(self):
+        """Commence l'entretien : le vélo passe en maintenance"""
+        planned = self.filtered(lambda maintenance: maintenance.state == 'planned')
+        planned.write({'state': 'ongoing'})
+        planned.bike_id.action_set_maintenance()
+
+    def action_done(self):
+        """Termine l'entretien : le vélo redevient disponible, ses compteurs repartent de zéro"""
+        ongoing = self.filtered(lambda maintenance: maintenance.state == 'ongoing')
+        ongoing.bike_id.filtered(lambda bike: bike.state == 'maintenance').action_set_available()
+        ongoing.filtered(lambda maintenance: maintenance.state == 'ongoing')._mark_done()
+
+    def _mark_done(self):
+        self.write({'state': 'done', 'date_done': fields.Datetime.now()})
+
+    def action_cancel(self):
+        """Annule un entretien planifié"""
+        self.filtered(lambda maintenance: maintenance.state == 'planned').write({'state': 'cancelled'})
+
+    # ------------------------------------------------------------------
+    # Planificateur
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _plan_category(self, category, now, horizon):
+        """Planifie l'entretien des vélos de category ayant atteint un seuil.
+
+        Une requête par catégorie sélectionne les vélos à entretenir (index
+        bike_bike_category_state_idx), leurs contrats bloquants à venir
+        (index rental_order_active_bike_idx) et le premier intervalle libre
+        d'au moins service_duration heures avant horizon. Les vélos sans
+        créneau ou rendus en retard sont repris au passage suivant.
+
+        :return: (nombre de vélos à entretenir, entretiens créés)
+        """
+        self.env['bike.bike'].flush_model()
+        self.env['rental.order'].flush_model(['bike_id', 'state', 'start_date', 'end_date'])
+        self.flush_model(['bike_id', 'state'])
+        self._cr.execute("""
+            WITH due AS (
+                SELECT b.id, b.hours_since_service, b.rentals_since_service
+                  FROM bike_bike b
+                 WHERE b.category_id = %(category_id)s
+                   AND b.active
+                   AND b.confirmation_state = 'confirmed'
+                   AND b.state != 'maintenance'
+                   AND ((%(hours)s > 0 AND b.hours_since_service >= %(hours)s)
+                        OR (%(rentals)s > 0 AND b.rentals_since_service >= %(rentals)s))
+                   AND NOT EXISTS (
+                        SELECT 1 FROM bike_maintenance m
+                         WHERE m.bike_id = b.id AND m.state IN ('planned', 'ongoing'))
+                   AND NOT EXISTS (
+                        SELECT 1 FROM rental_order ro
+                         WHERE ro.bike_id = b.id AND ro.state = 'ongoing' AND ro.end_date < %(now)s)
+            ),
+            busy AS (
+                SELECT ro.bike_id, ro.start_date AS busy_start, ro.end_date AS busy_end
+                  FROM rental_order ro
+                  JOIN due ON due.id = ro.bike_id
+                 WHERE ro.state IN ('confirmed', 'ongoing')
+                   AND ro.end_date > %(now)s
+                   AND ro.start_date < %(horizon)s
+                 UNION ALL
+                -- Borne de fin : le dernier intervalle s'arrête à l'horizon
+                SELECT due.id, %(horizon)s, %(horizon)s FROM due
+            ),
+            gaps AS (
+                SELECT bike_id,
+                       GREATEST(%(now)s, max(busy_end) OVER (
+                            PARTITION BY bike_id ORDER BY busy_start, busy_end
+                            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)) AS gap_start,
+                       busy_start AS gap_end
+                  FROM busy
+            ),
+            slots AS (
+                SELECT bike_id, min(gap_start) AS slot_start
+                  FROM gaps
+                 WHERE gap_end - gap_start >= %(duration)s * interval '1 hour'
+                 GROUP BY bike_id
+            )
+            SELECT due.id, due.hours_since_service, due.rentals_since_service, slots.slot_start
+              FROM due
+              LEFT JOIN slots ON slots.bike_id = due.id
+             ORDER BY due.id
+        """, {
+            'category_id': category.id,
+            'hours': category.service_interval_hours,
+            'rentals': category.service_interval_rentals,
+            'duration': category.service_duration,
+            'now': now,
+            'horizon': horizon,
+        })
+        rows = self._cr.fetchall()
+        duration = timedelta(hours=category.service_duration)
+        hours_threshold = category.service_interval_hours
+        maintenances = self.create([{
+            'bike_id': bike_id,
+            'start_date': slot_start,
+            'end_date': slot_start + duration,
+            'reason': 'hours' if hours_threshold > 0 and hours >= hours_threshold else 'rentals',
+            'hours_since_service': hours,
+            'rentals_since_service': rentals,
+        } for bike_id, hours, rentals, slot_start in rows if slot_start])
+        return len(rows), maintenances
+
+    @api.model
+    def _start_due(self, now):
+        """Commence les entretiens planifiés arrivés à échéance dont le vélo est rentré"""
+        due = self.search([('state', '=', 'planned'), ('start_date', '<=', now)])
+        ready = due.filtered(lambda maintenance: maintenance.bike_id.state == 'available')
+        ready.action_start()
+        return ready
+
+    @api.model
+    def _cron_plan(self):
+        """Commence les entretiens échus puis planifie ceux des vélos ayant atteint un seuil.
+
+        Horizon de planification en jours : paramètre
+        bike_shop_rental.maintenance_horizon_days (30 par défaut). Chaque
+        catégorie est validée séparément.
+        """
+        now = fields.Datetime.now()
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'bike_shop_rental.maintenance_horizon_days', 30))
+        started = self._start_due(now)
+        self._cr.commit()
+        categories = self.env['bike.category'].search([
+            ('service_duration', '>', 0),
+            '|', ('service_interval_hours', '>', 0), ('service_interval_rentals', '>', 0),
+        ])
+        due_count = planned_count = 0
+        for category in categories:
+            count, maintenances = self._plan_category(category, now, now + timedelta(days=days))
+            due_count += count
+            planned_count += len(maintenances)
+            self._cr.commit()
+        _logger.info(
+            "Entretiens : %s commencé(s), %s planifié(s), %s vélo(s) sans créneau sous %s jours",
+            len(started), planned_count, due_count - planned_count, days,
+        )
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+from odoo import models, fields, api, exceptions
+
+_logger = logging.getLogger(__name__)
+
+# Demande saisonnière : probabilité qu'un créneau soit loué selon le jour de
+# l'année (creux en janvier, pic mi-juillet)
+SEASONAL_WEIGHT_SQL = "0.55 + 0.35 * sin(2 * pi() * (extract(doy FROM {date}) - 105) / 365.25)"
+
+
+class BikeShopDataset(models.AbstractModel):
+    """Générateur de jeux de données volumineux pour les tests de charge.
+
+    Les enregistrements sont insérés en SQL (INSERT ... SELECT sur
+    generate_series) par lots validés, sans passer par l'ORM ; les champs
+    calculés stockés sont renseignés dans la même requête, puis les compteurs,
+    le cumul journalier et l'occupation sont reconstruits une fois à la fin.
+
+    À lancer depuis odoo-bin shell sur une base dédiée, par exemple :
+        env['bike.shop.dataset'].generate(bikes=50000, rentals_per_bike=100)
+    bike_shop_sale complète generate avec les produits et les commandes.
+    """
+    _name = 'bike.shop.dataset'
+    _description = 'Générateur de Données Bike Shop'
+
+    @api.model
+    def generate(self, bikes=1000, rentals_per_bike=100, years=3, seed=None, chunk_size=1000, commit=True):
+        """Génère une flotte et son historique de locations.
+
+        :param bikes: nombre de vélos créés
+        :param rentals_per_bike: créneaux de location par vélo sur la période
+            (une partie est écartée par la saisonnalité et le renouvellement de flotte)
+        :param years: profondeur de l'historique
+        :param seed: graine PostgreSQL (setseed, entre -1 et 1) pour un jeu reproductible
+        :param chunk_size: vélos traités par requête
+        :param commit: valider la transaction après chaque lot
+        :return: dict des volumes créés et de la durée
+        """
+        if not self.env.is_system():
+            raise exceptions.AccessError("La génération de données est réservée aux administrateurs.")
+        started = time.monotonic()
+        if seed is not None:
+            self._cr.execute("SELECT setseed(%s)", [seed])
+        now = fields.Datetime.now()
+        origin = now - timedelta(days=365 * years)
+        stats = {'bikes': 0, 'rentals': 0}
+
+        self.env.flush_all()
+        bike_ids = self._generate_bikes(bikes, origin, now)
+        stats['bikes'] = len(bike_ids)
+        self.env['bike.shop.pricing.cache']._invalidate(['fleet'])
+        self._commit(commit)
+        for start in range(0, len(bike_ids), chunk_size):
+            chunk = bike_ids[start:start + chunk_size]
+            stats['rentals'] += self._generate_rentals(chunk, rentals_per_bike, origin, now)
+            self._commit(commit)
+            _logger.info("Jeu de données : %s vélos, %s locations", start + len(chunk), stats['rentals'])
+
+        self._rebuild_rental_aggregates(bike_ids)
+        self._commit(commit)
+        stats['seconds'] = time.monotonic() - started
+        return stats
+
+    def _commit(self, commit):
+        if commit:
+            self._cr.commit()
+
+    @api.model
+    def _generate_bikes(self, count, origin, now):
+        """Insère count vélos confirmés aux tarifs de leur catégorie.
+
+        Renouvellement de flotte : 30 % des vélos arrivent en cours de période
+        (create_date), 5 % sont retirés (archivés, write_date = date de retrait)
+        et 3 % sont en maintenance.
+
+        :return: ids des vélos créés
+        """
+        span = (now - origin).total_seconds()
+        self._cr.execute("""
+            WITH cats AS (
+                SELECT array_agg(id ORDER BY id) AS ids FROM bike_category
+            ),
+            g AS (
+                SELECT nextval('bike_bike_id_seq') AS id,
+                       cats.ids[1 + floor(random() * cardinality(cats.ids))::int] AS category_id,
+                       random() AS r_churn,
+                       random() AS r_state,
+                       CASE WHEN random() < 0.3
+                            THEN %(origin)s + random() * %(span)s * interval '1 second'
+                            ELSE %(origin)s
+                       END AS acquired
+                  FROM generate_series(1, %(count)s) n, cats
+            )
+            INSERT INTO bike_bike (
+                id, name, category_id, model, year, frame_size, color, serial_number,
+                confirmation_state, state, active, rental_count,
+                hourly_rate, daily_rate, weekly_rate, monthly_rate,
+                create_uid, write_uid, create_date, write_date
+            )
+            SELECT g.id, 'Vélo ' || g.id, g.category_id,
+                   (ARRAY['Urban', 'Trail', 'Speed', 'Volt', 'Junior'])[1 + floor(random() * 5)::int],
+                   extract(year FROM g.acquired)::int,
+                   (ARRAY['xs', 's', 'm', 'l', 'xl'])[1 + floor(random() * 5)::int],
+                   (ARRAY['Noir', 'Blanc', 'Rouge', 'Bleu', 'Vert'])[1 + floor(random() * 5)::int],
+                   'GEN' || lpad(g.id::text, 9, '0'),
+                   'confirmed',
+                   CASE WHEN g.r_state < 0.03 THEN 'maintenance' ELSE 'available' END,
+                   g.r_churn >= 0.05, 0,
+                   c.hourly_rate, c.daily_rate, c.weekly_rate, c.monthly_rate,
+                   %(uid)s, %(uid)s, g.acquired,
+                   CASE WHEN g.r_churn < 0.05
+                        THEN g.acquired + random() * (%(now)s - g.acquired)
+                        ELSE g.acquired
+                   END
+              FROM g
+              JOIN bike_category c ON c.id = g.category_id
+         RETURNING id
+        """, {'origin': origin, 'now': now, 'span': span, 'count': count, 'uid': self.env.uid})
+        return [row[0] for row in self._cr.fetchall()]
+
+    @api.model
+    def _generate_rentals(self, bike_ids, slots, origin, now):
+        """Insère l'historique de locations des vélos, sans chevauchement.
+
+        La période (jusqu'à 30 jours après aujourd'hui) est découpée en slots
+        créneaux par vélo ; un créneau est loué selon la saisonnalité, pendant
+        que le vélo fait partie de la flotte. La durée détermine le type de
+        location et la date d'aujourd'hui l'état (passé : terminé / facturé /
+        payé / annulé, en cours, futur : brouillon / confirmé).
+
+        :return: nombre de locations créées
+        """
+        horizon = now + timedelta(days=30)
+        slot_seconds = (horizon - origin).total_seconds() / slots
+        self._cr.execute("""
+            SELECT data_type FROM information_schema.columns
+             WHERE table_name = 'rental_order' AND column_name = 'bike_category'
+        """)
+        # Le nom de catégorie est traduit : le champ related l'est aussi selon la version
+        category_name = "c.name" if self._cr.fetchone()[0] == 'jsonb' else "c.name->>'en_US'"
+        seasonal = SEASONAL_WEIGHT_SQL.format(date='s.start_date')
+        self._cr.execute(f"""
+            WITH s AS (
+                SELECT b.id AS bike_id, b.create_date AS acquired,
+                       CASE WHEN b.active THEN NULL ELSE b.write_date END AS retired,
+                       b.hourly_rate, b.daily_rate, b.weekly_rate, b.monthly_rate,
+                       {category_name} AS category_name,
+                       %(origin)s + (k + random() * 0.1) * %(slot)s * interval '1 second' AS start_date,
+                       random() AS r_type, random() AS r_duration, random() AS r_state
+                  FROM bike_bike b
+                  JOIN bike_category c ON c.id = b.category_id,
+                       generate_series(0, %(slots)s - 1) k
+                 WHERE b.id = ANY(%(bike_ids)s)
+            ),
+            d AS (
+                SELECT s.*,
+                       LEAST(
+                           CASE WHEN r_type < 0.4 THEN interval '1 hour' * (1 + floor(r_duration * 8))
+                                WHEN r_type < 0.9 THEN interval '1 day' * (1 + floor(r_duration * 6))
+                                ELSE interval '1 day' * (7 + floor(r_duration * 7))
+                           END,
+                           %(slot)s * 0.85 * interval '1 second'
+                       ) AS duration
+                  FROM s
+                 WHERE s.start_date >= s.acquired
+                   AND (s.retired IS NULL OR s.start_date < s.retired)
+                   AND random() < {seasonal}
+            ),
+            e AS (
+                SELECT d.*, d.start_date + d.duration AS end_date,
+                       extract(epoch FROM d.duration) / 3600 AS hours,
+                       CASE WHEN d.duration < interval '1 day' THEN 'hourly'
+                            WHEN d.duration < interval '7 days' THEN 'daily'
+                            WHEN d.duration < interval '30 days' THEN 'weekly'
+                            ELSE 'monthly'
+                       END AS rental_type
+                  FROM d
+            ),
+            f AS (
+                SELECT e.*, nextval('rental_order_id_seq') AS id,
+                       CASE e.rental_type
+                            WHEN 'hourly' THEN e.hours
+                            WHEN 'daily' THEN GREATEST(1, round(e.hours / 24))
+                            WHEN 'weekly' THEN GREATEST(1, round((e.hours / 168)::numeric, 1))
+                            ELSE GREATEST(1, round((e.hours / 720)::numeric, 1))
+                       END AS quantity,
+                       CASE e.rental_type
+                            WHEN 'hourly' THEN e.hourly_rate
+                            WHEN 'daily' THEN e.daily_rate
+                            WHEN 'weekly' THEN e.weekly_rate
+                            ELSE e.monthly_rate
+                       END AS unit_price,
+                       CASE WHEN e.end_date < %(now)s THEN
+                                CASE WHEN e.r_state < 0.05 THEN 'cancelled'
+                                     WHEN e.r_state < 0.15 THEN 'done'
+                                     WHEN e.r_state < 0.3 THEN 'invoiced'
+                                     ELSE 'paid'
+                                END
+                            WHEN e.start_date <= %(now)s THEN 'ongoing'
+                            WHEN e.r_state < 0.2 THEN 'draft'
+                            ELSE 'confirmed'
+                       END AS state
+                  FROM e
+            )
+            INSERT INTO rental_order (
+                id, name, bike_id, bike_category, customer_name, start_date, end_date,
+                actual_return_date, invoice_date, payment_date,
+                duration_hours, duration_days, rental_type, unit_price, quantity, subtotal, total_amount,
+                state, create_uid, write_uid, create_date, write_date
+            )
+            SELECT f.id, 'GEN-LOC-' || f.id, f.bike_id, f.category_name,
+                   'Client ' || (1 + floor(random() * 100000)::int),
+                   f.start_date, f.end_date,
+                   CASE WHEN f.state IN ('done', 'invoiced', 'paid') THEN f.end_date END,
+                   CASE WHEN f.state IN ('invoiced', 'paid') THEN f.end_date + interval '1 day' END,
+                   CASE WHEN f.state = 'paid' THEN f.end_date + interval '8 days' END,
+                   f.hours, f.hours / 24, f.rental_type, f.unit_price, f.quantity,
+                   f.unit_price * f.quantity, f.unit_price * f.quantity,
+                   f.state, %(uid)s, %(uid)s, f.start_date - interval '2 days', f.start_date - interval '2 days'
+              FROM f
+        """, {
+            'origin': origin, 'now': now, 'slot': slot_seconds, 'slots': slots,
+            'bike_ids': bike_ids, 'uid': self.env.uid,
+        })
+        created = self._cr.rowcount
+        # Un vélo dont le contrat est en cours est loué
+        self._cr.execute("""
+            UPDATE bike_bike b
+               SET state = 'rented'
+              FROM rental_order ro
+             WHERE ro.bike_id = b.id
+               AND ro.state = 'ongoing'
+               AND b.id = ANY(%s)
+        """, [bike_ids])
+        return created
+
+    @api.model
+    def _rebuild_rental_aggregates(self, bike_ids):
+        """Recalcule compteurs, cumul journalier et occupation après insertion en SQL"""
+        self.env.invalidate_all()
+        self.env['bike.bike']._cron_reconcile_counters()
+        self.env['rental.report.daily']._rebuild()
+        # L'occupation est recalculée par le cron de rafraîchissement
+        self.env['bike.occupancy.report']._mark_bikes_dirty(bike_ids)
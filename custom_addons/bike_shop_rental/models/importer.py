@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+import csv
+import itertools
+import json
+import logging
+import time
+import psycopg2
+from odoo import models, fields, api, exceptions
+
+_logger = logging.getLogger(__name__)
+
+
+class BikeShopImportCheckpoint(models.Model):
+    """Point de reprise d'un import de fichier"""
+    _name = 'bike.shop.import.checkpoint'
+    _description = 'Point de Reprise d\'Import'
+    _order = 'write_date desc'
+
+    name = fields.Char(string='Fichier', required=True)
+    model = fields.Char(string='Modèle', required=True)
+    rows_done = fields.Integer(string='Lignes traitées', default=0)
+    records_created = fields.Integer(string='Enregistrements créés', default=0)
+    error_count = fields.Integer(string='Lignes en erreur', default=0)
+    done = fields.Boolean(string='Terminé', default=False)
+
+    _file_model_unique = models.Constraint('UNIQUE(name, model)', 'Un seul point de reprise par fichier et par modèle!')
+
+
+class BikeShopImporter(models.AbstractModel):
+    """Import en flux de vélos, contrats (et commandes, cf. bike_shop_sale).
+
+    Le fichier (CSV ou JSONL) est lu ligne à ligne par une chaîne de
+    générateurs : lecture -> conversion en valeurs (références résolues par
+    des tables de correspondance construites une fois) -> lots. Chaque lot
+    est créé par le create multi du modèle puis validé (commit) avec son
+    point de reprise : la mémoire reste constante et un import interrompu
+    reprend après le dernier lot validé.
+
+    Une ligne en erreur (référence inconnue, valeur non convertible, règle
+    métier, contrainte de la base) est comptée et journalisée sans bloquer
+    son lot : un lot refusé par la base est repris ligne par ligne.
+
+    Un modèle importable fournit _import_lookups_<modèle> et
+    _import_prepare_<modèle> (points remplacés par '_'), qui produit des
+    (nombre de lignes, valeurs, messages d'erreur).
+    """
+    _name = 'bike.shop.importer'
+    _description = 'Import en flux Bike Shop'
+
+    @api.model
+    def import_file(self, path, model, chunk_size=1000, resume=True, commit=True):
+        """Importe un fichier CSV ou JSONL dans model.
+
+        :param path: chemin du fichier sur le serveur
+        :param model: 'bike.bike', 'rental.order' ou 'shop.order'
+        :param resume: reprendre après le dernier lot validé d'un import précédent
+        :param commit: valider la transaction après chaque lot
+        :return: dict {'rows', 'created', 'errors', 'seconds', 'rows_per_second'}
+        """
+        # Lit un fichier du serveur : réservé aux administrateurs
+        if not self.env.is_system():
+            raise exceptions.AccessError("L'import de fichiers est réservé aux administrateurs.")
+        suffix = model.replace('.', '_')
+        lookups_method = getattr(self, f'_import_lookups_{suffix}', None)
+        prepare_method = getattr(self, f'_import_prepare_{suffix}', None)
+        if not lookups_method or not prepare_method:
+            raise exceptions.UserError(f"Le modèle {model} ne peut pas être importé.")
+
+        Checkpoint = self.env['bike.shop.import.checkpoint'].sudo()
+        checkpoint = Checkpoint.search([('name', '=', path), ('model', '=', model)], limit=1)
+        if not checkpoint:
+            checkpoint = Checkpoint.create({'name': path, 'model': model})
+        elif not resume:
+            checkpoint.write({'rows_done': 0, 'records_created': 0, 'error_count': 0, 'done': False})
+        skip = checkpoint.rows_done
+
+        lookups = lookups_method()
+        rows = itertools.islice(self._import_read_rows(path), skip, None)
+        records = prepare_method(rows, lookups)
+
+        Model = self.env[model]
+        started = time.monotonic()
+        stats = {'rows': 0, 'created': 0, 'errors': 0}
+        for chunk in self._import_chunks(records, chunk_size):
+            row_count = sum(count for count, __, __ in chunk)
+            vals_list = []
+            for __, vals, messages in chunk:
+                if messages:
+                    self._import_log_error(model, vals, messages)
+                else:
+                    vals_list.append(vals)
+            if hasattr(Model, '_collect_validation_errors'):
+                errors = Model._collect_validation_errors(vals_list)
+                for vals, messages in zip(vals_list, errors):
+                    if messages:
+                        self._import_log_error(model, vals, messages)
+                vals_list = [vals for vals, messages in zip(vals_list, errors) if not messages]
+                # Les enregistrements de validation ne doivent pas rester en cache
+                self.env.invalidate_all()
+            created = self._import_create(Model, vals_list)
+            stats['rows'] += row_count
+            stats['created'] += created
+            stats['errors'] += len(chunk) - created
+            checkpoint.write({
+                'rows_done': checkpoint.rows_done + row_count,
+                'records_created': checkpoint.records_created + created,
+                'error_count': checkpoint.error_count + len(chunk) - created,
+            })
+            if commit:
+                self.env.cr.commit()
+            # Mémoire constante : on vide le cache entre deux lots
+            self.env.invalidate_all()
+            elapsed = time.monotonic() - started
+            _logger.info("Import %s : %s lignes (%.0f lignes/s)",
+                         model, stats['rows'], stats['rows'] / elapsed if elapsed else 0)
+
+        checkpoint.write({'done': True})
+        if commit:
+            self.env.cr.commit()
+        stats['seconds'] = time.monotonic() - started
+        stats['rows_per_second'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        return stats
+
+    @api.model
+    def _import_create(self, Model, vals_list):
+        """Crée le lot en une fois ; s'il est refusé, le reprend ligne par ligne.
+
+        :return: nombre d'enregistrements créés
+        """
+        if not vals_list:
+            return 0
+        try:
+            with self.env.cr.savepoint():
+                Model.create(vals_list)
+            return len(vals_list)
+        except (psycopg2.Error, exceptions.UserError, ValueError):
+            self.env.invalidate_all()
+        created = 0
+        for vals in vals_list:
+            try:
+                with self.env.cr.savepoint():
+                    Model.create(vals)
+                created += 1
+            except (psycopg2.Error, exceptions.UserError, ValueError) as e:
+                self.env.invalidate_all()
+                self._import_log_error(Model._name, vals, [str(e).strip()])
+        return created
+
+    @api.model
+    def _import_log_error(self, model, vals, messages):
+        _logger.warning("Import %s : ligne ignorée (%s) : %s", model, vals.get('name', ''), " / ".join(messages))
+
+    @api.model
+    def _import_read_rows(self, path):
+        """Lit un fichier CSV (en-tête obligatoire) ou JSONL, une ligne à la fois"""
+        with open(path, encoding='utf-8', newline='') as handle:
+            if path.endswith('.jsonl'):
+                for line in handle:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from csv.DictReader(handle)
+
+    @api.model
+    def _import_chunks(self, records, chunk_size):
+        """Regroupe les (nombre de lignes, valeurs, erreurs) en lots"""
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @api.model
+    def _import_lookup_table(self, query):
+        """Construit une table de correspondance {clé: id} à partir d'une requête (clé, id)"""
+        self._cr.execute(query)
+        return dict(self._cr.fetchall())
+
+    # ------------------------------------------------------------------
+    # bike.bike
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _import_lookups_bike_bike(self):
+        self.env['bike.category'].flush_model(['name'])
+        return {
+            # Le nom est traduit : toutes les traductions pointent vers la catégorie
+            'category': self._import_lookup_table("""
+                SELECT lower(t.value), c.id FROM bike_category c, jsonb_each_text(c.name) t
+            """),
+        }
+
+    @api.model
+    def _import_prepare_bike_bike(self, rows, lookups):
+        """Colonnes : name, category, model, year, frame_size, color, serial_number, *_rate"""
+        rate_fields = self.env['bike.bike']._RATE_FIELDS
+        for row in rows:
+            errors = [] if row.get('name') else ["Colonne manquante ou vide : name"]
+            vals = {
+                'name': row.get('name'),
+                'category_id': lookups['category'].get((row.get('category') or '').lower()),
+                'confirmation_state': row.get('confirmation_state') or 'confirmed',
+            }
+            if not vals['category_id']:
+                errors.append(f"Catégorie inconnue : '{row.get('category') or ''}'")
+            for name in ('model', 'frame_size', 'color', 'serial_number', 'state'):
+                if row.get(name):
+                    vals[name] = row[name]
+            try:
+                if row.get('year'):
+                    vals['year'] = int(row['year'])
+                for rate in rate_fields:
+                    if row.get(rate) not in (None, ''):
+                        vals[rate] = float(row[rate])
+            except ValueError as e:
+                errors.append(f"Valeur numérique invalide : {e}")
+            yield 1, vals, errors
+
+    # ------------------------------------------------------------------
+    # rental.order
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _import_lookups_rental_order(self):
+        self.env['bike.bike'].flush_model(['serial_number'])
+        return {
+            'bike': self._import_lookup_table("""
+                SELECT serial_number, id FROM bike_bike WHERE serial_number IS NOT NULL
+            """),
+            'partner': self._import_lookup_table("""
+                SELECT DISTINCT ON (lower(email)) lower(email), id
+                  FROM res_partner
+                 WHERE email IS NOT NULL
+                 ORDER BY lower(email), id
+            """),
+        }
+
+    @api.model
+    def _import_prepare_rental_order(self, rows, lookups):
+        """Colonnes : name, bike_serial, customer_name, partner_email, partner_phone,
+        start_date, end_date, rental_type, state, unit_price, actual_return_date"""
+        for row in rows:
+            errors = []
+            email = row.get('partner_email') or False
+            vals = {
+                'customer_name': row.get('customer_name'),
+                'partner_email': email,
+                'partner_phone': row.get('partner_phone') or False,
+                'partner_id': lookups['partner'].get(email.lower()) if email else False,
+                'bike_id': lookups['bike'].get(row.get('bike_serial')),
+                'start_date': row.get('start_date'),
+                'end_date': row.get('end_date'),
+                'rental_type': row.get('rental_type') or 'daily',
+                'state': row.get('state') or 'draft',
+            }
+            if row.get('bike_serial') and not vals['bike_id']:
+                errors.append(f"Vélo inconnu : '{row['bike_serial']}'")
+            if row.get('name'):
+                vals['name'] = row['name']
+            if row.get('actual_return_date'):
+                vals['actual_return_date'] = row['actual_return_date']
+            try:
+                if row.get('unit_price') not in (None, ''):
+                    vals['unit_price'] = float(row['unit_price'])
+            except ValueError as e:
+                errors.append(f"Valeur numérique invalide : {e}")
+            yield 1, vals, errors
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+import logging
+import traceback
+from datetime import timedelta
+from odoo import models, fields, api, exceptions
+from odoo.service.model import retrying
+
+_logger = logging.getLogger(__name__)
+
+# Canal PostgreSQL sur lequel l'exécuteur attend les nouveaux travaux
+JOB_CHANNEL = 'bike_shop_job'
+
+
+class BikeShopJob(models.Model):
+    """Travail en arrière-plan (file d'attente en base).
+
+    Un travail appelle model_name.method_name sur record_ids, par lots de
+    chunk_size enregistrements : chaque lot est validé (commit) et fait
+    avancer la progression, un travail relancé reprend au premier lot non
+    traité. Les travaux sont pris par ordre de priorité puis d'arrivée avec
+    FOR UPDATE SKIP LOCKED ; l'exécuteur (cf. jobrunner.py) est réveillé
+    par NOTIFY à chaque mise en file, le cron ne sert que de filet de sécurité.
+
+    Les enregistrements refusés par la méthode sont comptés en échec : ceux
+    d'un lot qui lève une UserError, et ceux listés dans params['failed_ids']
+    d'une notification (display_notification) retournée par la méthode.
+    """
+    _name = 'bike.shop.job'
+    _description = 'Travail en Arrière-plan'
+    _order = 'id desc'
+
+    name = fields.Char(string='Description', required=True, readonly=True)
+    model_name = fields.Char(string='Modèle', required=True, readonly=True)
+    method_name = fields.Char(string='Méthode', required=True, readonly=True)
+    record_ids = fields.Json(string='Enregistrements', readonly=True)
+    kwargs = fields.Json(string='Arguments', readonly=True)
+    user_id = fields.Many2one('res.users', string='Utilisateur', required=True, readonly=True,
+                              default=lambda self: self.env.user)
+    priority = fields.Integer(string='Priorité', default=10, readonly=True,
+                              help="Les travaux de plus petite priorité passent en premier.")
+    dedup_key = fields.Char(string='Clé de déduplication', readonly=True,
+                            help="Un seul travail en attente ou en cours par clé.")
+    chunk_size = fields.Integer(string='Taille des lots', default=200, readonly=True)
+
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('partial', 'Terminé avec erreurs'),
+        ('failed', 'Échoué'),
+        ('cancelled', 'Annulé'),
+    ], string='État', default='pending', required=True, readonly=True)
+    attempts = fields.Integer(string='Tentatives', default=0, readonly=True)
+    max_attempts = fields.Integer(string='Tentatives max', default=3, readonly=True)
+    eta = fields.Datetime(string='Pas avant', readonly=True)
+    date_started = fields.Datetime(string='Démarré le', readonly=True)
+    date_done = fields.Datetime(string='Terminé le', readonly=True)
+    error = fields.Text(string='Erreur', readonly=True)
+    failed_count = fields.Integer(string='En échec', default=0, readonly=True)
+    result = fields.Text(string='Enregistrements refusés', readonly=True)
+
+    # Progression
+    done_count = fields.Integer(string='Traités', default=0, readonly=True)
+    total_count = fields.Integer(string='Total', default=0, readonly=True)
+    progress = fields.Float(string='Progression (%)', compute='_compute_progress')
+
+    def init(self):
+        """Index de prise des travaux et unicité de la clé de déduplication"""
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS bike_shop_job_pending_idx
+            ON bike_shop_job (priority, id) WHERE state = 'pending'
+        """)
+        self._cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS bike_shop_job_dedup_key_uniq
+            ON bike_shop_job (dedup_key) WHERE dedup_key IS NOT NULL AND state IN ('pending', 'running')
+        """)
+
+    @api.depends('done_count', 'total_count', 'state')
+    def _compute_progress(self):
+        for job in self:
+            if job.state in ('done', 'partial'):
+                job.progress = 100.0
+            else:
+                job.progress = 100.0 * job.done_count / job.total_count if job.total_count else 0.0
+
+    @api.model
+    def _enqueue(self, records, method_name, kwargs=None, name=None, priority=10,
+                 dedup_key=None, chunk_size=200, max_attempts=3):
+        """Met en file l'appel records.method_name(**kwargs).
+
+        records peut être un recordset vide (appel sur le modèle, en un seul lot).
+
+        :param dedup_key: si un travail en attente ou en cours porte déjà cette clé,
+            il est retourné au lieu d'en créer un nouveau
+        :return: le travail (bike.shop.job)
+        """
+        Job = self.sudo()
+        if dedup_key:
+            existing = Job.search([('dedup_key', '=', dedup_key), ('state', 'in', ('pending', 'running'))], limit=1)
+            if existing:
+                return existing
+        job = Job.create({
+            'name': name or f"{records._name}.{method_name}",
+            'model_name': records._name,
+            'method_name': method_name,
+            'record_ids': records.ids,
+            'kwargs': kwargs or {},
+            'user_id': self.env.user.id,
+            'priority': priority,
+            'dedup_key': dedup_key,
+            'chunk_size': chunk_size,
+            'max_attempts': max_attempts,
+            'total_count': len(records),
+        })
+        # NOTIFY est transactionnel : l'exécuteur est réveillé à la validation
+        self._cr.execute("SELECT pg_notify(%s, %s)", [JOB_CHANNEL, str(job.id)])
+        return job
+
+    @api.model
+    def _acquire(self):
+        """Prend le prochain travail exécutable, sans attendre ceux déjà pris ailleurs"""
+        self._cr.execute("""
+            UPDATE bike_shop_job
+               SET state = 'running',
+                   attempts = attempts + 1,
+                   date_started = now() AT TIME ZONE 'UTC',
+                   write_date = now() AT TIME ZONE 'UTC'
+             WHERE id = (
+                    SELECT id FROM bike_shop_job
+                     WHERE state = 'pending'
+                       AND (eta IS NULL OR eta <= now() AT TIME ZONE 'UTC')
+                     ORDER BY priority, id
+                       FOR UPDATE SKIP LOCKED
+                     LIMIT 1
+             )
+         RETURNING id
+        """)
+        row = self._cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+
+    @api.model
+    def _process_next(self):
+        """Exécute le prochain travail en file.
+
+        Valide la transaction entre les lots : à n'appeler que depuis
+        l'exécuteur ou un cron.
+
+        :return: True si un travail a été traité
+        """
+        job = self._acquire()
+        self._cr.commit()
+        if not job:
+            return False
+        job._run()
+        return True
+
+    def _lock_and_beat(self):
+        """Verrouille le travail jusqu'à la fin du lot en cours et date son activité.
+
+        Le cron de reprise ignore les travaux verrouillés : un lot long n'est
+        jamais relancé en parallèle de lui-même.
+        """
+        self._cr.execute("""
+            UPDATE bike_shop_job SET write_date = now() AT TIME ZONE 'UTC' WHERE id = %s
+        """, [self.id])
+
+    def _add_failures(self, record_ids, message):
+        """Compte des enregistrements refusés et conserve le motif"""
+        self.failed_count += len(record_ids)
+        self.result = '\n'.join(filter(None, [self.result, message]))
+
+    @api.model
+    def _get_failures(self, result):
+        """Enregistrements refusés signalés par le retour d'une méthode : (ids, message)"""
+        if isinstance(result, dict) and result.get('tag') == 'display_notification':
+            params = result.get('params') or {}
+            return params.get('failed_ids') or [], params.get('message')
+        return [], None
+
+    def _run(self):
+        """Exécute les lots restants du travail puis enregistre son issue"""
+        self.ensure_one()
+        Model = self.env[self.model_name].with_user(self.user_id)
+        kwargs = self.kwargs or {}
+        try:
+            # Comme pour une requête HTTP, un lot en conflit de sérialisation
+            # (réservation de stock concurrente...) est rejoué sur un instantané à jour
+            if not self.record_ids:
+                retrying(lambda: getattr(Model, self.method_name)(**kwargs), self.env)
+            else:
+                while self.done_count < len(self.record_ids):
+                    chunk = self.record_ids[self.done_count:self.done_count + self.chunk_size]
+
+                    def run_chunk():
+                        self._lock_and_beat()
+                        result = getattr(Model.browse(chunk).exists(), self.method_name)(**kwargs)
+                        failed_ids, message = self._get_failures(result)
+                        if failed_ids:
+                            self._add_failures(failed_ids, message)
+                        self.done_count += len(chunk)
+
+                    try:
+                        retrying(run_chunk, self.env)
+                    except exceptions.UserError as error:
+                        # Refus métier : le lot est compté en échec, les suivants sont traités
+                        self._cr.rollback()
+                        self.env.invalidate_all()
+                        self._lock_and_beat()
+                        self._add_failures(chunk, str(error))
+                        self.done_count += len(chunk)
+                        self._cr.commit()
+                    self.env.invalidate_all()
+        except Exception as error:
+            self._cr.rollback()
+            self.env.invalidate_all()
+            _logger.warning("Travail %s (%s) en échec : %s", self.id, self.name, error)
+            vals = {'error': traceback.format_exc()}
+            if self.attempts < self.max_attempts and not isinstance(error, exceptions.UserError):
+                # Nouvel essai avec un délai croissant ; les lots déjà validés ne sont pas rejoués
+                vals.update(state='pending', eta=fields.Datetime.now() + timedelta(minutes=2 ** self.attempts))
+            else:
+                vals.update(state='failed', date_done=fields.Datetime.now())
+            self.write(vals)
+        else:
+            if not self.failed_count:
+                state = 'done'
+            elif self.failed_count >= self.total_count:
+                state = 'failed'
+            else:
+                state = 'partial'
+            self.write({'state': state, 'date_done': fields.Datetime.now(), 'error': False})
+        self._cr.commit()
+
+    def action_retry(self):
+        """Remet en file des travaux échoués ou annulés"""
+        jobs = self.filtered(lambda j: j.state in ('failed', 'cancelled'))
+        jobs.write({'state': 'pending', 'eta': False, 'attempts': 0, 'error': False})
+        if jobs:
+            self._cr.execute("SELECT pg_notify(%s, %s)", [JOB_CHANNEL, 'retry'])
+
+    def action_cancel(self):
+        """Annule des travaux en attente"""
+        self.filtered(lambda j: j.state == 'pending').write({'state': 'cancelled'})
+
+    @api.model
+    def _cron_run_jobs(self, stale_minutes=60):
+        """Filet de sécurité : relance les travaux bloqués puis vide la file"""
+        # Un travail resté 'running' sans activité (exécuteur arrêté) est remis en file ;
+        # celui dont un lot est en cours reste verrouillé (cf. _lock_and_beat) et est ignoré
+        self._cr.execute("""
+            UPDATE bike_shop_job
+               SET state = 'pending'
+             WHERE id IN (
+                    SELECT id FROM bike_shop_job
+                     WHERE state = 'running'
+                       AND write_date < now() AT TIME ZONE 'UTC' - make_interval(mins => %s)
+                       FOR UPDATE SKIP LOCKED
+             )
+        """, [stale_minutes])
+        self._cr.commit()
+        while self._process_next():
+            pass
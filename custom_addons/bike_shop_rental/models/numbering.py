@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import defaultdict, deque
+from odoo import models, api
+
+# Numéros pré-réservés par ce worker : {(base, id de séquence): deque de numéros}
+_prefetched = defaultdict(deque)
+_prefetched_lock = threading.Lock()
+
+
+class BikeShopNumbering(models.AbstractModel):
+    """Attribution de numéros de documents par blocs.
+
+    Un create multi réserve en un seul appel autant de numéros que de
+    documents à créer, au lieu d'un next_by_code par enregistrement :
+    - séquence standard (avec trous) : un bloc de nextval sur la séquence PostgreSQL ;
+    - séquence sans trou (no_gap) : un seul UPDATE ... RETURNING sous verrou de
+      ligne, les numéros sont consécutifs et libérés si la transaction échoue.
+
+    Pour la saisie unitaire, un petit bloc peut être pré-réservé par worker
+    (paramètre bike_shop_rental.sequence_prefetch, séquences standard
+    uniquement) afin d'éviter un aller-retour par document.
+    """
+    _name = 'bike.shop.numbering'
+    _description = 'Numérotation par blocs Bike Shop'
+
+    @api.model
+    def _get_sequence(self, code):
+        company_ids = self.env.companies.ids + [False]
+        return self.env['ir.sequence'].sudo().search(
+            [('code', '=', code), ('company_id', 'in', company_ids)],
+            order='company_id', limit=1,
+        )
+
+    @api.model
+    def _reserve_numbers(self, code, count):
+        """Réserve count numéros de la séquence code.
+
+        :return: liste de count références formatées (préfixe / remplissage / suffixe),
+            vide si la séquence n'existe pas
+        """
+        if count <= 0:
+            return []
+        sequence = self._get_sequence(code)
+        if not sequence:
+            return []
+        # Les séquences par plage de dates gardent le chemin standard d'Odoo
+        if sequence.use_date_range:
+            return [sequence.next_by_id() for __ in range(count)]
+        if sequence.implementation == 'no_gap':
+            numbers = self._reserve_gapless(sequence, count)
+        elif count == 1:
+            numbers = self._reserve_prefetched(sequence)
+        else:
+            numbers = self._reserve_block(sequence, count)
+        return [sequence.get_next_char(number) for number in numbers]
+
+    @api.model
+    def _assign_numbers(self, vals_list, field_name, code, placeholder, default):
+        """Renseigne field_name des valeurs vides (ou égales à placeholder) avec un bloc de numéros.
+
+        :param default: valeur utilisée si la séquence n'existe pas
+        """
+        pending = [vals for vals in vals_list if vals.get(field_name, placeholder) in (placeholder, False, None, '')]
+        numbers = self._reserve_numbers(code, len(pending))
+        for vals, number in zip(pending, numbers or [default] * len(pending)):
+            vals[field_name] = number
+        return vals_list
+
+    @api.model
+    def _reserve_block(self, sequence, count):
+        """Bloc de nextval sur la séquence PostgreSQL (séquence standard)"""
+        self._cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            ['ir_sequence_%03d' % sequence.id, count],
+        )
+        return [row[0] for row in self._cr.fetchall()]
+
+    @api.model
+    def _reserve_gapless(self, sequence, count):
+        """Bloc consécutif sous verrou de ligne (séquence sans trou)"""
+        self._cr.execute("""
+            UPDATE ir_sequence
+               SET number_next = number_next + number_increment * %s
+             WHERE id = %s
+         RETURNING number_next - number_increment * %s, number_increment
+        """, [count, sequence.id, count])
+        first, increment = self._cr.fetchone()
+        sequence.invalidate_recordset(['number_next'])
+        return [first + i * increment for i in range(count)]
+
+    @api.model
+    def _reserve_prefetched(self, sequence):
+        """Numéro unitaire servi depuis le bloc pré-réservé par ce worker"""
+        size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'bike_shop_rental.sequence_prefetch', 0))
+        if size <= 1:
+            return self._reserve_block(sequence, 1)
+        key = (self._cr.dbname, sequence.id)
+        with _prefetched_lock:
+            block = _prefetched[key]
+            if not block:
+                # nextval n'est pas transactionnel : le bloc reste valable
+                # même si la transaction courante est annulée
+                block.extend(self._reserve_block(sequence, size))
+            return [block.popleft()]
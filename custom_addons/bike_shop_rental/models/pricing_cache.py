@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""Cache en mémoire, par worker, des tarifs et de la flotte sélectionnable.
+
+Chaque entrée est marquée par la génération de son espace de noms ('rates' ou
+'fleet'), lue une fois par transaction dans bike_shop_pricing_generation. Toute
+transaction qui change un tarif ou la flotte incrémente la génération juste
+avant sa validation, une seule fois quel que soit le nombre d'écritures : une
+transaction qui voit la modification validée voit aussi la nouvelle génération
+et ne peut donc pas lire une entrée antérieure. Une transaction qui a elle-même
+modifié les tarifs contourne le cache.
+
+D'autres modules ajoutent leurs espaces de noms via _get_namespaces.
+
+Les écritures envoient aussi une notification PostgreSQL (canal
+bike_shop_pricing) : un thread par worker et par base (LISTEN) vide aussitôt les
+entrées périmées, qui ne seraient sinon évincées que par l'ordre LRU.
+
+Options odoo.conf :
+    bike_shop_pricing_cache_size = 10000   (entrées par base et par worker)
+    bike_shop_pricing_listener = True
+"""
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+import odoo
+from odoo import models, api, tools
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+PRICING_CHANNEL = 'bike_shop_pricing'
+NAMESPACES = ('rates', 'fleet')
+RATE_FIELDS = ('hourly_rate', 'daily_rate', 'weekly_rate', 'monthly_rate')
+MISS = object()
+
+
+class LRUCache:
+    """Dictionnaire borné (éviction du moins récemment lu) avec compteurs"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key, generation):
+        """Valeur de key si elle a été calculée à la génération generation, sinon MISS"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return MISS
+
+    def put(self, key, generation, value):
+        with self.lock:
+            self.entries[key] = (generation, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, namespace=None):
+        """Vide les entrées de namespace (toutes si None)"""
+        with self.lock:
+            keys = [key for key in self.entries if namespace is None or key[0] == namespace]
+            for key in keys:
+                del self.entries[key]
+            self.invalidations += len(keys)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+# Caches et threads d'écoute du processus, par base
+_caches = {}
+_listeners = {}
+_registry_lock = threading.Lock()
+
+
+class PricingListener(threading.Thread):
+    """Vide le cache du worker à chaque notification du canal bike_shop_pricing"""
+
+    def __init__(self, dbname, cache):
+        super().__init__(name=f'bike_shop_pricing_listener.{dbname}', daemon=True)
+        self.dbname = dbname
+        self.cache = cache
+
+    def run(self):
+        while True:
+            connection = None
+            try:
+                __, connection_info = odoo.sql_db.connection_info_for(self.dbname)
+                connection = psycopg2.connect(**connection_info)
+                connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cr:
+                    cr.execute(f'LISTEN {PRICING_CHANNEL}')
+                while True:
+                    if select.select([connection], [], [], 60) != ([], [], []):
+                        connection.poll()
+                        for namespace in {notify.payload for notify in connection.notifies}:
+                            self.cache.clear(namespace or None)
+                        connection.notifies.clear()
+            except Exception:
+                _logger.warning("Écoute du cache des tarifs interrompue sur la base %s, reprise dans 10 s",
+                                self.dbname, exc_info=True)
+                time.sleep(10)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def get_cache(dbname):
+    """Cache de la base pour ce processus (démarre son thread d'écoute au besoin)"""
+    with _registry_lock:
+        cache = _caches.get(dbname)
+        if cache is None:
+            cache = _caches[dbname] = LRUCache(int(config.get('bike_shop_pricing_cache_size') or 10000))
+        listener = _listeners.get(dbname)
+        # Après un fork (workers), le thread du parent n'existe plus dans l'enfant
+        if tools.str2bool(config.get('bike_shop_pricing_listener', True)) and (
+                listener is None or listener[0] != os.getpid() or not listener[1].is_alive()):
+            thread = PricingListener(dbname, cache)
+            thread.start()
+            _listeners[dbname] = (os.getpid(), thread)
+        return cache
+
+
+class BikeShopPricingCache(models.AbstractModel):
+    """Accès aux tarifs et à la flotte sélectionnable via le cache du worker"""
+    _name = 'bike.shop.pricing.cache'
+    _description = 'Cache des Tarifs et de la Flotte'
+
+    @api.model
+    def _get_namespaces(self):
+        """Espaces de noms du cache, chacun avec sa génération"""
+        return list(NAMESPACES)
+
+    def init(self):
+        """Crée la table des générations"""
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS bike_shop_pricing_generation (
+                namespace varchar PRIMARY KEY,
+                value bigint NOT NULL DEFAULT 0
+            )
+        """)
+        self._cr.execute("""
+            INSERT INTO bike_shop_pricing_generation (namespace)
+            SELECT unnest(%s::varchar[])
+            ON CONFLICT DO NOTHING
+        """, [self._get_namespaces()])
+
+    @api.model
+    def _get_generations(self):
+        """Générations vues par la transaction (None : modifiées par elle, cache contourné)"""
+        data = self.env.cr.precommit.data
+        generations = data.get('bike_shop_pricing_generations')
+        if generations is None:
+            self._cr.execute("SELECT namespace, value FROM bike_shop_pricing_generation")
+            generations = data['bike_shop_pricing_generations'] = dict(self._cr.fetchall())
+        return generations
+
+    @api.model
+    def _invalidate(self, namespaces):
+        """Périme les entrées de namespaces pour tous les workers, à la validation.
+
+        La transaction contourne aussitôt le cache ; les générations partagées
+        ne sont incrémentées qu'une fois, juste avant la validation (la ligne
+        de chaque espace n'est ainsi verrouillée que le temps du commit).
+        """
+        generations = self._get_generations()
+        for namespace in namespaces:
+            generations[namespace] = None
+        data = self.env.cr.precommit.data
+        pending = data.get('bike_shop_pricing_pending')
+        if pending is None:
+            pending = data['bike_shop_pricing_pending'] = set()
+            self.env.cr.precommit.add(self._bump_generations)
+        pending.update(namespaces)
+
+    @api.model
+    def _bump_generations(self):
+        """Incrémente en une requête les générations périmées par la transaction et prévient les workers"""
+        namespaces = sorted(self.env.cr.precommit.data.pop('bike_shop_pricing_pending', ()))
+        if not namespaces:
+            return
+        self._cr.execute("""
+            UPDATE bike_shop_pricing_generation SET value = value + 1 WHERE namespace IN %s
+        """, [tuple(namespaces)])
+        for namespace in namespaces:
+            self._cr.execute("SELECT pg_notify(%s, %s)", [PRICING_CHANNEL, namespace])
+
+    @api.model
+    def _get_rates(self, model_name, ids):
+        """Tarifs de bike.bike ou bike.category.
+
+        :return: dict {id: {'hourly_rate', 'daily_rate', 'weekly_rate', 'monthly_rate'}}
+        """
+        generation = self._get_generations().get('rates')
+        cache = get_cache(self._cr.dbname)
+        rates, missing = {}, []
+        for record_id in set(ids):
+            value = MISS if generation is None else cache.get(('rates', model_name, record_id), generation)
+            if value is MISS:
+                missing.append(record_id)
+            else:
+                rates[record_id] = value
+        if missing:
+            Model = self.env[model_name]
+            Model.flush_model(RATE_FIELDS)
+            self._cr.execute(f"""
+                SELECT id, {', '.join(RATE_FIELDS)} FROM "{Model._table}" WHERE id = ANY(%s)
+            """, [missing])
+            for row in self._cr.fetchall():
+                rates[row[0]] = dict(zip(RATE_FIELDS, row[1:]))
+                if generation is not None:
+                    cache.put(('rates', model_name, row[0]), generation, rates[row[0]])
+        return rates
+
+    @api.model
+    def _get_fleet(self, category_id=None):
+        """Vélos sélectionnables (actifs, confirmés, hors maintenance) d'une catégorie (toutes si None).
+
+        :return: tuple de (bike_id, frame_size), par id
+        """
+        generation = self._get_generations().get('fleet')
+        cache = get_cache(self._cr.dbname)
+        key = ('fleet', 'bike.bike', category_id or None)
+        fleet = MISS if generation is None else cache.get(key, generation)
+        if fleet is MISS:
+            self.env['bike.bike'].flush_model(['active', 'confirmation_state', 'state', 'category_id', 'frame_size'])
+            category_filter = "AND category_id = %s" if category_id else ""
+            self._cr.execute(f"""
+                SELECT id, frame_size FROM bike_bike
+                 WHERE active AND confirmation_state = 'confirmed' AND state != 'maintenance'
+                       {category_filter}
+                 ORDER BY id
+            """, [category_id] if category_id else [])
+            fleet = tuple(self._cr.fetchall())
+            if generation is not None:
+                cache.put(key, generation, fleet)
+        return fleet
+
+    @api.model
+    def get_stats(self):
+        """Compteurs du cache de ce worker pour la base courante"""
+        return get_cache(self._cr.dbname).stats()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Profilage des actions, calculs et contrôles des modules Bike Shop.
+
+Activé par bike_shop_profiling = True dans odoo.conf. Désactivé, aucune
+méthode n'est enveloppée : le coût est nul. Activé, chaque appel de
+create / write / unlink, action_*, _compute_*, _check_* et _rule_* des
+modèles bike_shop_* mesure son nombre de requêtes, son temps SQL, son temps
+Python et son nombre d'enregistrements dans un tampon en mémoire du worker,
+vidé au plus une fois par minute dans bike.shop.profile.sample (par un
+curseur séparé, hors de la transaction de l'utilisateur).
+"""
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from odoo import models, fields, api, tools
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+PROFILED_MODULES = ('bike_shop_rental', 'bike_shop_sale')
+PROFILED_PREFIXES = ('action_', '_compute_', '_check_', '_rule_')
+PROFILED_METHODS = ('create', 'write', 'unlink')
+FLUSH_INTERVAL = 60
+
+# Tampon borné par base : (date, modèle, méthode, enregistrements, requêtes, temps SQL ms, temps Python ms)
+_samples = defaultdict(lambda: deque(maxlen=20000))
+_samples_lock = threading.Lock()
+_last_flush = {}
+_local = threading.local()
+
+
+def _profiled(model_name, method_name, method):
+    """Enveloppe method pour enregistrer chaque appel dans le tampon"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        thread = threading.current_thread()
+        # Compteurs tenus par le curseur Odoo lorsqu'ils existent sur le thread
+        if not hasattr(thread, 'query_count'):
+            thread.query_count = 0
+            thread.query_time = 0
+        if method_name == 'create' and args:
+            record_count = len(args[0]) if isinstance(args[0], list) else 1
+        else:
+            record_count = len(self)
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        query_count, query_time = thread.query_count, thread.query_time
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _local.depth = depth
+            total = time.perf_counter() - started
+            sql_time = thread.query_time - query_time
+            dbname = self.env.cr.dbname
+            _samples[dbname].append((
+                fields.Datetime.now(), model_name, method_name, record_count,
+                thread.query_count - query_count, sql_time * 1000, max(total - sql_time, 0) * 1000,
+            ))
+            if not depth and time.monotonic() - _last_flush.get(dbname, 0) > FLUSH_INTERVAL:
+                _flush_samples(self.env.registry)
+    wrapper._bike_shop_profiled = True
+    return wrapper
+
+
+def _flush_samples(registry):
+    """Écrit le tampon de la base dans bike_shop_profile_sample"""
+    dbname = registry.db_name
+    with _samples_lock:
+        _last_flush[dbname] = time.monotonic()
+        samples = list(_samples[dbname])
+        _samples[dbname].clear()
+    if not samples:
+        return
+    try:
+        with registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO bike_shop_profile_sample
+                       (date, model_name, method_name, record_count, query_count, sql_time, python_time)
+                SELECT * FROM unnest(%s::timestamp[], %s::varchar[], %s::varchar[],
+                                     %s::int[], %s::int[], %s::float8[], %s::float8[])
+            """, [list(column) for column in zip(*samples)])
+    except Exception:
+        _logger.warning("Profilage : échec de l'écriture de %s mesure(s)", len(samples), exc_info=True)
+
+
+class BikeShopProfileSample(models.Model):
+    """Mesure d'un appel de méthode (profilage)"""
+    _name = 'bike.shop.profile.sample'
+    _description = 'Mesure de Profilage'
+    _order = 'date desc'
+    _log_access = False
+
+    date = fields.Datetime(string='Date', required=True, readonly=True, index=True)
+    model_name = fields.Char(string='Modèle', required=True, readonly=True)
+    method_name = fields.Char(string='Méthode', required=True, readonly=True)
+    record_count = fields.Integer(string='Enregistrements', readonly=True)
+    query_count = fields.Integer(string='Requêtes', readonly=True)
+    sql_time = fields.Float(string='Temps SQL (ms)', readonly=True)
+    python_time = fields.Float(string='Temps Python (ms)', readonly=True)
+
+    def _register_hook(self):
+        """Enveloppe les méthodes profilées si le profilage est activé"""
+        super()._register_hook()
+        if not tools.str2bool(config.get('bike_shop_profiling') or False):
+            return
+        count = 0
+        for model_name in list(self.env.registry):
+            Model = self.env[model_name]
+            if Model._abstract or Model._module not in PROFILED_MODULES or model_name.startswith('bike.shop.profile'):
+                continue
+            cls = type(Model)
+            for name in dir(cls):
+                if not (name in PROFILED_METHODS or name.startswith(PROFILED_PREFIXES)):
+                    continue
+                method = getattr(cls, name)
+                if not callable(method) or getattr(method, '_bike_shop_profiled', False):
+                    continue
+                # Les calculs / contrôles génériques du framework ne sont pas profilés
+                if name not in PROFILED_METHODS and not method.__module__.startswith('odoo.addons.bike_shop_'):
+                    continue
+                setattr(cls, name, _profiled(model_name, name, method))
+                count += 1
+        _logger.info("Profilage Bike Shop activé sur %s méthodes", count)
+
+    @api.model
+    def _cron_flush(self):
+        """Vide le tampon du worker des crons et purge les mesures anciennes"""
+        _flush_samples(self.env.registry)
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'bike_shop_rental.profiling_retention_days', 7))
+        self._cr.execute("""
+            DELETE FROM bike_shop_profile_sample
+             WHERE date < now() AT TIME ZONE 'UTC' - make_interval(days => %s)
+        """, [days])
+
+
+class BikeShopProfileReport(models.Model):
+    """Statistiques de profilage par méthode (p50 / p95)"""
+    _name = 'bike.shop.profile.report'
+    _description = 'Statistiques de Profilage'
+    _auto = False
+    _order = 'p95_time desc'
+
+    model_name = fields.Char(string='Modèle', readonly=True)
+    method_name = fields.Char(string='Méthode', readonly=True)
+    calls = fields.Integer(string='Appels', readonly=True)
+    record_count = fields.Integer(string='Enregistrements', readonly=True)
+    p50_time = fields.Float(string='p50 (ms)', readonly=True, aggregator='max')
+    p95_time = fields.Float(string='p95 (ms)', readonly=True, aggregator='max')
+    avg_queries = fields.Float(string='Requêtes / appel', readonly=True, aggregator='avg')
+    queries_per_record = fields.Float(string='Requêtes / enregistrement', readonly=True, aggregator='avg')
+    avg_sql_time = fields.Float(string='SQL moyen (ms)', readonly=True, aggregator='avg')
+    avg_python_time = fields.Float(string='Python moyen (ms)', readonly=True, aggregator='avg')
+    last_call = fields.Datetime(string='Dernier appel', readonly=True, aggregator='max')
+
+    def init(self):
+        """Initialise la vue SQL des statistiques"""
+        self._cr.execute("""
+            CREATE OR REPLACE VIEW bike_shop_profile_report AS (
+                SELECT row_number() OVER (ORDER BY model_name, method_name) AS id,
+                       model_name,
+                       method_name,
+                       count(*) AS calls,
+                       sum(record_count) AS record_count,
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY sql_time + python_time) AS p50_time,
+                       percentile_cont(0.95) WITHIN GROUP (ORDER BY sql_time + python_time) AS p95_time,
+                       avg(query_count) AS avg_queries,
+                       sum(query_count)::float / NULLIF(sum(record_count), 0) AS queries_per_record,
+                       avg(sql_time) AS avg_sql_time,
+                       avg(python_time) AS avg_python_time,
+                       max(date) AS last_call
+                  FROM bike_shop_profile_sample
+                 GROUP BY model_name, method_name
+            )
+        """)
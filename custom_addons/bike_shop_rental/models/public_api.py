@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+import json
+import psycopg2
+from datetime import timedelta
+from odoo import models, fields, api, exceptions
+
+API_KINDS = ('categories', 'availability', 'quote')
+# Les contrats ne changent que la disponibilité ; vélos et catégories changent tout
+RENTAL_KINDS = ('availability',)
+FLEET_KINDS = API_KINDS
+MAX_WINDOW_DAYS = 366
+
+
+class BikeShopApiCache(models.Model):
+    """Cache partagé des réponses de l'API publique.
+
+    Table UNLOGGED commune à tous les workers, une ligne par réponse JSON,
+    clé (type, paramètres, langue). Chaque ligne porte sa portée (catégorie,
+    période) : rental.order, bike.bike et bike.category suppriment dans la
+    même transaction les seules réponses de la portée modifiée. Les lignes
+    les moins récemment lues sont évincées au-delà de
+    bike_shop_rental.api_cache_size ; bike_shop_rental.api_cache_ttl borne
+    la durée de vie d'une réponse calculée pendant une modification concurrente.
+    """
+    _name = 'bike.shop.api.cache'
+    _description = "Cache de l'API Publique"
+    _auto = False
+    _log_access = False
+
+    key = fields.Char(string='Clé', readonly=True)
+    kind = fields.Selection([
+        ('categories', 'Catégories'),
+        ('availability', 'Disponibilité'),
+        ('quote', 'Devis'),
+    ], string='Type', readonly=True)
+    category_id = fields.Many2one('bike.category', string='Catégorie', readonly=True)
+    create_date = fields.Datetime(string='Calculée le', readonly=True)
+    last_used = fields.Datetime(string='Dernière lecture', readonly=True)
+
+    def init(self):
+        """Crée les tables du cache et du limiteur de débit"""
+        self._cr.execute("""
+            CREATE UNLOGGED TABLE IF NOT EXISTS bike_shop_api_cache (
+                id serial PRIMARY KEY,
+                key varchar NOT NULL UNIQUE,
+                kind varchar NOT NULL,
+                category_id integer,
+                period tsrange,
+                payload text NOT NULL,
+                create_date timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'UTC'),
+                last_used timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'UTC')
+            )
+        """)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS bike_shop_api_cache_last_used_idx
+            ON bike_shop_api_cache (last_used)
+        """)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS bike_shop_api_cache_scope_idx
+            ON bike_shop_api_cache (category_id, kind)
+        """)
+        self._cr.execute("""
+            CREATE UNLOGGED TABLE IF NOT EXISTS bike_shop_api_rate (
+                ip varchar NOT NULL,
+                window_start timestamp NOT NULL,
+                hits integer NOT NULL DEFAULT 1,
+                PRIMARY KEY (ip, window_start)
+            )
+        """)
+
+    # ------------------------------------------------------------------
+    # Limiteur de débit
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _check_rate_limit(self, ip):
+        """Compte la requête de ip dans la minute courante.
+
+        :return: True si ip reste sous bike_shop_rental.api_rate_limit requêtes / minute
+        """
+        limit = int(self.env['ir.config_parameter'].sudo().get_param('bike_shop_rental.api_rate_limit', 120))
+        if limit <= 0:
+            return True
+        self._cr.execute("""
+            INSERT INTO bike_shop_api_rate (ip, window_start)
+            VALUES (%s, date_trunc('minute', now() AT TIME ZONE 'UTC'))
+            ON CONFLICT (ip, window_start) DO UPDATE SET hits = bike_shop_api_rate.hits + 1
+         RETURNING hits
+        """, [ip or 'unknown'])
+        return self._cr.fetchone()[0] <= limit
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_key(self, kind, params):
+        return f"{kind}:{self.env.lang}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    @api.model
+    def _lookup(self, key):
+        """Retourne la réponse en cache (JSON) ou None"""
+        ttl = int(self.env['ir.config_parameter'].sudo().get_param('bike_shop_rental.api_cache_ttl', 300))
+        self._cr.execute("""
+            SELECT id, payload, last_used < now() AT TIME ZONE 'UTC' - interval '1 minute'
+              FROM bike_shop_api_cache
+             WHERE key = %s
+               AND create_date > now() AT TIME ZONE 'UTC' - make_interval(secs => %s)
+        """, [key, ttl])
+        row = self._cr.fetchone()
+        if not row:
+            return None
+        entry_id, payload, touch = row
+        # L'ordre LRU n'est rafraîchi qu'une fois par minute et par réponse
+        if touch:
+            self._cr.execute("""
+                UPDATE bike_shop_api_cache SET last_used = now() AT TIME ZONE 'UTC' WHERE id = %s
+            """, [entry_id])
+        return payload
+
+    @api.model
+    def _store(self, key, kind, category_id, start, end, payload):
+        """Enregistre une réponse ; une écriture concurrente de la même clé l'emporte"""
+        try:
+            with self._cr.savepoint():
+                self._cr.execute("""
+                    INSERT INTO bike_shop_api_cache (key, kind, category_id, period, payload)
+                    VALUES (%s, %s, %s, CASE WHEN %s::timestamp IS NOT NULL THEN tsrange(%s, %s, '[)') END, %s)
+                    ON CONFLICT (key) DO UPDATE
+                       SET payload = EXCLUDED.payload,
+                           period = EXCLUDED.period,
+                           create_date = EXCLUDED.create_date,
+                           last_used = EXCLUDED.last_used
+                 RETURNING id
+                """, [key, kind, category_id, start, start, end, payload])
+                entry_id = self._cr.fetchone()[0]
+        except psycopg2.Error:
+            return
+        if not entry_id % 100:
+            self._evict()
+
+    @api.model
+    def _evict(self):
+        """Supprime les réponses les moins récemment lues au-delà de la taille du cache"""
+        size = int(self.env['ir.config_parameter'].sudo().get_param('bike_shop_rental.api_cache_size', 10000))
+        self._cr.execute("""
+            DELETE FROM bike_shop_api_cache
+             WHERE id IN (
+                    SELECT id FROM bike_shop_api_cache
+                     ORDER BY last_used DESC
+                    OFFSET %s
+             )
+        """, [size])
+
+    @api.model
+    def _invalidate(self, kinds, scopes):
+        """Supprime les réponses des types kinds dont la portée recoupe scopes.
+
+        :param scopes: [(category_id, start, end)] ; category_id None vaut toutes
+            les catégories, start / end None une période non bornée
+        """
+        scopes = set(scopes)
+        if not scopes:
+            return
+        category_ids, starts, ends = [], [], []
+        for category_id, start, end in scopes:
+            if start and end and end < start:
+                start, end = end, start
+            category_ids.append(category_id or None)
+            starts.append(start or None)
+            ends.append(end or None)
+        self._cr.execute("""
+            DELETE FROM bike_shop_api_cache c
+             USING unnest(%s::int[], %s::timestamp[], %s::timestamp[]) AS t(category_id, start_date, end_date)
+             WHERE c.kind IN %s
+               AND (c.category_id IS NULL OR t.category_id IS NULL OR c.category_id = t.category_id)
+               AND (c.period IS NULL OR c.period && tsrange(t.start_date, t.end_date, '[]'))
+        """, [category_ids, starts, ends, tuple(kinds)])
+
+    @api.model
+    def _cron_cleanup(self):
+        """Purge les réponses expirées et les compteurs de débit passés"""
+        ttl = int(self.env['ir.config_parameter'].sudo().get_param('bike_shop_rental.api_cache_ttl', 300))
+        self._cr.execute("""
+            DELETE FROM bike_shop_api_cache
+             WHERE create_date < now() AT TIME ZONE 'UTC' - make_interval(secs => %s)
+        """, [ttl])
+        self._evict()
+        self._cr.execute("""
+            DELETE FROM bike_shop_api_rate
+             WHERE window_start < date_trunc('minute', now() AT TIME ZONE 'UTC')
+        """)
+
+    # ------------------------------------------------------------------
+    # Réponses
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_window(self, start, end):
+        """Valide la fenêtre demandée"""
+        try:
+            start = fields.Datetime.to_datetime(start)
+            end = fields.Datetime.to_datetime(end)
+        except (ValueError, TypeError):
+            raise exceptions.ValidationError("Dates invalides (format attendu : AAAA-MM-JJ HH:MM:SS).")
+        if not start or not end or end <= start or end - start > timedelta(days=MAX_WINDOW_DAYS):
+            raise exceptions.ValidationError(
+                f"La période demandée n'est pas valide ({MAX_WINDOW_DAYS} jours au plus).")
+        return start, end
+
+    @api.model
+    def _serve(self, kind, start=None, end=None, category_id=None, bike_id=None, frame_size=None):
+        """Retourne la réponse JSON (texte) de kind, depuis le cache si possible"""
+        if start or end or kind != 'categories':
+            start, end = self._get_window(start, end)
+        if frame_size and frame_size not in dict(self.env['bike.bike']._fields['frame_size'].selection):
+            raise exceptions.ValidationError(f"Taille de cadre inconnue : {frame_size}")
+        if bike_id:
+            # Mêmes vélos sélectionnables que search_available
+            bike = self.env['bike.bike'].sudo().search([
+                ('id', '=', bike_id),
+                ('confirmation_state', '=', 'confirmed'),
+                ('state', '!=', 'maintenance'),
+            ])
+            if not bike:
+                raise exceptions.MissingError("Vélo inconnu ou indisponible.")
+            category_id = bike.category_id.id
+        params = {'start': start, 'end': end, 'category_id': category_id,
+                  'bike_id': bike_id, 'frame_size': frame_size}
+        key = self._get_key(kind, params)
+        payload = self._lookup(key)
+        if payload is None:
+            payload = json.dumps(getattr(self, f'_build_{kind}')(**params), default=str)
+            self._store(key, kind, category_id, start, end, payload)
+        return payload
+
+    @api.model
+    def _build_categories(self, **params):
+        categories = self.env['bike.category'].sudo().search_read([], [
+            'name', 'description', 'hourly_rate', 'daily_rate', 'weekly_rate', 'monthly_rate',
+        ])
+        return {'categories': categories}
+
+    @api.model
+    def _build_availability(self, start, end, category_id=None, frame_size=None, **params):
+        bikes = self.env['bike.bike'].sudo().search_available(start, end, category_id, frame_size)
+        rows = bikes.read(['name', 'category_id', 'model', 'year', 'frame_size', 'color',
+                           'hourly_rate', 'daily_rate', 'weekly_rate', 'monthly_rate'])
+        for row in rows:
+            row['category_id'] = row['category_id'] and row['category_id'][0]
+        return {'start': start, 'end': end, 'bikes': rows}
+
+    @api.model
+    def _build_quote(self, start, end, category_id=None, bike_id=None, **params):
+        quote = self.env['rental.order'].sudo().quote_batch([{
+            'bike_id': bike_id, 'category_id': category_id, 'start': start, 'end': end,
+        }])[0]
+        return {'start': start, 'end': end, 'bike_id': bike_id, 'category_id': category_id, 'quote': quote}
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class RentalLifecycleRun(models.Model):
+    """Mesures d'une exécution du planificateur du cycle de vie (cf. rental.order._cron_lifecycle)"""
+    _name = 'rental.lifecycle.run'
+    _description = 'Exécution du Planificateur de Locations'
+    _order = 'date desc'
+    _log_access = False
+
+    date = fields.Datetime(string='Date', required=True, readonly=True, index=True)
+    duration = fields.Float(string='Durée (s)', readonly=True)
+    query_count = fields.Integer(string='Requêtes', readonly=True)
+    chunk_count = fields.Integer(string='Lots', readonly=True)
+    started_count = fields.Integer(string='Contrats démarrés', readonly=True)
+    skipped_count = fields.Integer(string='Démarrages ignorés', readonly=True)
+    overdue_count = fields.Integer(string='Contrats en retard', readonly=True)
+    new_overdue_count = fields.Integer(string='Nouveaux retards', readonly=True)
+    late_fee_amount = fields.Float(string='Pénalités facturées (€)', readonly=True)
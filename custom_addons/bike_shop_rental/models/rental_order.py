@@ -1,24 +1,76 @@
 # -*- coding: utf-8 -*-
-import re
+import hashlib
+import logging
+import time
+from collections import Counter, defaultdict
+import psycopg2
 from odoo import models, fields, api, exceptions
+from .public_api import RENTAL_KINDS
+from .validation_mixin import email_error, phone_error, name_digits_error
+
+_logger = logging.getLogger(__name__)
 
 
 class RentalOrder(models.Model):
     """Contrat de location de vélo"""
     _name = 'rental.order'
+    _inherit = ['bike.shop.validation.mixin']
     _description = 'Contrat de Location'
     _order = 'start_date desc, id desc'
 
+    # États pour lesquels un contrat réserve le vélo sur sa période
+    _BLOCKING_STATES = ('confirmed', 'ongoing')
+
+    # Transitions du cycle de vie :
+    # clé -> (états de départ, état d'arrivée, champ date à horodater, nouvel état du vélo)
+    _TRANSITIONS = {
+        'start': (('confirmed',), 'ongoing', None, 'rented'),
+        'end': (('ongoing',), 'done', 'actual_return_date', 'available'),
+        'cancel': (('draft', 'confirmed'), 'cancelled', None, None),
+        'invoice': (('done',), 'invoiced', 'invoice_date', None),
+        'pay': (('invoiced',), 'paid', 'payment_date', None),
+    }
+
+    # Actions groupées pouvant être envoyées en arrière-plan (cf. bike.shop.job.enqueue.wizard)
+    _QUEUEABLE_ACTIONS = {
+        'action_confirm': "Confirmer",
+        'action_start_rental': "Démarrer",
+        'action_end_rental': "Terminer",
+        'action_invoice': "Facturer",
+        'action_pay': "Marquer payé",
+        'action_cancel': "Annuler",
+        '_render_contracts': "Générer les contrats PDF",
+    }
+
+    # Durée minimale (jours) de chaque type de location, cf. _rule_rental_type_duration
+    _RENTAL_TYPE_MIN_DAYS = {'hourly': 0, 'daily': 1, 'weekly': 7, 'monthly': 30}
+
+    # Champs dont la modification invalide l'occupation du vélo et le cumul journalier
+    _REPORTING_FIELDS = {'bike_id', 'start_date', 'end_date', 'state', 'rental_type', 'unit_price'}
+
+    # Champs imprimés sur le contrat : leur empreinte identifie le PDF en cache
+    _CONTRACT_PRINT_FIELDS = (
+        'name', 'customer_name', 'partner_id', 'partner_phone', 'partner_email', 'bike_id',
+        'bike_category', 'start_date', 'end_date', 'duration_days', 'rental_type',
+        'unit_price', 'quantity', 'total_amount',
+    )
+    # États pour lesquels le contrat PDF est conservé en pièce jointe
+    _CONTRACT_CACHED_STATES = ('confirmed', 'ongoing', 'done', 'invoiced', 'paid')
+
     name = fields.Char(string='Numéro', required=True, copy=False, readonly=True, default='Nouveau')
 
     # Client
-    partner_id = fields.Many2one('res.partner', string='Client Existant')
+    partner_id = fields.Many2one('res.partner', string='Client Existant', index='btree_not_null')
     customer_name = fields.Char(string='Nom du Client', compute='_compute_customer_name', store=True, readonly=False)
     partner_phone = fields.Char(string='Téléphone')
     partner_email = fields.Char(string='Email')
 
     # Vélo
-    bike_id = fields.Many2one('bike.bike', string='Vélo', domain="[('state', '=', 'available')]")
+    bike_id = fields.Many2one(
+        'bike.bike', string='Vélo', index=True,
+        domain="[('confirmation_state', '=', 'confirmed'), ('is_available', '=', True)]",
+        context="{'rental_start': start_date, 'rental_end': end_date}",
+    )
     bike_category = fields.Char(related='bike_id.category_id.name', string='Catégorie', store=True)
 
     # Période de location
@@ -54,11 +106,26 @@ class RentalOrder(models.Model):
         ('cancelled', 'Annulé'),
     ], string='État', default='draft', required=True, group_expand='_group_expand_states')
 
+    # Contrats actifs d'un vélo (disponibilité, démarrages et retards)
+    _active_bike_idx = models.Index("(bike_id, start_date, end_date) WHERE state IN ('confirmed', 'ongoing')")
+    # Kanban / rapports par état et période
+    _state_start_idx = models.Index('(state, start_date)')
+    # Planificateur : contrats confirmés à démarrer et contrats en cours échus
+    _confirmed_start_idx = models.Index("(start_date, id) WHERE state = 'confirmed'")
+    _ongoing_end_idx = models.Index("(end_date, id) WHERE state = 'ongoing'")
+    # Ordre par défaut des listes (_order)
+    _start_date_id_idx = models.Index('(start_date DESC, id DESC)')
+
     @api.model
     def _group_expand_states(self, states, domain):
         """Force l'ordre des colonnes dans le kanban"""
         return ['confirmed', 'ongoing', 'done', 'invoiced', 'paid']
 
+    # Retard (maintenu par le planificateur, cf. _cron_lifecycle)
+    is_overdue = fields.Boolean(string='En Retard', readonly=True, copy=False)
+    late_fee = fields.Float(string='Pénalités de Retard (€)', readonly=True, copy=False)
+    late_fee_until = fields.Datetime(string="Pénalités calculées jusqu'au", readonly=True, copy=False)
+
     # Facturation
     invoice_date = fields.Datetime(string='Date de Facturation', readonly=True)
     payment_date = fields.Datetime(string='Date de Paiement', readonly=True)
@@ -66,6 +133,9 @@ class RentalOrder(models.Model):
     # Notes
     notes = fields.Text(string='Notes')
 
+    # Nom de la pièce jointe du contrat PDF en cache (cf. action_report_rental_contract)
+    contract_attachment_name = fields.Char(string='Pièce jointe du contrat', compute='_compute_contract_attachment_name')
+
     @api.depends('partner_id')
     def _compute_customer_name(self):
         """Calcule le nom du client depuis partner_id s'il existe"""
@@ -97,214 +167,620 @@ class RentalOrder(models.Model):
 
     @api.depends('bike_id', 'rental_type')
     def _compute_unit_price(self):
-        """Récupère le prix unitaire selon le type de location"""
+        """Récupère le prix unitaire selon le type de location (tarifs lus dans le cache du worker)"""
+        rates = self.env['bike.shop.pricing.cache']._get_rates('bike.bike', self.bike_id._origin.ids)
         for rental in self:
-            if rental.bike_id:
-                if rental.rental_type == 'hourly':
-                    rental.unit_price = rental.bike_id.hourly_rate
-                elif rental.rental_type == 'daily':
-                    rental.unit_price = rental.bike_id.daily_rate
-                elif rental.rental_type == 'weekly':
-                    rental.unit_price = rental.bike_id.weekly_rate
-                elif rental.rental_type == 'monthly':
-                    rental.unit_price = rental.bike_id.monthly_rate
-            else:
+            bike_rates = rates.get(rental.bike_id._origin.id)
+            if bike_rates and rental.rental_type:
+                rental.unit_price = bike_rates[f'{rental.rental_type}_rate']
+            elif not rental.bike_id:
                 rental.unit_price = 0
 
+    @staticmethod
+    def _get_rental_quantity(rental_type, duration_hours, duration_days):
+        """Quantité facturée pour un type de location et une durée"""
+        if rental_type == 'hourly':
+            return duration_hours
+        elif rental_type == 'daily':
+            return max(1, round(duration_days, 0))
+        elif rental_type == 'weekly':
+            return max(1, round(duration_days / 7, 1))
+        elif rental_type == 'monthly':
+            return max(1, round(duration_days / 30, 1))
+        return 1
+
     @api.depends('rental_type', 'duration_hours', 'duration_days')
     def _compute_quantity(self):
         """Calcule la quantité selon le type de location"""
         for rental in self:
-            if rental.rental_type == 'hourly':
-                rental.quantity = rental.duration_hours
-            elif rental.rental_type == 'daily':
-                rental.quantity = max(1, round(rental.duration_days, 0))
-            elif rental.rental_type == 'weekly':
-                rental.quantity = max(1, round(rental.duration_days / 7, 1))
-            elif rental.rental_type == 'monthly':
-                rental.quantity = max(1, round(rental.duration_days / 30, 1))
-            else:
-                rental.quantity = 1
+            rental.quantity = self._get_rental_quantity(
+                rental.rental_type, rental.duration_hours, rental.duration_days)
 
-    @api.depends('unit_price', 'quantity')
+    @api.depends('unit_price', 'quantity', 'late_fee')
     def _compute_subtotal(self):
-        """Calcule le total"""
+        """Calcule le total (pénalités de retard comprises)"""
         for rental in self:
             rental.subtotal = rental.unit_price * rental.quantity
-            rental.total_amount = rental.subtotal
+            rental.total_amount = rental.subtotal + rental.late_fee
+
+    @api.depends(*_CONTRACT_PRINT_FIELDS, 'state', 'partner_id.write_date', 'bike_id.name')
+    def _compute_contract_attachment_name(self):
+        """Nom du PDF en cache : numéro + empreinte des champs imprimés.
 
-    @api.constrains('start_date', 'end_date', 'state')
-    def _check_rental_dates(self):
+        Un contrat modifié change d'empreinte, donc de nom : le rapport ne
+        retrouve plus l'ancienne pièce jointe et le PDF est régénéré. Les
+        brouillons et contrats annulés ne sont pas mis en cache.
+        """
+        company = self.env.company
+        for rental in self:
+            if rental.state not in self._CONTRACT_CACHED_STATES:
+                rental.contract_attachment_name = False
+                continue
+            printed = [rental[name] for name in self._CONTRACT_PRINT_FIELDS]
+            # Coordonnées du client et en-tête de la société (mise en page)
+            printed += [rental.partner_id.write_date, rental.bike_id.name, company.id, company.write_date]
+            digest = hashlib.sha1(repr(printed).encode()).hexdigest()[:12]
+            rental.contract_attachment_name = f"Contrat-{rental.name}-{digest}.pdf"
+
+    @api.model
+    def _requote_drafts(self, prices):
+        """Re-tarife des contrats en brouillon, une écriture par prix distinct
+
+        :param prices: dict {rental_id: nouveau prix unitaire}
+            (cf. bike.category._get_requoted_drafts_condition)
+        """
+        by_price = defaultdict(list)
+        for rental_id, price in prices.items():
+            by_price[price].append(rental_id)
+        for price, rental_ids in by_price.items():
+            self.browse(rental_ids).write({'unit_price': price})
+
+    @api.model
+    def quote_batch(self, requests):
+        """Calcule le tarif le moins cher pour de nombreux créneaux, sans créer de contrat.
+
+        Les grilles tarifaires des vélos et catégories concernés sont lues une seule
+        fois (cache des tarifs du worker), puis chaque type de location éligible (durée minimale de
+        _rule_rental_type_duration) est évalué pour chaque créneau.
+
+        :param requests: liste de dicts {'bike_id' ou 'category_id', 'start', 'end'}
+        :return: liste alignée sur requests de dicts
+            {'rental_type', 'unit_price', 'quantity', 'total'}, ou None si le créneau
+            n'est pas valide ou qu'aucun tarif ne s'applique
+        """
+        rate_fields = [f'{rental_type}_rate' for rental_type in self._RENTAL_TYPE_MIN_DAYS]
+        bike_ids = {req['bike_id'] for req in requests if req.get('bike_id')}
+        category_ids = {req['category_id'] for req in requests if not req.get('bike_id') and req.get('category_id')}
+        rates = {}
+        Pricing = self.env['bike.shop.pricing.cache']
+        for bike_id, row in Pricing._get_rates('bike.bike', bike_ids).items():
+            rates[('bike', bike_id)] = [row[name] for name in rate_fields]
+        for category_id, row in Pricing._get_rates('bike.category', category_ids).items():
+            rates[('category', category_id)] = [row[name] for name in rate_fields]
+
+        rental_types = list(self._RENTAL_TYPE_MIN_DAYS.items())
+        quotes = []
+        for req in requests:
+            key = ('bike', req['bike_id']) if req.get('bike_id') else ('category', req.get('category_id'))
+            start = fields.Datetime.to_datetime(req.get('start'))
+            end = fields.Datetime.to_datetime(req.get('end'))
+            if key not in rates or not start or not end or end <= start:
+                quotes.append(None)
+                continue
+            seconds = (end - start).total_seconds()
+            duration_hours, duration_days = seconds / 3600, seconds / 86400
+            best = None
+            for (rental_type, min_days), rate in zip(rental_types, rates[key]):
+                if duration_days < min_days or not rate:
+                    continue
+                quantity = self._get_rental_quantity(rental_type, duration_hours, duration_days)
+                total = rate * quantity
+                if best is None or total < best['total']:
+                    best = {'rental_type': rental_type, 'unit_price': rate, 'quantity': quantity, 'total': total}
+            quotes.append(best)
+        return quotes
+
+    # Règles métier évaluées en une passe par bike.shop.validation.mixin :
+    # (champs déclencheurs, méthode règle)
+    _validation_rules = (
+        (('start_date', 'end_date', 'state'), '_rule_rental_dates'),
+        (('rental_type', 'start_date', 'end_date', 'state'), '_rule_rental_type_duration'),
+        (('partner_email', 'state'), '_rule_email'),
+        (('partner_phone', 'state'), '_rule_phone'),
+        (('customer_name', 'state'), '_rule_customer_name'),
+        (('bike_id', 'state'), '_rule_bike_id'),
+        (('start_date', 'end_date', 'rental_type', 'state'), '_rule_required_fields'),
+        (('start_date', 'state'), '_rule_start_date'),
+    )
+
+    def _rule_rental_dates(self):
         """Vérifie que les dates sont cohérentes (sauf si annulé)"""
-        for record in self:
-            if record.state != 'cancelled' and record.end_date and record.start_date:
-                if record.end_date <= record.start_date:
-                    raise exceptions.ValidationError("La date de fin doit être après la date de début.")
+        if self.state != 'cancelled' and self.end_date and self.start_date:
+            if self.end_date <= self.start_date:
+                return "La date de fin doit être après la date de début."
 
-    @api.constrains('rental_type', 'start_date', 'end_date', 'state')
-    def _check_rental_type_duration(self):
+    def _rule_rental_type_duration(self):
         """Vérifie que le type de location correspond à la durée (sauf si annulé)"""
-        for record in self:
-            if record.state != 'cancelled' and record.start_date and record.end_date and record.rental_type:
-                duration_days = record.duration_days
-                # Afficher en jours entiers dans le message
-                duration_days_int = int(duration_days)
-
-                if record.rental_type == 'monthly' and duration_days < 30:
-                    raise exceptions.ValidationError(
-                        "Pour une location mensuelle, la durée doit être d'au moins 30 jours. "
-                        f"Durée actuelle : {duration_days_int} jour(s)."
-                    )
-                elif record.rental_type == 'weekly' and duration_days < 7:
-                    raise exceptions.ValidationError(
-                        "Pour une location hebdomadaire, la durée doit être d'au moins 7 jours. "
-                        f"Durée actuelle : {duration_days_int} jour(s)."
-                    )
-                elif record.rental_type == 'daily' and duration_days < 1:
-                    raise exceptions.ValidationError(
-                        "Pour une location journalière, la durée doit être d'au moins 1 jour. "
-                        f"Durée actuelle : {duration_days_int} jour(s)."
-                    )
+        if self.state != 'cancelled' and self.start_date and self.end_date and self.rental_type:
+            duration_days = self.duration_days
+            # Afficher en jours entiers dans le message
+            duration_days_int = int(duration_days)
+
+            if self.rental_type == 'monthly' and duration_days < 30:
+                return (
+                    "Pour une location mensuelle, la durée doit être d'au moins 30 jours. "
+                    f"Durée actuelle : {duration_days_int} jour(s)."
+                )
+            elif self.rental_type == 'weekly' and duration_days < 7:
+                return (
+                    "Pour une location hebdomadaire, la durée doit être d'au moins 7 jours. "
+                    f"Durée actuelle : {duration_days_int} jour(s)."
+                )
+            elif self.rental_type == 'daily' and duration_days < 1:
+                return (
+                    "Pour une location journalière, la durée doit être d'au moins 1 jour. "
+                    f"Durée actuelle : {duration_days_int} jour(s)."
+                )
 
-    @api.constrains('partner_email', 'state')
-    def _check_email(self):
+    def _rule_email(self):
         """Vérifie le format de l'email (sauf si annulé)"""
-        email_regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        for record in self:
-            if record.state != 'cancelled' and record.partner_email and not re.match(email_regex, record.partner_email):
-                raise exceptions.ValidationError(
-                    f"L'email '{record.partner_email}' n'est pas valide. "
-                    "Format attendu : exemple@domaine.com"
-                )
+        if self.state != 'cancelled':
+            return email_error(self.partner_email)
 
-    @api.constrains('partner_phone', 'state')
-    def _check_phone(self):
+    def _rule_phone(self):
         """Vérifie le format du téléphone (sauf si annulé)"""
-        # Accepte les formats: +33612345678, 0612345678, +33 6 12 34 56 78, etc.
-        phone_regex = r'^(\+\d{1,3}[\s.-]?)?\(?\d{1,4}\)?[\s.-]?\d{1,4}[\s.-]?\d{1,4}[\s.-]?\d{1,9}$'
-        for record in self:
-            if record.state != 'cancelled' and record.partner_phone:
-                # Enlever les espaces pour vérifier qu'il y a assez de chiffres
-                phone_digits = re.sub(r'[^\d]', '', record.partner_phone)
-                if len(phone_digits) < 10:
-                    raise exceptions.ValidationError(
-                        f"Le numéro de téléphone '{record.partner_phone}' n'est pas valide. "
-                        "Il doit contenir au moins 10 chiffres."
-                    )
-                if not re.match(phone_regex, record.partner_phone):
-                    raise exceptions.ValidationError(
-                        f"Le numéro de téléphone '{record.partner_phone}' n'est pas valide. "
-                        "Format attendu : +33612345678 ou 0612345678"
-                    )
+        if self.state != 'cancelled':
+            return phone_error(self.partner_phone)
 
-    @api.constrains('customer_name', 'state')
-    def _check_customer_name(self):
+    def _rule_customer_name(self):
         """Vérifie que le nom du client n'est pas vide (sauf si annulé)"""
-        for record in self:
-            if record.state != 'cancelled':
-                if not record.customer_name or not record.customer_name.strip():
-                    raise exceptions.ValidationError(
-                        "Le nom du client est obligatoire."
-                    )
-                if len(record.customer_name.strip()) < 2:
-                    raise exceptions.ValidationError(
-                        "Le nom du client doit contenir au moins 2 caractères."
-                    )
-                # Vérifier que le nom ne contient pas de chiffres
-                if any(char.isdigit() for char in record.customer_name):
-                    raise exceptions.ValidationError(
-                        f"Le nom du client '{record.customer_name}' n'est pas valide. "
-                        "Le nom ne peut pas contenir de chiffres."
-                    )
-
-    @api.constrains('bike_id', 'state')
-    def _check_bike_id(self):
+        if self.state != 'cancelled':
+            if not self.customer_name or not self.customer_name.strip():
+                return "Le nom du client est obligatoire."
+            if len(self.customer_name.strip()) < 2:
+                return "Le nom du client doit contenir au moins 2 caractères."
+            # Vérifier que le nom ne contient pas de chiffres
+            return name_digits_error(self.customer_name)
+
+    def _rule_bike_id(self):
         """Vérifie qu'un vélo est sélectionné (sauf si annulé)"""
-        for record in self:
-            if record.state != 'cancelled' and not record.bike_id:
-                raise exceptions.ValidationError(
-                    "Vous devez sélectionner un vélo."
-                )
+        if self.state != 'cancelled' and not self.bike_id:
+            return "Vous devez sélectionner un vélo."
 
-    @api.constrains('start_date', 'end_date', 'rental_type', 'state')
-    def _check_required_fields(self):
+    def _rule_required_fields(self):
         """Vérifie que les champs requis sont remplis (sauf si annulé)"""
-        for record in self:
-            if record.state != 'cancelled':
-                if not record.start_date:
-                    raise exceptions.ValidationError(
-                        "La date de début est obligatoire."
-                    )
-                if not record.end_date:
-                    raise exceptions.ValidationError(
-                        "La date de fin est obligatoire."
-                    )
-                if not record.rental_type:
-                    raise exceptions.ValidationError(
-                        "Le type de location est obligatoire."
-                    )
-
-    @api.constrains('start_date', 'state')
-    def _check_start_date(self):
+        if self.state != 'cancelled':
+            if not self.start_date:
+                return "La date de début est obligatoire."
+            if not self.end_date:
+                return "La date de fin est obligatoire."
+            if not self.rental_type:
+                return "Le type de location est obligatoire."
+
+    def _rule_start_date(self):
         """Vérifie que la date de début n'est pas dans le passé pour les nouveaux contrats"""
-        for record in self:
-            # Seulement pour les nouveaux contrats en brouillon (pas annulés)
-            if record.state == 'draft' and record.start_date and record.start_date < fields.Datetime.now():
-                raise exceptions.ValidationError(
-                    "La date de début ne peut pas être dans le passé."
-                )
+        # Seulement pour les nouveaux contrats en brouillon (pas annulés)
+        if self.state == 'draft' and self.start_date and self.start_date < fields.Datetime.now():
+            return "La date de début ne peut pas être dans le passé."
+
+    def init(self):
+        """Crée la colonne de période et la contrainte d'exclusion anti-chevauchement"""
+        self._cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        # Période de location maintenue par PostgreSQL à partir de start_date / end_date
+        self._cr.execute("""
+            ALTER TABLE rental_order
+            ADD COLUMN IF NOT EXISTS rental_period tsrange
+            GENERATED ALWAYS AS (
+                CASE WHEN end_date > start_date
+                     THEN tsrange(start_date, end_date, '[)')
+                END
+            ) STORED
+        """)
+        # Deux contrats confirmés/en cours ne peuvent pas réserver le même vélo
+        # sur des périodes qui se chevauchent (protège aussi des confirmations concurrentes)
+        self._cr.execute("""
+            SELECT 1 FROM pg_constraint WHERE conname = 'rental_order_bike_period_excl'
+        """)
+        if not self._cr.fetchone():
+            self._cr.execute("""
+                ALTER TABLE rental_order
+                ADD CONSTRAINT rental_order_bike_period_excl
+                EXCLUDE USING gist (bike_id WITH =, rental_period WITH &&)
+                WHERE (state IN ('confirmed', 'ongoing') AND bike_id IS NOT NULL)
+            """)
+        # Index GiST sur toutes les périodes (planning, rapports par intervalle)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS rental_order_rental_period_gist
+            ON rental_order USING gist (rental_period)
+        """)
 
     @api.model_create_multi
     def create(self, vals_list):
-        """Génère automatiquement le numéro de contrat"""
-        for vals in vals_list:
-            if vals.get('name', 'Nouveau') == 'Nouveau':
-                vals['name'] = self.env['ir.sequence'].next_by_code('rental.order') or 'Nouveau'
-        return super(RentalOrder, self).create(vals_list)
+        """Génère automatiquement les numéros de contrat (un bloc pour tout le lot)"""
+        self.env['bike.shop.numbering']._assign_numbers(vals_list, 'name', 'rental.order', 'Nouveau', 'Nouveau')
+        rentals = super(RentalOrder, self).create(vals_list)
+        self.env['bike.bike']._apply_rental_count_deltas(Counter(rental.bike_id.id for rental in rentals))
+        self.env['bike.occupancy.report']._mark_bikes_dirty(rentals.bike_id.ids)
+        Daily = self.env['rental.report.daily']
+        Daily._apply_contributions({}, Daily._get_contributions(rentals))
+        self.env['bike.shop.api.cache']._invalidate(RENTAL_KINDS, rentals._get_api_cache_scopes())
+        return rentals
+
+    def write(self, vals):
+        """Met à jour les compteurs, l'occupation et le cumul journalier concernés"""
+        if not self._REPORTING_FIELDS & set(vals):
+            return super().write(vals)
+        Daily = self.env['rental.report.daily']
+        before = Counter(rental.bike_id.id for rental in self)
+        contributions_before = Daily._get_contributions(self)
+        scopes_before = self._get_api_cache_scopes()
+        res = super().write(vals)
+        self.env['bike.shop.api.cache']._invalidate(RENTAL_KINDS, scopes_before + self._get_api_cache_scopes())
+        Daily._apply_contributions(contributions_before, Daily._get_contributions(self))
+        if 'bike_id' in vals:
+            deltas = Counter(rental.bike_id.id for rental in self)
+            deltas.subtract(before)
+            self.env['bike.bike']._apply_rental_count_deltas(deltas)
+        self.env['bike.occupancy.report']._mark_bikes_dirty(list(before) + self.bike_id.ids)
+        return res
+
+    def unlink(self):
+        """Décrémente le nombre de locations des vélos"""
+        deltas = Counter(rental.bike_id.id for rental in self)
+        Daily = self.env['rental.report.daily']
+        Daily._apply_contributions(Daily._get_contributions(self), {})
+        self.env['bike.shop.api.cache']._invalidate(RENTAL_KINDS, self._get_api_cache_scopes())
+        res = super().unlink()
+        self.env['bike.bike']._apply_rental_count_deltas({bike_id: -count for bike_id, count in deltas.items()})
+        self.env['bike.occupancy.report']._mark_bikes_dirty(list(deltas))
+        return res
+
+    def _get_api_cache_scopes(self):
+        """Portées (catégorie, début, fin) de l'API publique couvertes par les contrats bloquants"""
+        return [
+            (rental.bike_id.category_id.id, rental.start_date, rental.end_date)
+            for rental in self if rental.state in self._BLOCKING_STATES
+        ]
 
     def action_confirm(self):
         """Confirme la location"""
+        Bike = self.env['bike.bike']
         for rental in self:
             if rental.state == 'draft':
-                # Vérifier que le vélo est toujours disponible
-                if rental.bike_id.state != 'available':
+                # Vérifier que le vélo est sélectionnable et libre sur la période du contrat
+                # (une requête limitée à ce vélo)
+                bike = rental.bike_id
+                if not bike.active or bike.confirmation_state != 'confirmed' or bike.state == 'maintenance' \
+                        or Bike._get_busy_bike_ids(bike.ids, rental.start_date, rental.end_date):
+                    raise exceptions.ValidationError(
+                        f"Le vélo '{rental.bike_id.name}' n'est pas disponible "
+                        f"du {rental.start_date} au {rental.end_date}."
+                    )
+                # La contrainte d'exclusion tranche entre deux confirmations simultanées
+                try:
+                    with self._cr.savepoint():
+                        rental.state = 'confirmed'
+                        rental.flush_recordset(['state'])
+                except psycopg2.errors.ExclusionViolation:
                     raise exceptions.ValidationError(
-                        f"Le vélo '{rental.bike_id.name}' n'est plus disponible. "
-                        f"État actuel : {dict(rental.bike_id._fields['state'].selection).get(rental.bike_id.state)}"
+                        f"Le vélo '{rental.bike_id.name}' vient d'être réservé sur une période "
+                        "qui chevauche ce contrat."
                     )
-                rental.state = 'confirmed'
+        # Le PDF du contrat est pré-généré en tâche de fond
+        cron = self.env.ref('bike_shop_rental.ir_cron_prerender_contracts', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    def _apply_transition(self, transition):
+        """Applique une transition d'état à tout le lot en écritures groupées.
+
+        Les contrats et leurs vélos sont verrouillés avec FOR UPDATE SKIP LOCKED :
+        une ligne déjà verrouillée par un autre worker est ignorée au lieu de
+        bloquer tout le lot.
+
+        :param transition: clé de _TRANSITIONS
+        :return: dict {'done': [ids], 'failed': {id: raison}, 'locked': [ids]}
+            où 'locked' liste les contrats ignorés car verrouillés ailleurs
+        """
+        from_states, to_state, date_field, bike_state = self._TRANSITIONS[transition]
+        report = {'done': [], 'failed': {}, 'locked': []}
+        if not self:
+            return report
+        self.flush_recordset()
+        self._cr.execute("""
+            SELECT id, bike_id FROM rental_order
+             WHERE id IN %s AND state IN %s
+               FOR UPDATE SKIP LOCKED
+        """, [tuple(self.ids), from_states])
+        locked = dict(self._cr.fetchall())
+        if bike_state and locked:
+            bike_ids = tuple({bike_id for bike_id in locked.values() if bike_id})
+            locked_bikes = set()
+            if bike_ids:
+                self._cr.execute("""
+                    SELECT id FROM bike_bike WHERE id IN %s FOR UPDATE SKIP LOCKED
+                """, [bike_ids])
+                locked_bikes = {row[0] for row in self._cr.fetchall()}
+            for rental_id, bike_id in list(locked.items()):
+                if bike_id and bike_id not in locked_bikes:
+                    report['failed'][rental_id] = "Vélo en cours de modification par un autre utilisateur."
+                    report['locked'].append(rental_id)
+                    del locked[rental_id]
+        # L'état en cache peut être périmé : il vient d'être relu sous verrou
+        self.invalidate_recordset(['state'])
+        state_labels = dict(self._fields['state'].selection)
+        for rental in self:
+            if rental.id in locked or rental.id in report['failed']:
+                continue
+            if rental.state in from_states:
+                report['failed'][rental.id] = "Contrat en cours de modification par un autre utilisateur."
+                report['locked'].append(rental.id)
+            else:
+                report['failed'][rental.id] = f"Transition impossible depuis l'état '{state_labels.get(rental.state)}'."
+
+        rentals = self.browse(list(locked))
+        if rentals:
+            vals = {'state': to_state}
+            if date_field:
+                vals[date_field] = fields.Datetime.now()
+            rentals.write(vals)
+            if bike_state:
+                rentals.bike_id.write({'state': bike_state})
+            if transition == 'end':
+                rentals._record_usage()
+        report['done'] = rentals.ids
+        return report
+
+    def _run_transition(self, transition):
+        """Exécute une transition depuis un bouton et signale les contrats non traités"""
+        report = self._apply_transition(transition)
+        if len(self) == 1 and report['locked']:
+            raise exceptions.UserError(report['failed'][report['locked'][0]])
+        if report['failed']:
+            names = self.browse(list(report['failed'])).mapped('name')
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': "Traitement partiel",
+                    'message': f"{len(report['done'])} contrat(s) traité(s), "
+                               f"{len(report['failed'])} ignoré(s) : {', '.join(names[:20])}",
+                    'type': 'warning',
+                    'sticky': False,
+                    # Contrats non traités (cf. bike.shop.job)
+                    'failed_ids': list(report['failed']),
+                },
+            }
+        return True
+
+    def _record_usage(self):
+        """Ajoute la durée des locations terminées aux compteurs d'usage de leurs vélos (une requête)"""
+        deltas = defaultdict(lambda: [0.0, 0])
+        for rental in self:
+            if rental.bike_id and rental.start_date and rental.actual_return_date:
+                usage = deltas[rental.bike_id.id]
+                usage[0] += max((rental.actual_return_date - rental.start_date).total_seconds() / 3600, 0)
+                usage[1] += 1
+        self.env['bike.bike']._apply_usage_deltas(deltas)
 
     def action_start_rental(self):
         """Démarre la location"""
-        for rental in self:
-            if rental.state == 'confirmed':
-                rental.state = 'ongoing'
-                rental.bike_id.state = 'rented'
+        return self._run_transition('start')
 
     def action_end_rental(self):
-        """Termine la location"""
-        for rental in self:
-            if rental.state == 'ongoing':
-                rental.state = 'done'
-                rental.actual_return_date = fields.Datetime.now()
-                rental.bike_id.state = 'available'
+        """Termine la location (pénalités de retard arrêtées au retour)"""
+        self._accrue_late_fees(fields.Datetime.now(), ids=self.ids)
+        return self._run_transition('end')
 
     def action_cancel(self):
         """Annule la location"""
-        for rental in self:
-            if rental.state in ['draft', 'confirmed']:
-                rental.state = 'cancelled'
+        return self._run_transition('cancel')
 
     def action_invoice(self):
         """Crée la facture"""
-        for rental in self:
-            if rental.state == 'done':
-                rental.state = 'invoiced'
-                rental.invoice_date = fields.Datetime.now()
+        return self._run_transition('invoice')
 
     def action_pay(self):
         """Marque la facture comme payée"""
-        for rental in self:
-            if rental.state == 'invoiced':
-                rental.state = 'paid'
-                rental.payment_date = fields.Datetime.now()
+        return self._run_transition('pay')
+
+    # ------------------------------------------------------------------
+    # Planificateur du cycle de vie
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_due_starts(self, now, after=None, limit=500):
+        """Contrats confirmés dont le début est passé, paginés par (start_date, id).
+
+        :return: liste de (id, start_date) triée
+        """
+        keyset = "AND (start_date, id) > (%(after_date)s, %(after_id)s)" if after else ""
+        self._cr.execute(f"""
+            SELECT id, start_date FROM rental_order
+             WHERE state = 'confirmed'
+               AND start_date <= %(now)s
+               {keyset}
+             ORDER BY start_date, id
+             LIMIT %(limit)s
+        """, {'now': now, 'limit': limit, 'after_date': after and after[1], 'after_id': after and after[0]})
+        return self._cr.fetchall()
+
+    @api.model
+    def _accrue_late_fees(self, now, ids=None, after=None, limit=None):
+        """Marque en retard les contrats en cours échus et leur facture le retard depuis le dernier calcul.
+
+        Seul l'intervalle (late_fee_until ou end_date) -> now est facturé, au
+        tarif horaire du vélo multiplié par bike_shop_rental.late_fee_factor.
+        Les contrats verrouillés ailleurs sont laissés au passage suivant.
+        Le cumul journalier reçoit la variation du montant total.
+
+        :param ids: contrats à traiter (tous les contrats échus si None)
+        :param after: (id, end_date) du dernier contrat du lot précédent
+        :return: liste de (id, end_date, montant facturé, était déjà en retard)
+        """
+        self.flush_model()
+        factor = float(self.env['ir.config_parameter'].sudo().get_param('bike_shop_rental.late_fee_factor', 1.5))
+        conditions = []
+        if ids is not None:
+            if not ids:
+                return []
+            conditions.append("AND ro.id IN %(ids)s")
+        if after:
+            conditions.append("AND (ro.end_date, ro.id) > (%(after_date)s, %(after_id)s)")
+        self._cr.execute(f"""
+            WITH due AS (
+                SELECT ro.id
+                  FROM rental_order ro
+                 WHERE ro.state = 'ongoing'
+                   AND ro.end_date < %(now)s
+                   {' '.join(conditions)}
+                 ORDER BY ro.end_date, ro.id
+                 LIMIT %(limit)s
+                   FOR UPDATE SKIP LOCKED
+            ),
+            fee AS (
+                SELECT ro.id,
+                       ro.is_overdue AS was_overdue,
+                       b.category_id,
+                       %(factor)s * COALESCE(b.hourly_rate, 0)
+                           * EXTRACT(EPOCH FROM %(now)s - GREATEST(ro.end_date, COALESCE(ro.late_fee_until, ro.end_date)))
+                           / 3600 AS amount
+                  FROM due
+                  JOIN rental_order ro ON ro.id = due.id
+                  LEFT JOIN bike_bike b ON b.id = ro.bike_id
+            )
+            UPDATE rental_order ro
+               SET is_overdue = TRUE,
+                   late_fee = COALESCE(ro.late_fee, 0) + fee.amount,
+                   total_amount = COALESCE(ro.subtotal, 0) + COALESCE(ro.late_fee, 0) + fee.amount,
+                   late_fee_until = %(now)s,
+                   write_uid = %(uid)s,
+                   write_date = %(now)s
+              FROM fee
+             WHERE ro.id = fee.id
+         RETURNING ro.id, ro.end_date, fee.amount, COALESCE(fee.was_overdue, FALSE),
+                   ro.start_date::date, fee.category_id, ro.rental_type
+        """, {
+            'now': now,
+            'ids': tuple(ids or ()),
+            'after_date': after and after[1],
+            'after_id': after and after[0],
+            'limit': limit,
+            'factor': factor,
+            'uid': self.env.uid,
+        })
+        rows = self._cr.fetchall()
+        if rows:
+            self.invalidate_model(['is_overdue', 'late_fee', 'total_amount', 'late_fee_until', 'write_uid', 'write_date'])
+            deltas = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+            for __, __, amount, __, day, category_id, rental_type in rows:
+                deltas[(day, category_id, rental_type or None, 'ongoing')][2] += amount
+            self.env['rental.report.daily']._apply_contributions({}, deltas)
+        return [row[:4] for row in rows]
+
+    @api.model
+    def _cron_lifecycle(self, chunk_size=500):
+        """Démarre les contrats confirmés arrivés à échéance, puis facture les retards.
+
+        Les deux passes parcourent leur index partiel par pages (clé
+        (date, id)), valident chaque lot séparément et ignorent les lignes
+        verrouillées : le comptoir n'est jamais bloqué. Les mesures de
+        l'exécution sont enregistrées dans rental.lifecycle.run.
+        """
+        now = fields.Datetime.now()
+        started = time.monotonic()
+        query_count = self._cr.sql_log_count
+        metrics = {
+            'date': now, 'chunk_count': 0, 'started_count': 0, 'skipped_count': 0,
+            'overdue_count': 0, 'new_overdue_count': 0, 'late_fee_amount': 0.0,
+        }
+
+        after = None
+        while True:
+            rows = self._get_due_starts(now, after, chunk_size)
+            if not rows:
+                break
+            after = rows[-1]
+            report = self.browse([row[0] for row in rows])._apply_transition('start')
+            metrics['started_count'] += len(report['done'])
+            metrics['skipped_count'] += len(report['failed'])
+            metrics['chunk_count'] += 1
+            self._cr.commit()
+
+        after = None
+        while True:
+            rows = self._accrue_late_fees(now, after=after, limit=chunk_size)
+            if not rows:
+                break
+            after = max((end_date, rental_id) for rental_id, end_date, __, __ in rows)[::-1]
+            metrics['overdue_count'] += len(rows)
+            metrics['new_overdue_count'] += sum(1 for row in rows if not row[3])
+            metrics['late_fee_amount'] += sum(row[2] for row in rows)
+            metrics['chunk_count'] += 1
+            self._cr.commit()
+
+        metrics['duration'] = time.monotonic() - started
+        metrics['query_count'] = self._cr.sql_log_count - query_count
+        self.env['rental.lifecycle.run'].sudo().create(metrics)
+        _logger.info(
+            "Planificateur : %s contrat(s) démarré(s), %s ignoré(s), %s en retard (%.2f € de pénalités) en %.1f s",
+            metrics['started_count'], metrics['skipped_count'], metrics['overdue_count'],
+            metrics['late_fee_amount'], metrics['duration'],
+        )
+
+    # ------------------------------------------------------------------
+    # Contrats PDF en cache
+    # ------------------------------------------------------------------
+
+    def _get_contracts_to_render(self):
+        """Contrats du lot dont le PDF à jour n'est pas encore en pièce jointe"""
+        rentals = self.filtered('contract_attachment_name')
+        if not rentals:
+            return rentals
+        attachments = self.env['ir.attachment'].sudo().search_read([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', rentals.ids),
+            ('name', 'in', rentals.mapped('contract_attachment_name')),
+        ], ['res_id', 'name'])
+        cached = {(attachment['res_id'], attachment['name']) for attachment in attachments}
+        return rentals.filtered(lambda r: (r.id, r.contract_attachment_name) not in cached)
+
+    def _render_contracts(self, batch_size=50):
+        """Génère les PDF manquants, batch_size contrats par appel au moteur PDF.
+
+        Le rapport enregistre chaque PDF en pièce jointe (attachment_use) ; les
+        versions périmées des mêmes contrats sont supprimées.
+
+        :return: nombre de contrats générés
+        """
+        to_render = self._get_contracts_to_render()
+        report = self.env['ir.actions.report'].sudo()
+        for start in range(0, len(to_render), batch_size):
+            batch = to_render[start:start + batch_size]
+            report._render_qweb_pdf('bike_shop_rental.action_report_rental_contract', res_ids=batch.ids)
+            batch._unlink_stale_contracts()
+        return len(to_render)
+
+    def _unlink_stale_contracts(self):
+        """Supprime les anciens PDF en cache dont l'empreinte ne correspond plus"""
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('name', '=like', 'Contrat-%.pdf'),
+        ])
+        current = {rental.id: rental.contract_attachment_name for rental in self}
+        attachments.filtered(lambda a: a.name != current.get(a.res_id)).unlink()
+
+    def action_print_contracts(self):
+        """Impression groupée : complète le cache par lots puis fusionne les PDF en cache"""
+        self._render_contracts()
+        return self.env.ref('bike_shop_rental.action_report_rental_contract').report_action(self)
+
+    @api.model
+    def _cron_prerender_contracts(self, batch_size=50):
+        """Pré-génère les contrats confirmés ou en cours, un lot validé à la fois"""
+        rentals = self.search([('state', 'in', self._BLOCKING_STATES)])._get_contracts_to_render()
+        for start in range(0, len(rentals), batch_size):
+            rentals[start:start + batch_size]._render_contracts(batch_size)
+            self._cr.commit()
+        _logger.info("Contrats PDF : %s contrat(s) pré-généré(s)", len(rentals))
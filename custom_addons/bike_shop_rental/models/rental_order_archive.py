@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Colonnes communes à rental_order et rental_order_archive, recopiées à l'archivage
+ARCHIVED_COLUMNS = (
+    'id', 'name', 'partner_id', 'customer_name', 'partner_phone', 'partner_email',
+    'bike_id', 'start_date', 'end_date', 'actual_return_date',
+    'duration_hours', 'duration_days', 'rental_type', 'unit_price', 'quantity',
+    'subtotal', 'late_fee', 'total_amount', 'is_overdue', 'state', 'invoice_date', 'payment_date', 'notes',
+    'create_uid', 'create_date', 'write_uid', 'write_date',
+)
+
+# Historique complet des contrats (actifs + archivés) pour les rapports
+RENTAL_HISTORY_SQL = """(
+    SELECT id, bike_id, state, start_date, rental_period, rental_type,
+           duration_days, subtotal, total_amount, partner_id, name, end_date,
+           actual_return_date
+      FROM rental_order
+     UNION ALL
+    SELECT id, bike_id, state, start_date, rental_period, rental_type,
+           duration_days, subtotal, total_amount, partner_id, name, end_date,
+           actual_return_date
+      FROM rental_order_archive
+)"""
+
+
+class RentalOrderArchive(models.Model):
+    """Contrat de location archivé (payé ou annulé depuis longtemps).
+
+    Les contrats anciens quittent rental_order par lots (cf.
+    rental.order._cron_archive) : les vues, recherches et compteurs courants
+    ne parcourent plus que les contrats récents, les rapports lisent
+    l'historique complet (RENTAL_HISTORY_SQL). Un contrat archivé garde son id.
+    """
+    _name = 'rental.order.archive'
+    _description = 'Contrat de Location Archivé'
+    _order = 'start_date desc, id desc'
+
+    name = fields.Char(string='Numéro', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Client Existant', readonly=True, index='btree_not_null')
+    customer_name = fields.Char(string='Nom du Client', readonly=True)
+    partner_phone = fields.Char(string='Téléphone', readonly=True)
+    partner_email = fields.Char(string='Email', readonly=True)
+    bike_id = fields.Many2one('bike.bike', string='Vélo', readonly=True, index=True)
+    bike_category = fields.Char(related='bike_id.category_id.name', string='Catégorie')
+    start_date = fields.Datetime(string='Date de Début', readonly=True)
+    end_date = fields.Datetime(string='Date de Fin', readonly=True)
+    actual_return_date = fields.Datetime(string='Date de Retour Réelle', readonly=True)
+    duration_hours = fields.Float(string='Durée (Heures)', readonly=True)
+    duration_days = fields.Float(string='Durée (Jours)', readonly=True)
+    rental_type = fields.Selection([
+        ('hourly', 'Horaire'),
+        ('daily', 'Journalier'),
+        ('weekly', 'Hebdomadaire'),
+        ('monthly', 'Mensuel'),
+    ], string='Type', readonly=True)
+    unit_price = fields.Float(string='Prix Unitaire (€)', readonly=True)
+    quantity = fields.Float(string='Quantité', readonly=True)
+    subtotal = fields.Float(string='Sous-total (€)', readonly=True)
+    late_fee = fields.Float(string='Pénalités de Retard (€)', readonly=True)
+    total_amount = fields.Float(string='Total (€)', readonly=True)
+    is_overdue = fields.Boolean(string='En Retard', readonly=True)
+    state = fields.Selection([
+        ('paid', 'Payé'),
+        ('cancelled', 'Annulé'),
+    ], string='État', readonly=True)
+    invoice_date = fields.Datetime(string='Date de Facturation', readonly=True)
+    payment_date = fields.Datetime(string='Date de Paiement', readonly=True)
+    notes = fields.Text(string='Notes', readonly=True)
+    archived_date = fields.Datetime(string='Archivé le', readonly=True)
+
+    @api.model
+    def _archive_batch(self, cutoff, limit):
+        """Déplace au plus limit contrats clos avant cutoff vers l'archive.
+
+        Suppression et insertion forment une seule requête : un contrat est
+        soit actif, soit archivé. Les contrats verrouillés par une autre
+        transaction sont laissés pour le lot suivant.
+
+        :return: ids des contrats archivés
+        """
+        self.env['rental.order'].flush_model()
+        columns = ', '.join(ARCHIVED_COLUMNS)
+        self._cr.execute(f"""
+            WITH moved AS (
+                DELETE FROM rental_order
+                 WHERE id IN (
+                        SELECT id FROM rental_order
+                         WHERE state IN ('paid', 'cancelled')
+                           AND COALESCE(end_date, start_date, create_date) < %(cutoff)s
+                         ORDER BY id
+                         LIMIT %(limit)s
+                           FOR UPDATE SKIP LOCKED
+                 )
+             RETURNING {columns}
+            )
+            INSERT INTO rental_order_archive ({columns}, archived_date)
+            SELECT {columns}, now() AT TIME ZONE 'UTC' FROM moved
+         RETURNING id
+        """, {'cutoff': cutoff, 'limit': limit})
+        rental_ids = [row[0] for row in self._cr.fetchall()]
+        if rental_ids:
+            # Les PDF en cache ne sont plus réimprimables depuis le contrat actif
+            self.env['ir.attachment'].sudo().search([
+                ('res_model', '=', 'rental.order'),
+                ('res_id', 'in', rental_ids),
+            ]).unlink()
+            self.env['rental.order'].invalidate_model()
+        return rental_ids
+
+    @api.model
+    def _cron_archive(self, batch_size=5000):
+        """Archive les contrats payés ou annulés au-delà de l'horizon, un lot validé à la fois.
+
+        Horizon en jours : paramètre bike_shop_rental.archive_after_days
+        (730 par défaut, 0 pour désactiver). Interrompu, le cron reprend au
+        lot suivant.
+        """
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'bike_shop_rental.archive_after_days', 730))
+        if days <= 0:
+            return
+        cutoff = fields.Datetime.now() - timedelta(days=days)
+        total = 0
+        while True:
+            rental_ids = self._archive_batch(cutoff, batch_size)
+            if not rental_ids:
+                break
+            total += len(rental_ids)
+            self._cr.commit()
+            _logger.info("Archivage : %s contrat(s) archivé(s)", total)
+
+    def init(self):
+        """Période de location et index utilisés par l'occupation"""
+        self._cr.execute("""
+            ALTER TABLE rental_order_archive
+            ADD COLUMN IF NOT EXISTS rental_period tsrange
+            GENERATED ALWAYS AS (
+                CASE WHEN end_date > start_date
+                     THEN tsrange(start_date, end_date, '[)')
+                END
+            ) STORED
+        """)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS rental_order_archive_bike_period_gist
+            ON rental_order_archive USING gist (bike_id, rental_period)
+        """)
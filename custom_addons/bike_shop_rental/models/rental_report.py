@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+from datetime import date, datetime, time
 from odoo import models, fields, api
+from .rental_order_archive import RENTAL_HISTORY_SQL
 
 
 class RentalReport(models.Model):
@@ -32,9 +35,115 @@ class RentalReport(models.Model):
     total_amount = fields.Float(string='Montant Total', readonly=True)
     subtotal = fields.Float(string='Sous-total', readonly=True)
 
+    # Regroupements et mesures servis par le cumul journalier rental.report.daily
+    _DAILY_GROUPBY = {'bike_category_id', 'rental_type', 'state'}
+    # Granularités de start_date servies par la colonne day du cumul
+    _DAILY_GRANULARITIES = {'day', 'week', 'month', 'quarter', 'year'}
+    _DAILY_AGGREGATES = {
+        '__count': 'rental_count:sum',
+        'total_amount:sum': 'total_amount:sum',
+        'subtotal:sum': 'subtotal:sum',
+        'duration_days:sum': 'duration_days:sum',
+    }
+
+    def _to_daily_groupby(self, spec):
+        """Regroupement équivalent sur rental.report.daily (None s'il n'y en a pas).
+
+        Les jours du cumul sont des jours UTC : start_date n'est redirigé que
+        si les regroupements ne sont pas calculés dans un autre fuseau.
+        """
+        fname, _sep, granularity = spec.partition(':')
+        if fname in self._DAILY_GROUPBY and not granularity:
+            return spec
+        if fname == 'start_date' and granularity in self._DAILY_GRANULARITIES \
+                and self.env.context.get('tz') in (None, False, 'UTC'):
+            return f'day:{granularity}'
+        return None
+
+    def _to_daily_leaf(self, leaf):
+        """Condition équivalente sur rental.report.daily (None s'il n'y en a pas).
+
+        Une borne de start_date n'est traduite que si elle tombe sur une limite
+        de jour UTC : le cumul ne connaît pas l'heure de début des contrats.
+        """
+        if not isinstance(leaf, (list, tuple)) or len(leaf) != 3:
+            return None
+        fname, operator, value = leaf
+        if fname in self._DAILY_GROUPBY:
+            return leaf
+        if fname != 'start_date':
+            return None
+        try:
+            value = fields.Datetime.to_datetime(value)
+        except (ValueError, TypeError):
+            return None
+        if not value:
+            return None
+        if value.time() == time.min and operator in ('>=', '<'):
+            return ('day', operator, value.date())
+        if value.time() == time(23, 59, 59) and operator in ('<=', '>'):
+            return ('day', operator, value.date())
+        return None
+
+    def _get_daily_query(self, domain, groupby, aggregates, having, order):
+        """Traduit un regroupement pour rental.report.daily.
+
+        :return: (domain, groupby, order) sur le cumul, ou None s'il ne peut pas servir
+        """
+        if not groupby or having or not set(aggregates) <= set(self._DAILY_AGGREGATES):
+            return None
+        daily_groupby = [self._to_daily_groupby(spec) for spec in groupby]
+        if None in daily_groupby:
+            return None
+        daily_order = []
+        for term in (order or '').split(','):
+            if not term.strip():
+                continue
+            spec, *direction = term.split()
+            daily_spec = self._to_daily_groupby(spec)
+            if daily_spec is None:
+                return None
+            daily_order.append(' '.join([daily_spec, *direction]))
+        daily_domain = []
+        for leaf in domain or []:
+            if isinstance(leaf, str):
+                if leaf not in ('&', '|', '!'):
+                    return None
+                daily_domain.append(leaf)
+                continue
+            daily_leaf = self._to_daily_leaf(leaf)
+            if daily_leaf is None:
+                return None
+            daily_domain.append(daily_leaf)
+        return daily_domain, daily_groupby, ', '.join(daily_order) or None
+
+    @api.model
+    def _read_group(self, domain, groupby=(), aggregates=(), having=(), offset=0, limit=None, order=None):
+        """Sert les vues pivot / graphique depuis le cumul journalier quand c'est possible"""
+        query = self._get_daily_query(domain, groupby, aggregates, having, order)
+        if query is None:
+            return super()._read_group(domain, groupby, aggregates, having, offset, limit, order)
+        daily_domain, daily_groupby, daily_order = query
+        rows = self.env['rental.report.daily']._read_group(
+            daily_domain, daily_groupby, [self._DAILY_AGGREGATES[agg] for agg in aggregates],
+            offset=offset, limit=limit, order=daily_order,
+        )
+        # Les groupes de start_date sont des datetimes, ceux de day des dates
+        datetime_positions = [i for i, spec in enumerate(groupby) if spec.startswith('start_date:')]
+        if not datetime_positions:
+            return rows
+        result = []
+        for row in rows:
+            row = list(row)
+            for i in datetime_positions:
+                if isinstance(row[i], date):
+                    row[i] = datetime.combine(row[i], time.min)
+            result.append(tuple(row))
+        return result
+
     def init(self):
-        """Initialise la vue SQL pour le rapport"""
-        self._cr.execute("""
+        """Initialise la vue SQL pour le rapport (contrats actifs et archivés)"""
+        self._cr.execute(f"""
             CREATE OR REPLACE VIEW rental_report AS (
                 SELECT
                     ro.id as id,
@@ -49,45 +158,380 @@ class RentalReport(models.Model):
                     ro.duration_days as duration_days,
                     ro.total_amount as total_amount,
                     ro.subtotal as subtotal
-                FROM rental_order ro
+                FROM {RENTAL_HISTORY_SQL} ro
                 LEFT JOIN bike_bike b ON ro.bike_id = b.id
             )
         """)
 
 
+class RentalReportDaily(models.Model):
+    """Cumul journalier des locations (volume et chiffre d'affaires).
+
+    Une ligne par (jour, catégorie, type de location, état), maintenue
+    incrémentalement par rental.order : chaque modification ajoute la
+    contribution nouvelle et retranche l'ancienne.
+    """
+    _name = 'rental.report.daily'
+    _description = 'Cumul Journalier des Locations'
+    _auto = False
+    _order = 'day desc'
+
+    day = fields.Date(string='Jour', readonly=True)
+    bike_category_id = fields.Many2one('bike.category', string='Catégorie', readonly=True)
+    rental_type = fields.Selection([
+        ('hourly', 'Horaire'),
+        ('daily', 'Journalier'),
+        ('weekly', 'Hebdomadaire'),
+        ('monthly', 'Mensuel'),
+    ], string='Type de Location', readonly=True)
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('confirmed', 'Confirmé'),
+        ('ongoing', 'En Cours'),
+        ('done', 'Terminé'),
+        ('invoiced', 'Facturé'),
+        ('paid', 'Payé'),
+        ('cancelled', 'Annulé'),
+    ], string='État', readonly=True)
+    rental_count = fields.Integer(string='Nombre de Locations', readonly=True)
+    subtotal = fields.Float(string='Sous-total', readonly=True)
+    total_amount = fields.Float(string='Montant Total', readonly=True)
+    duration_days = fields.Float(string='Durée (Jours)', readonly=True)
+
+    def init(self):
+        """Crée la table de cumul et la remplit à l'installation"""
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS rental_report_daily (
+                id serial PRIMARY KEY,
+                day date NOT NULL,
+                bike_category_id integer,
+                rental_type varchar,
+                state varchar NOT NULL,
+                rental_count integer NOT NULL DEFAULT 0,
+                subtotal double precision NOT NULL DEFAULT 0,
+                total_amount double precision NOT NULL DEFAULT 0,
+                duration_days double precision NOT NULL DEFAULT 0,
+                CONSTRAINT rental_report_daily_key
+                    UNIQUE NULLS NOT DISTINCT (day, bike_category_id, rental_type, state)
+            )
+        """)
+        self._cr.execute("SELECT 1 FROM rental_report_daily LIMIT 1")
+        if not self._cr.fetchone():
+            self._rebuild()
+
+    @api.model
+    def _rebuild(self):
+        """Recalcule entièrement le cumul à partir des contrats actifs et archivés"""
+        self.env['rental.order'].flush_model()
+        self._cr.execute("DELETE FROM rental_report_daily")
+        self._cr.execute(f"""
+            INSERT INTO rental_report_daily (
+                day, bike_category_id, rental_type, state,
+                rental_count, subtotal, total_amount, duration_days
+            )
+            SELECT ro.start_date::date,
+                   b.category_id,
+                   ro.rental_type,
+                   ro.state,
+                   COUNT(*),
+                   COALESCE(SUM(ro.subtotal), 0),
+                   COALESCE(SUM(ro.total_amount), 0),
+                   COALESCE(SUM(ro.duration_days), 0)
+              FROM {RENTAL_HISTORY_SQL} ro
+              LEFT JOIN bike_bike b ON b.id = ro.bike_id
+             WHERE ro.start_date IS NOT NULL
+             GROUP BY 1, 2, 3, 4
+        """)
+        self.invalidate_model()
+
+    @api.model
+    def _get_contributions(self, rentals):
+        """Retourne la contribution de chaque contrat au cumul, par clé"""
+        contributions = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+        for rental in rentals:
+            if not rental.start_date:
+                continue
+            key = (rental.start_date.date(), rental.bike_id.category_id.id or None,
+                   rental.rental_type or None, rental.state)
+            values = contributions[key]
+            values[0] += 1
+            values[1] += rental.subtotal
+            values[2] += rental.total_amount
+            values[3] += rental.duration_days
+        return contributions
+
+    @api.model
+    def _apply_contributions(self, before, after):
+        """Ajoute au cumul la différence entre deux contributions (upsert additif)"""
+        deltas = {}
+        for key in set(before) | set(after):
+            old = before.get(key, (0, 0.0, 0.0, 0.0))
+            new = after.get(key, (0, 0.0, 0.0, 0.0))
+            delta = [n - o for n, o in zip(new, old)]
+            if any(delta):
+                deltas[key] = delta
+        if not deltas:
+            return
+        keys, values = list(deltas), list(deltas.values())
+        self._cr.execute("""
+            INSERT INTO rental_report_daily AS d (
+                day, bike_category_id, rental_type, state,
+                rental_count, subtotal, total_amount, duration_days
+            )
+            SELECT * FROM unnest(
+                %s::date[], %s::int[], %s::varchar[], %s::varchar[],
+                %s::int[], %s::float8[], %s::float8[], %s::float8[]
+            )
+            ON CONFLICT ON CONSTRAINT rental_report_daily_key DO UPDATE
+               SET rental_count = d.rental_count + EXCLUDED.rental_count,
+                   subtotal = d.subtotal + EXCLUDED.subtotal,
+                   total_amount = d.total_amount + EXCLUDED.total_amount,
+                   duration_days = d.duration_days + EXCLUDED.duration_days
+        """, [[key[i] for key in keys] for i in range(4)] + [[value[i] for value in values] for i in range(4)])
+        self._cr.execute("""
+            DELETE FROM rental_report_daily
+             WHERE day = ANY(%s::date[]) AND rental_count <= 0
+        """, [list({key[0] for key in keys})])
+        self.invalidate_model()
+
+
 class BikeOccupancyReport(models.Model):
-    """Rapport de taux d'occupation des vélos"""
+    """Rapport de taux d'occupation des vélos par période (jour / semaine / mois).
+
+    Table de synthèse rafraîchie incrémentalement : seuls les vélos dont les
+    contrats ont changé depuis le dernier rafraîchissement sont recalculés.
+    """
     _name = 'bike.occupancy.report'
     _description = 'Rapport d\'Occupation des Vélos'
     _auto = False
+    _order = 'period_start desc, bike_id'
+
+    # États de contrat pris en compte dans l'occupation
+    _OCCUPANCY_STATES = ('confirmed', 'ongoing', 'done', 'invoiced', 'paid')
+    # Granularités du rapport et durée de leurs périodes
+    _PERIODS_SQL = """(VALUES ('day', interval '1 day'),
+                              ('week', interval '1 week'),
+                              ('month', interval '1 month')) AS p(period_type, step)"""
 
     bike_id = fields.Many2one('bike.bike', string='Vélo', readonly=True)
     bike_category_id = fields.Many2one('bike.category', string='Catégorie', readonly=True)
+    period_type = fields.Selection([
+        ('day', 'Jour'),
+        ('week', 'Semaine'),
+        ('month', 'Mois'),
+    ], string='Granularité', readonly=True)
+    period_start = fields.Date(string='Période', readonly=True)
     total_rentals = fields.Integer(string='Nombre de Locations', readonly=True)
     total_days_rented = fields.Float(string='Total Jours Loués', readonly=True)
     total_revenue = fields.Float(string='Revenu Total', readonly=True)
-    avg_rental_duration = fields.Float(string='Durée Moyenne (jours)', readonly=True)
+    avg_rental_duration = fields.Float(string='Durée Moyenne (jours)', readonly=True, aggregator='avg')
+    rented_hours = fields.Float(string='Heures Louées', readonly=True)
+    available_hours = fields.Float(string='Heures Disponibles', readonly=True)
+    utilization = fields.Float(string='Taux d\'Occupation (%)', readonly=True, aggregator='avg')
 
     def init(self):
-        """Initialise la vue SQL pour le taux d'occupation"""
+        """Crée la table de synthèse et la file des vélos à rafraîchir"""
+        # L'ancienne version du rapport était une vue SQL
         self._cr.execute("""
-            CREATE OR REPLACE VIEW bike_occupancy_report AS (
-                SELECT
-                    row_number() OVER () as id,
-                    b.id as bike_id,
-                    b.category_id as bike_category_id,
-                    COUNT(ro.id) as total_rentals,
-                    COALESCE(SUM(ro.duration_days), 0) as total_days_rented,
-                    COALESCE(SUM(ro.subtotal), 0) as total_revenue,
-                    CASE
-                        WHEN COUNT(ro.id) > 0 THEN AVG(ro.duration_days)
-                        ELSE 0
-                    END as avg_rental_duration
-                FROM bike_bike b
-                LEFT JOIN rental_order ro ON b.id = ro.bike_id
-                    AND ro.state IN ('confirmed', 'ongoing', 'done')
-                WHERE b.active = true
-                GROUP BY b.id, b.category_id
-                HAVING COUNT(ro.id) > 0
+            SELECT relkind FROM pg_class WHERE relname = 'bike_occupancy_report'
+        """)
+        row = self._cr.fetchone()
+        if row and row[0] == 'v':
+            self._cr.execute("DROP VIEW bike_occupancy_report")
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS bike_occupancy_report (
+                id serial PRIMARY KEY,
+                bike_id integer NOT NULL REFERENCES bike_bike(id) ON DELETE CASCADE,
+                bike_category_id integer,
+                period_type varchar NOT NULL,
+                period_start date NOT NULL,
+                total_rentals integer NOT NULL DEFAULT 0,
+                total_days_rented double precision NOT NULL DEFAULT 0,
+                total_revenue double precision NOT NULL DEFAULT 0,
+                avg_rental_duration double precision NOT NULL DEFAULT 0,
+                rented_hours double precision NOT NULL DEFAULT 0,
+                available_hours double precision NOT NULL DEFAULT 0,
+                utilization double precision NOT NULL DEFAULT 0,
+                UNIQUE (bike_id, period_type, period_start)
+            )
+        """)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS bike_occupancy_report_period_idx
+            ON bike_occupancy_report (period_type, period_start)
+        """)
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS bike_occupancy_dirty (
+                bike_id integer PRIMARY KEY,
+                touched_at timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'UTC')
             )
         """)
+        # À l'installation, tous les vélos sont à calculer
+        self._cr.execute("SELECT 1 FROM bike_occupancy_report LIMIT 1")
+        if not self._cr.fetchone():
+            self._cr.execute("""
+                INSERT INTO bike_occupancy_dirty (bike_id)
+                SELECT DISTINCT bike_id FROM rental_order WHERE bike_id IS NOT NULL
+                 UNION
+                SELECT DISTINCT bike_id FROM rental_order_archive WHERE bike_id IS NOT NULL
+                ON CONFLICT DO NOTHING
+            """)
+
+    @api.model
+    def _mark_bikes_dirty(self, bike_ids):
+        """Ajoute des vélos à la file de rafraîchissement"""
+        bike_ids = [bike_id for bike_id in set(bike_ids) if bike_id]
+        if not bike_ids:
+            return
+        self._cr.execute("""
+            INSERT INTO bike_occupancy_dirty (bike_id)
+            SELECT unnest(%s::int[])
+            ON CONFLICT (bike_id) DO UPDATE SET touched_at = EXCLUDED.touched_at
+        """, [bike_ids])
+
+    @api.model
+    def _get_day_horizon(self):
+        """Nombre de jours conservés en granularité journalière"""
+        return int(self.env['ir.config_parameter'].sudo().get_param('bike_shop_rental.occupancy_day_horizon', 90))
+
+    @api.model
+    def _insert_periods(self, span_sql, params):
+        """Calcule et insère les lignes des périodes couvertes par span_sql.
+
+        span_sql retourne (bike_id, period_type, first_start, last_end) : une ligne
+        par période de first_start à last_end, les lignes existantes sont conservées.
+        Les heures louées sont l'intersection des périodes de location avec la
+        période ; les contrats archivés comptent comme les autres.
+        """
+        self._cr.execute(f"""
+            WITH span AS ({span_sql}),
+            buckets AS (
+                SELECT b.id AS bike_id,
+                       b.category_id,
+                       p.period_type,
+                       tsrange(gs, gs + p.step, '[)') AS bucket
+                  FROM span
+                  JOIN bike_bike b ON b.id = span.bike_id
+                  JOIN {self._PERIODS_SQL} ON p.period_type = span.period_type
+                 CROSS JOIN LATERAL generate_series(
+                        date_trunc(p.period_type, CASE
+                            WHEN p.period_type = 'day'
+                            THEN GREATEST(span.first_start,
+                                          (now() AT TIME ZONE 'UTC') - make_interval(days => %(day_horizon)s))
+                            ELSE span.first_start END),
+                        span.last_end - interval '1 microsecond',
+                        p.step
+                 ) AS gs
+            )
+            INSERT INTO bike_occupancy_report (
+                bike_id, bike_category_id, period_type, period_start,
+                total_rentals, total_days_rented, total_revenue, avg_rental_duration,
+                rented_hours, available_hours, utilization
+            )
+            SELECT bk.bike_id,
+                   bk.category_id,
+                   bk.period_type,
+                   lower(bk.bucket)::date,
+                   COUNT(ro.id) FILTER (WHERE lower(ro.rental_period) <@ bk.bucket),
+                   COALESCE(SUM(EXTRACT(EPOCH FROM upper(ro.rental_period * bk.bucket)
+                                                 - lower(ro.rental_period * bk.bucket))), 0) / 86400,
+                   COALESCE(SUM(ro.subtotal) FILTER (WHERE lower(ro.rental_period) <@ bk.bucket), 0),
+                   COALESCE(AVG(ro.duration_days) FILTER (WHERE lower(ro.rental_period) <@ bk.bucket), 0),
+                   COALESCE(SUM(EXTRACT(EPOCH FROM upper(ro.rental_period * bk.bucket)
+                                                 - lower(ro.rental_period * bk.bucket))), 0) / 3600,
+                   EXTRACT(EPOCH FROM upper(bk.bucket) - lower(bk.bucket)) / 3600,
+                   100 * COALESCE(SUM(EXTRACT(EPOCH FROM upper(ro.rental_period * bk.bucket)
+                                                       - lower(ro.rental_period * bk.bucket))), 0)
+                       / EXTRACT(EPOCH FROM upper(bk.bucket) - lower(bk.bucket))
+              FROM buckets bk
+              LEFT JOIN {RENTAL_HISTORY_SQL} ro
+                ON ro.bike_id = bk.bike_id
+               AND ro.state IN %(states)s
+               AND ro.rental_period && bk.bucket
+             GROUP BY bk.bike_id, bk.category_id, bk.period_type, bk.bucket
+            ON CONFLICT (bike_id, period_type, period_start) DO NOTHING
+        """, dict(params, states=self._OCCUPANCY_STATES, day_horizon=self._get_day_horizon()))
+        self.invalidate_model()
+
+    @api.model
+    def _refresh(self, limit=5000):
+        """Recalcule l'occupation des vélos modifiés depuis le dernier rafraîchissement.
+
+        Les vélos sont dépilés avec SKIP LOCKED pour que plusieurs rafraîchissements
+        puissent tourner en parallèle ; la table reste lisible pendant le calcul.
+
+        :return: nombre de vélos recalculés
+        """
+        self.env['rental.order'].flush_model()
+        self._cr.execute("""
+            DELETE FROM bike_occupancy_dirty
+             WHERE bike_id IN (
+                    SELECT bike_id FROM bike_occupancy_dirty
+                     ORDER BY touched_at
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+             )
+         RETURNING bike_id
+        """, [limit])
+        bike_ids = [row[0] for row in self._cr.fetchall()]
+        if not bike_ids:
+            return 0
+
+        self._cr.execute("""
+            DELETE FROM bike_occupancy_report WHERE bike_id = ANY(%(bike_ids)s)
+        """, {'bike_ids': bike_ids})
+        # De la première location jusqu'à maintenant (ou jusqu'à la dernière location
+        # si elle est à venir) : les périodes inoccupées ont aussi leur ligne
+        self._insert_periods(f"""
+            SELECT s.bike_id, p.period_type, s.first_start, s.last_end
+              FROM (
+                    SELECT ro.bike_id,
+                           MIN(lower(ro.rental_period)) AS first_start,
+                           GREATEST(MAX(upper(ro.rental_period)), now() AT TIME ZONE 'UTC') AS last_end
+                      FROM {RENTAL_HISTORY_SQL} ro
+                     WHERE ro.bike_id = ANY(%(bike_ids)s)
+                       AND ro.state IN %(states)s
+                       AND ro.rental_period IS NOT NULL
+                     GROUP BY ro.bike_id
+              ) s
+             CROSS JOIN {self._PERIODS_SQL}
+        """, {'bike_ids': bike_ids})
+        return len(bike_ids)
+
+    @api.model
+    def _extend_to_now(self):
+        """Ajoute à tous les vélos du rapport les périodes écoulées depuis leur dernière ligne"""
+        self.env['rental.order'].flush_model()
+        self._insert_periods(f"""
+            SELECT s.bike_id, p.period_type,
+                   COALESCE(m.last_start + p.step,
+                            (now() AT TIME ZONE 'UTC') - make_interval(days => %(day_horizon)s)) AS first_start,
+                   now() AT TIME ZONE 'UTC' AS last_end
+              FROM (SELECT DISTINCT bike_id FROM bike_occupancy_report) s
+             CROSS JOIN {self._PERIODS_SQL}
+              LEFT JOIN LATERAL (
+                    SELECT MAX(period_start) AS last_start
+                      FROM bike_occupancy_report
+                     WHERE bike_id = s.bike_id AND period_type = p.period_type
+              ) m ON true
+             WHERE m.last_start IS NULL OR m.last_start + p.step < now() AT TIME ZONE 'UTC'
+        """, {})
+
+    @api.model
+    def _prune_days(self):
+        """Supprime, pour tous les vélos, les lignes journalières plus anciennes que l'horizon"""
+        self._cr.execute("""
+            DELETE FROM bike_occupancy_report
+             WHERE period_type = 'day'
+               AND period_start < ((now() AT TIME ZONE 'UTC') - make_interval(days => %s))::date
+        """, [self._get_day_horizon()])
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh(self):
+        """Rafraîchit les occupations en attente par lots, prolonge le rapport jusqu'à
+        aujourd'hui et élague les lignes journalières trop anciennes"""
+        while self._refresh():
+            self._cr.commit()
+        self._extend_to_now()
+        self._prune_days()
+        self._cr.commit()
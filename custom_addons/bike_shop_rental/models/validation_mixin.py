@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import re
+from odoo import models, api, exceptions
+
+# Expressions compilées une seule fois, partagées par la location et la vente
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# Accepte les formats: +33612345678, 0612345678, +33 6 12 34 56 78, etc.
+PHONE_RE = re.compile(r'^(\+\d{1,3}[\s.-]?)?\(?\d{1,4}\)?[\s.-]?\d{1,4}[\s.-]?\d{1,4}[\s.-]?\d{1,9}$')
+NON_DIGIT_RE = re.compile(r'[^\d]')
+DIGIT_RE = re.compile(r'\d')
+
+
+def email_error(email):
+    """Retourne le message d'erreur d'un email invalide, ou None"""
+    if email and not EMAIL_RE.match(email):
+        return (
+            f"L'email '{email}' n'est pas valide. "
+            "Format attendu : exemple@domaine.com"
+        )
+    return None
+
+
+def phone_error(phone):
+    """Retourne le message d'erreur d'un numéro de téléphone invalide, ou None"""
+    if not phone:
+        return None
+    # Enlever les espaces pour vérifier qu'il y a assez de chiffres
+    if len(NON_DIGIT_RE.sub('', phone)) < 10:
+        return (
+            f"Le numéro de téléphone '{phone}' n'est pas valide. "
+            "Il doit contenir au moins 10 chiffres."
+        )
+    if not PHONE_RE.match(phone):
+        return (
+            f"Le numéro de téléphone '{phone}' n'est pas valide. "
+            "Format attendu : +33612345678 ou 0612345678"
+        )
+    return None
+
+
+def name_digits_error(name):
+    """Retourne le message d'erreur d'un nom de client contenant des chiffres, ou None"""
+    if name and DIGIT_RE.search(name):
+        return (
+            f"Le nom du client '{name}' n'est pas valide. "
+            "Le nom ne peut pas contenir de chiffres."
+        )
+    return None
+
+
+class BikeShopValidationMixin(models.AbstractModel):
+    """Validation en une passe des règles métier d'un lot d'enregistrements.
+
+    Les modèles déclarent leurs règles dans _validation_rules sous forme de
+    (champs déclencheurs, nom de méthode). Une règle reçoit un enregistrement
+    et retourne un message d'erreur ou None. Comme pour @api.constrains, une
+    règle n'est évaluée que si l'un de ses champs déclencheurs a été modifié.
+    """
+    _name = 'bike.shop.validation.mixin'
+    _description = 'Validation groupée Bike Shop'
+
+    _validation_rules = ()
+
+    def _validate_fields(self, field_names, excluded_names=()):
+        field_names = set(field_names)
+        excluded_names = set(excluded_names)
+        rules = [
+            rule for trigger_fields, rule in self._validation_rules
+            if not field_names.isdisjoint(trigger_fields) and excluded_names.isdisjoint(trigger_fields)
+        ]
+        if rules:
+            self._run_validation_rules(rules)
+        return super()._validate_fields(field_names, excluded_names)
+
+    def _run_validation_rules(self, rules, collect=False):
+        """Évalue les règles sur chaque enregistrement en une seule passe.
+
+        :param rules: noms des méthodes règles
+        :param collect: si vrai, retourne toutes les erreurs au lieu de lever la première
+        :return: liste alignée sur self des listes de messages d'erreur
+        """
+        methods = [getattr(type(self), rule) for rule in rules]
+        errors = []
+        for record in self:
+            messages = []
+            for method in methods:
+                message = method(record)
+                if message:
+                    if not collect:
+                        raise exceptions.ValidationError(message)
+                    messages.append(message)
+            errors.append(messages)
+        return errors
+
+    @api.model
+    def _collect_validation_errors(self, vals_list):
+        """Valide des lignes à importer sans les créer et retourne toutes leurs erreurs.
+
+        :param vals_list: liste de dicts de valeurs
+        :return: liste alignée sur vals_list des listes de messages d'erreur
+        """
+        records = self.concat(*[self.new(vals) for vals in vals_list])
+        return records._run_validation_rules([rule for __, rule in self._validation_rules], collect=True)
@@ -0,0 +1,159 @@
+/** @odoo-module **/
+
+import { Component, onWillStart, useRef, useState } from "@odoo/owl";
+import { registry } from "@web/core/registry";
+import { useService } from "@web/core/utils/hooks";
+import { deserializeDateTime, serializeDateTime } from "@web/core/l10n/dates";
+
+const { DateTime } = luxon;
+
+const PAGE_SIZE = 100;
+
+/**
+ * Planning de la flotte : une ligne par vélo, un bloc par contrat.
+ *
+ * Les vélos sont chargés par pages de PAGE_SIZE au défilement. Les requêtes
+ * GET passent par le cache du navigateur : une page inchangée est revalidée
+ * par ETag (304) sans être recalculée côté serveur. Un changement de fenêtre
+ * ou de filtre annule la requête en cours : une réponse arrivée après
+ * reload() est ignorée (numéro de génération).
+ */
+export class FleetPlanning extends Component {
+    static template = "bike_shop_rental.FleetPlanning";
+    static props = ["*"];
+
+    setup() {
+        this.orm = useService("orm");
+        this.action = useService("action");
+        this.notification = useService("notification");
+        this.body = useRef("body");
+        this.generation = 0;
+        this.controller = null;
+        this.state = useState({
+            start: DateTime.local().startOf("day"),
+            days: 14,
+            categories: [],
+            categoryId: false,
+            bikes: [],
+            total: 0,
+            loading: false,
+        });
+        onWillStart(async () => {
+            this.state.categories = await this.orm.searchRead("bike.category", [], ["name"]);
+            await this.reload();
+        });
+    }
+
+    get end() {
+        return this.state.start.plus({ days: this.state.days });
+    }
+
+    get dayHeaders() {
+        return Array.from({ length: this.state.days }, (_, i) => this.state.start.plus({ days: i }));
+    }
+
+    get categoryNames() {
+        return Object.fromEntries(this.state.categories.map((category) => [category.id, category.name]));
+    }
+
+    async fetchPage(offset, signal) {
+        const params = new URLSearchParams({
+            start: serializeDateTime(this.state.start),
+            end: serializeDateTime(this.end),
+            category_ids: this.state.categoryId || "",
+            offset,
+            limit: PAGE_SIZE,
+        });
+        const response = await fetch(`/bike_shop_rental/planning?${params}`, {
+            credentials: "same-origin",
+            signal,
+        });
+        if (!response.ok) {
+            throw new Error(await response.text());
+        }
+        return response.json();
+    }
+
+    async loadPage(offset) {
+        const generation = this.generation;
+        this.controller = new AbortController();
+        this.state.loading = true;
+        try {
+            const page = await this.fetchPage(offset, this.controller.signal);
+            if (generation !== this.generation) {
+                return;
+            }
+            this.state.total = page.total;
+            this.state.bikes.push(...page.bikes);
+        } catch (error) {
+            if (generation === this.generation && error.name !== "AbortError") {
+                this.notification.add(error.message, { type: "danger" });
+            }
+        } finally {
+            if (generation === this.generation) {
+                this.state.loading = false;
+            }
+        }
+    }
+
+    async reload() {
+        // Les pages en cours de chargement appartiennent à l'ancienne fenêtre
+        this.generation++;
+        if (this.controller) {
+            this.controller.abort();
+        }
+        this.state.bikes = [];
+        this.state.total = 0;
+        await this.loadPage(0);
+    }
+
+    onScroll() {
+        const el = this.body.el;
+        if (
+            !this.state.loading &&
+            this.state.bikes.length < this.state.total &&
+            el.scrollTop + el.clientHeight > el.scrollHeight - 200
+        ) {
+            this.loadPage(this.state.bikes.length);
+        }
+    }
+
+    shift(days) {
+        this.state.start = days ? this.state.start.plus({ days }) : DateTime.local().startOf("day");
+        this.reload();
+    }
+
+    onChangeDays(ev) {
+        this.state.days = parseInt(ev.target.value);
+        this.reload();
+    }
+
+    onChangeCategory(ev) {
+        this.state.categoryId = parseInt(ev.target.value) || false;
+        this.reload();
+    }
+
+    rentalStyle(rental) {
+        const span = this.end.toMillis() - this.state.start.toMillis();
+        const start = deserializeDateTime(rental.start).toMillis() - this.state.start.toMillis();
+        const end = deserializeDateTime(rental.end).toMillis() - this.state.start.toMillis();
+        return `left: ${(100 * start) / span}%; width: ${Math.max((100 * (end - start)) / span, 0.5)}%;`;
+    }
+
+    rentalTitle(rental) {
+        const start = deserializeDateTime(rental.start).toLocaleString(DateTime.DATETIME_SHORT);
+        const end = deserializeDateTime(rental.end).toLocaleString(DateTime.DATETIME_SHORT);
+        return `${rental.name} - ${rental.customer || ""}\n${start} → ${end}`;
+    }
+
+    openRental(rental) {
+        this.action.doAction({
+            type: "ir.actions.act_window",
+            res_model: "rental.order",
+            res_id: rental.id,
+            views: [[false, "form"]],
+        });
+    }
+}
+
+registry.category("actions").add("bike_shop_rental.fleet_planning", FleetPlanning);
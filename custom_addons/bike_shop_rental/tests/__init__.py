@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+from . import test_query_plans
+from . import test_pricing_cache
+from . import test_public_api
+from . import test_constraints
+from . import test_rate_change
+from . import test_occupancy
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from odoo.sql_db import Cursor
+from odoo.tools import SQL
+from odoo.tests.common import TransactionCase
+
+# Parcours d'une table servis par un index avec condition (pas un parcours complet d'index)
+INDEX_SCANS = {'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'}
+
+
+class BikeShopDatasetCase(TransactionCase):
+    """Base des tests sur un jeu de données synthétique (bike.shop.dataset).
+
+    Le jeu est généré une fois par classe, sans validation : la transaction
+    de test l'annule à la fin. Les statistiques sont recalculées pour que
+    les plans reflètent les volumes générés.
+    """
+    # Paramètres de bike.shop.dataset.generate
+    dataset = {'bikes': 300, 'rentals_per_bike': 40, 'years': 1}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stats = cls.env['bike.shop.dataset'].generate(seed=0.42, commit=False, **cls.dataset)
+        cls.env.flush_all()
+        cls.env.cr.execute("ANALYZE")
+
+    @contextmanager
+    def capture_queries(self):
+        """Enregistre les requêtes (SQL, paramètres) exécutées dans le bloc"""
+        queries = []
+        execute = Cursor.execute
+
+        def capture(cr, query, params=None, log_exceptions=True):
+            queries.append((query, params))
+            return execute(cr, query, params, log_exceptions)
+
+        with patch.object(Cursor, 'execute', capture):
+            yield queries
+
+    def find_query(self, queries, *fragments):
+        """Première requête enregistrée contenant tous les fragments"""
+        for query, params in queries:
+            code = query.code if isinstance(query, SQL) else query
+            if all(fragment in code for fragment in fragments):
+                return query, params
+        self.fail(f"Aucune requête ne contient {fragments}")
+
+    def explain(self, query, params=None):
+        """Plan (EXPLAIN, format JSON) d'une requête enregistrée.
+
+        Les parcours séquentiels sont défavorisés : le plan montre si un index
+        peut servir la requête, quelle que soit la taille de la base de test.
+        """
+        if isinstance(query, SQL):
+            query, params = query.code, query.params
+        statement = self.env.cr._obj.mogrify(query, params).decode()
+        with self.env.cr.savepoint():
+            self.env.cr.execute("SET LOCAL enable_seqscan = off")
+            self.env.cr.execute(f"EXPLAIN (FORMAT JSON) {statement}")
+            return self.env.cr.fetchone()[0][0]['Plan']
+
+    def _scan_nodes(self, plan, table):
+        """Nœuds du plan parcourant table"""
+        nodes = [plan] if plan.get('Relation Name') == table else []
+        for child in plan.get('Plans', []):
+            nodes += self._scan_nodes(child, table)
+        return nodes
+
+    def assertIndexScan(self, plan, table):
+        """Vérifie que table n'est lue que par des parcours d'index avec condition"""
+        nodes = self._scan_nodes(plan, table)
+        self.assertTrue(nodes, f"{table} n'apparaît pas dans le plan")
+        for node in nodes:
+            self.assertIn(node['Node Type'], INDEX_SCANS, f"{table} : {node['Node Type']}")
+            if node['Node Type'] != 'Bitmap Heap Scan':
+                self.assertIn('Index Cond', node, f"{table} : parcours complet de {node.get('Index Name')}")
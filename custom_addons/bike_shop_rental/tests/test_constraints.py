@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from psycopg2 import IntegrityError
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from odoo.tools import mute_logger
+
+
+@tagged('post_install', '-at_install')
+class TestConstraints(TransactionCase):
+    """Les contraintes d'unicité sont bien créées en base"""
+
+    @mute_logger('odoo.sql_db')
+    def test_serial_number_unique(self):
+        category = self.env['bike.category'].create({'name': 'Catégorie (test des contraintes)'})
+        self.env['bike.bike'].create({'name': 'Vélo A', 'category_id': category.id, 'serial_number': 'SN-DUP-001'})
+        with self.assertRaises(IntegrityError), self.env.cr.savepoint():
+            self.env['bike.bike'].create({'name': 'Vélo B', 'category_id': category.id, 'serial_number': 'SN-DUP-001'})
+            self.env.flush_all()
+
+    @mute_logger('odoo.sql_db')
+    def test_category_name_unique(self):
+        self.env['bike.category'].create({'name': 'Catégorie (doublon)'})
+        with self.assertRaises(IntegrityError), self.env.cr.savepoint():
+            self.env['bike.category'].create({'name': 'Catégorie (doublon)'})
+            self.env.flush_all()
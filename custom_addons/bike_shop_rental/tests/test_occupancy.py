@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestOccupancy(TransactionCase):
+    """Le rapport d'occupation couvre les périodes inoccupées jusqu'à aujourd'hui"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        category = cls.env['bike.category'].create({'name': 'Catégorie (test d\'occupation)', 'daily_rate': 20.0})
+        cls.bike = cls.env['bike.bike'].create({
+            'name': 'Vélo (test d\'occupation)',
+            'category_id': category.id,
+            'confirmation_state': 'confirmed',
+        })
+        start = fields.Datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=10)
+        cls.env['rental.order'].create({
+            'bike_id': cls.bike.id,
+            'rental_type': 'daily',
+            'start_date': start,
+            'end_date': start + timedelta(days=1),
+            'state': 'confirmed',
+        })
+        cls.Report = cls.env['bike.occupancy.report']
+
+    def _day_rows(self):
+        return self.Report.search([('bike_id', '=', self.bike.id), ('period_type', '=', 'day')])
+
+    def test_idle_days_after_last_rental(self):
+        self.Report._mark_bikes_dirty(self.bike.ids)
+        self.Report._refresh()
+        rows = self._day_rows()
+        self.assertEqual(max(rows.mapped('period_start')), fields.Date.today())
+        self.assertEqual(rows.filtered(lambda row: row.period_start == fields.Date.today()).utilization, 0)
+
+    def test_cron_prunes_old_days(self):
+        self.Report._mark_bikes_dirty(self.bike.ids)
+        self.Report._refresh()
+        self.env['ir.config_parameter'].sudo().set_param('bike_shop_rental.occupancy_day_horizon', 3)
+        self.Report._prune_days()
+        oldest = fields.Date.today() - timedelta(days=3)
+        self.assertTrue(all(day >= oldest for day in self._day_rows().mapped('period_start')))
+        self.assertTrue(self.Report.search_count([('bike_id', '=', self.bike.id), ('period_type', '=', 'month')]))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import api, fields, SUPERUSER_ID
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestPricingCache(TransactionCase):
+    """Un worker au cache chaud lit le tarif validé par un autre worker.
+
+    Chaque worker est simulé par son propre curseur ; les données sont
+    validées puis supprimées à la fin.
+    """
+
+    def setUp(self):
+        super().setUp()
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            category = env['bike.category'].create({'name': 'Catégorie (test du cache)', 'daily_rate': 25.0})
+            bike = env['bike.bike'].create({'name': 'Vélo (test du cache)', 'category_id': category.id})
+            self.category_id, self.bike_id = category.id, bike.id
+        self.addCleanup(self._delete_data)
+
+    def _delete_data(self):
+        with self.registry.cursor() as cr:
+            cr.execute("DELETE FROM bike_bike WHERE id = %s", [self.bike_id])
+            cr.execute("DELETE FROM bike_category WHERE id = %s", [self.category_id])
+
+    def _read_prices(self, env):
+        """Tarif journalier vu par _get_rates, quote_batch et _compute_unit_price"""
+        Pricing = env['bike.shop.pricing.cache']
+        start = fields.Datetime.now() + timedelta(days=1)
+        [quote] = env['rental.order'].quote_batch([
+            {'bike_id': self.bike_id, 'start': start, 'end': start + timedelta(days=2)},
+        ])
+        rental = env['rental.order'].new({
+            'bike_id': self.bike_id,
+            'rental_type': 'daily',
+            'start_date': start,
+            'end_date': start + timedelta(days=2),
+        })
+        return (
+            Pricing._get_rates('bike.category', [self.category_id])[self.category_id]['daily_rate'],
+            Pricing._get_rates('bike.bike', [self.bike_id])[self.bike_id]['daily_rate'],
+            quote['unit_price'],
+            rental.unit_price,
+        )
+
+    def test_rate_change_in_other_worker(self):
+        with self.registry.cursor() as cr_a:
+            env_a = api.Environment(cr_a, SUPERUSER_ID, {})
+            # Worker A : cache chaud
+            self.assertEqual(self._read_prices(env_a), (25.0, 25.0, 25.0, 25.0))
+            self.assertEqual(self._read_prices(env_a), (25.0, 25.0, 25.0, 25.0))
+            cr_a.commit()
+
+            # Worker B : nouveau tarif de la catégorie, propagé au vélo
+            with self.registry.cursor() as cr_b:
+                env_b = api.Environment(cr_b, SUPERUSER_ID, {})
+                env_b['bike.category'].browse(self.category_id).write({'daily_rate': 30.0})
+
+            # Worker A, transaction suivante : plus aucune lecture du tarif périmé
+            env_a.invalidate_all()
+            self.assertEqual(self._read_prices(env_a), (30.0, 30.0, 30.0, 30.0))
+
+    def _get_generation(self, cr, namespace):
+        cr.execute("SELECT value FROM bike_shop_pricing_generation WHERE namespace = %s", [namespace])
+        return cr.fetchone()[0]
+
+    def test_generation_bumped_once_per_transaction(self):
+        with self.registry.cursor() as cr:
+            rates_before = self._get_generation(cr, 'rates')
+            fleet_before = self._get_generation(cr, 'fleet')
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            bike = env['bike.bike'].browse(self.bike_id)
+            env['bike.category'].browse(self.category_id).write({'daily_rate': 26.0})
+            bike.write({'daily_rate': 27.0})
+            bike.write({'name': 'Vélo (test du cache, renommé)', 'color': 'Rouge'})
+            # Les écritures de la transaction contournent le cache
+            self.assertEqual(self._read_prices(env)[1:], (27.0, 27.0, 27.0))
+        with self.registry.cursor() as cr:
+            self.assertEqual(self._get_generation(cr, 'rates'), rates_before + 1)
+            self.assertEqual(self._get_generation(cr, 'fleet'), fleet_before)
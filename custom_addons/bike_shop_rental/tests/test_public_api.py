@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import HttpCase
+
+
+@tagged('post_install', '-at_install')
+class TestPublicApi(HttpCase):
+    """Erreurs client de l'API publique : réponses JSON 4xx, jamais de 500"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.category = cls.env['bike.category'].create({'name': 'Catégorie (test de l\'API)', 'daily_rate': 20.0})
+        cls.bike = cls.env['bike.bike'].create({
+            'name': 'Vélo (test de l\'API)',
+            'category_id': cls.category.id,
+            'confirmation_state': 'confirmed',
+        })
+        start = fields.Datetime.now() + timedelta(days=1)
+        cls.window = {'start': fields.Datetime.to_string(start),
+                      'end': fields.Datetime.to_string(start + timedelta(days=2))}
+
+    def _get(self, route, **params):
+        response = self.url_open(f'/bike_shop_rental/api/{route}', params=params)
+        return response.status_code, response.json()
+
+    def test_bad_dates(self):
+        for params in ({'start': 'foo', 'end': self.window['end']},
+                       {'start': self.window['start'], 'end': '2024-13-45 99:00:00'}):
+            for route in ('availability', 'quote'):
+                status, body = self._get(route, category_id=self.category.id, **params)
+                self.assertEqual(status, 400, f"{route} {params}")
+                self.assertIn('error', body)
+
+    def test_quote_unavailable_bike(self):
+        status, body = self._get('quote', bike_id=self.bike.id, **self.window)
+        self.assertEqual(status, 200)
+        self.assertEqual(body['bike_id'], self.bike.id)
+        for vals in ({'state': 'maintenance'}, {'confirmation_state': 'draft'}, {'active': False}):
+            with self.subTest(vals=vals):
+                self.bike.write(vals)
+                status, body = self._get('quote', bike_id=self.bike.id, **self.window)
+                self.assertEqual(status, 404)
+                self.assertIn('error', body)
+                self.bike.write({'state': 'available', 'confirmation_state': 'confirmed', 'active': True})
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import BikeShopDatasetCase
+
+
+@tagged('post_install', '-at_install')
+class TestQueryPlans(BikeShopDatasetCase):
+    """Les requêtes chaudes de la location sont servies par des index"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.category = cls.env['bike.bike'].search([], limit=1).category_id
+
+    def test_search_available(self):
+        start = fields.Datetime.now() + timedelta(days=1)
+        with self.capture_queries() as queries:
+            self.env['bike.bike'].search_available(start, start + timedelta(days=2), category_id=self.category.id)
+        plan = self.explain(*self.find_query(queries, 'rental_period &&'))
+        self.assertIndexScan(plan, 'rental_order')
+
+    def test_kanban_group_by(self):
+        RentalOrder = self.env['rental.order']
+        with self.capture_queries() as queries:
+            RentalOrder._read_group([('state', 'in', ('confirmed', 'ongoing'))], ['state'], ['__count'])
+        self.assertIndexScan(self.explain(*self.find_query(queries, 'GROUP BY')), 'rental_order')
+        # Contenu d'une colonne du kanban, dans l'ordre par défaut
+        with self.capture_queries() as queries:
+            RentalOrder.search([('state', '=', 'confirmed')], limit=40)
+        self.assertIndexScan(self.explain(*self.find_query(queries, '"rental_order"', 'LIMIT')), 'rental_order')
+        # Vélos d'une catégorie regroupés par état
+        with self.capture_queries() as queries:
+            self.env['bike.bike']._read_group([('category_id', '=', self.category.id)], ['state'], ['__count'])
+        self.assertIndexScan(self.explain(*self.find_query(queries, 'GROUP BY')), 'bike_bike')
+
+    def test_report_group_by(self):
+        since = fields.Datetime.now() - timedelta(days=90)
+        with self.capture_queries() as queries:
+            self.env['rental.report']._read_group(
+                [('state', '=', 'done'), ('start_date', '>=', since)], ['start_date:month'], ['__count'])
+        self.assertIndexScan(self.explain(*self.find_query(queries, 'GROUP BY')), 'rental_order')
+
+    def test_report_pivot_by_month(self):
+        """Un pivot par mois sur des jours entiers est servi par le cumul journalier"""
+        since = fields.Datetime.to_datetime(fields.Date.today() - timedelta(days=90))
+        domain = [('state', '=', 'done'), ('start_date', '>=', since)]
+        with self.capture_queries() as queries:
+            rows = self.env['rental.report']._read_group(domain, ['start_date:month'], ['__count'])
+        plan = self.explain(*self.find_query(queries, 'GROUP BY'))
+        self.assertIndexScan(plan, 'rental_report_daily')
+        self.assertFalse(self._scan_nodes(plan, 'rental_order'))
+        self.assertEqual(sum(count for _month, count in rows), self.env['rental.report'].search_count(domain))
+        self.assertTrue(all(month.day == 1 and month.hour == 0 for month, _count in rows))
+
+    def test_recompute_rental_count(self):
+        bikes = self.env['bike.bike'].search([], limit=5)
+        with self.capture_queries() as queries:
+            self.assertFalse(bikes._recompute_rental_count())
+        plan = self.explain(*self.find_query(queries, 'SET rental_count'))
+        self.assertIndexScan(plan, 'rental_order')
+        self.assertIndexScan(plan, 'rental_order_archive')
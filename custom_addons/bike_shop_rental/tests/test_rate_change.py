@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestRateChange(TransactionCase):
+    """L'aperçu et l'application d'un changement de tarifs visent les mêmes contrats"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.category = cls.env['bike.category'].create({'name': 'Catégorie (test des tarifs)', 'daily_rate': 25.0})
+        bike = cls.env['bike.bike'].create({'name': 'Vélo (test des tarifs)', 'category_id': cls.category.id})
+        start = fields.Datetime.now() + timedelta(days=1)
+        cls.quoted, cls.manual = cls.env['rental.order'].create([{
+            'bike_id': bike.id,
+            'rental_type': 'daily',
+            'start_date': start,
+            'end_date': start + timedelta(days=2),
+        } for _i in range(2)])
+        cls.manual.unit_price = 19.0
+
+    def test_manual_price_kept(self):
+        self.assertEqual(self.quoted.unit_price, 25.0)
+        preview = self.category._preview_rate_change({'daily_rate': 30.0})
+        self.assertEqual(preview, {'bike_count': 1, 'order_count': 1})
+        self.category.write({'daily_rate': 30.0})
+        self.assertEqual(self.quoted.unit_price, 30.0)
+        self.assertEqual(self.manual.unit_price, 19.0)
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from . import category_rate_wizard
+from . import job_enqueue_wizard
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+
+class BikeCategoryRateWizard(models.TransientModel):
+    """Assistant de modification des tarifs d'une catégorie avec aperçu de l'impact"""
+    _name = 'bike.category.rate.wizard'
+    _description = 'Modification des Tarifs de Catégorie'
+
+    category_id = fields.Many2one('bike.category', string='Catégorie', required=True, ondelete='cascade')
+    hourly_rate = fields.Float(string='Tarif Horaire (€)')
+    daily_rate = fields.Float(string='Tarif Journalier (€)')
+    weekly_rate = fields.Float(string='Tarif Hebdomadaire (€)')
+    monthly_rate = fields.Float(string='Tarif Mensuel (€)')
+
+    # Aperçu
+    bike_count = fields.Integer(string='Vélos modifiés', compute='_compute_preview')
+    order_count = fields.Integer(string='Contrats brouillon re-tarifés', compute='_compute_preview')
+
+    @api.model
+    def default_get(self, fields_list):
+        """Pré-remplit les tarifs actuels de la catégorie"""
+        res = super().default_get(fields_list)
+        category = self.env['bike.category'].browse(res.get('category_id'))
+        for rate in self.env['bike.bike']._RATE_FIELDS:
+            if category and rate in fields_list:
+                res[rate] = category[rate]
+        return res
+
+    def _get_rate_vals(self):
+        """Tarifs modifiés par rapport à la catégorie"""
+        self.ensure_one()
+        return {
+            rate: self[rate] for rate in self.env['bike.bike']._RATE_FIELDS
+            if self[rate] != self.category_id[rate]
+        }
+
+    @api.depends('category_id', 'hourly_rate', 'daily_rate', 'weekly_rate', 'monthly_rate')
+    def _compute_preview(self):
+        for wizard in self:
+            preview = wizard.category_id._preview_rate_change(wizard._get_rate_vals()) \
+                if wizard.category_id else {'bike_count': 0, 'order_count': 0}
+            wizard.bike_count = preview['bike_count']
+            wizard.order_count = preview['order_count']
+
+    def action_apply(self):
+        """Applique les nouveaux tarifs à la catégorie (propagation aux vélos)"""
+        self.ensure_one()
+        vals = self._get_rate_vals()
+        if vals:
+            self.category_id.write(vals)
+        return {'type': 'ir.actions.act_window_close'}
+
+    def action_apply_in_background(self):
+        """Applique les tarifs par un travail en arrière-plan (grandes flottes)"""
+        self.ensure_one()
+        vals = self._get_rate_vals()
+        if vals:
+            self.env['bike.shop.job']._enqueue(
+                self.category_id, 'write', kwargs={'vals': vals},
+                name=f"Tarifs de la catégorie {self.category_id.name}",
+                dedup_key=f"bike.category.rates:{self.category_id.id}:{sorted(vals.items())}",
+            )
+        return {'type': 'ir.actions.act_window_close'}
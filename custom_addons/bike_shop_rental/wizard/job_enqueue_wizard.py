@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from odoo import models, fields, api, exceptions
+
+
+class BikeShopJobEnqueueWizard(models.TransientModel):
+    """Envoi d'une action groupée en arrière-plan depuis une vue liste.
+
+    Les actions proposées sont celles déclarées dans _QUEUEABLE_ACTIONS du
+    modèle des enregistrements sélectionnés.
+    """
+    _name = 'bike.shop.job.enqueue.wizard'
+    _description = 'Exécution en Arrière-plan'
+
+    res_model = fields.Char(string='Modèle', required=True)
+    res_ids = fields.Json(string='Enregistrements')
+    record_count = fields.Integer(string='Enregistrements sélectionnés', compute='_compute_record_count')
+    method_name = fields.Selection(selection='_get_method_selection', string='Action', required=True)
+    priority = fields.Integer(string='Priorité', default=10)
+
+    @api.model
+    def _get_method_selection(self):
+        model = self.env.context.get('active_model') or self.env.context.get('default_res_model')
+        if model not in self.env:
+            return []
+        return list(getattr(self.env[model], '_QUEUEABLE_ACTIONS', {}).items())
+
+    @api.model
+    def default_get(self, fields_list):
+        """Reprend le modèle et la sélection de la vue liste"""
+        res = super().default_get(fields_list)
+        res.setdefault('res_model', self.env.context.get('active_model'))
+        res.setdefault('res_ids', self.env.context.get('active_ids', []))
+        return res
+
+    @api.depends('res_ids')
+    def _compute_record_count(self):
+        for wizard in self:
+            wizard.record_count = len(wizard.res_ids or [])
+
+    def action_enqueue(self):
+        """Met l'action en file et ouvre le suivi des travaux"""
+        self.ensure_one()
+        records = self.env[self.res_model].browse(self.res_ids or [])
+        actions = getattr(records, '_QUEUEABLE_ACTIONS', {})
+        if self.method_name not in actions:
+            raise exceptions.UserError("Cette action ne peut pas être exécutée en arrière-plan.")
+        records.check_access('write')
+        # Un double clic sur la même sélection ne crée pas deux travaux
+        digest = hashlib.sha1(repr(sorted(records.ids)).encode()).hexdigest()[:16]
+        job = self.env['bike.shop.job']._enqueue(
+            records, self.method_name,
+            name=f"{actions[self.method_name]} ({len(records)} enregistrement(s))",
+            priority=self.priority,
+            dedup_key=f"{self.res_model}.{self.method_name}:{digest}",
+        )
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'bike.shop.job',
+            'res_id': job.id,
+            'view_mode': 'form',
+        }
@@ -8,8 +8,11 @@
     ],
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/product_views.xml',
         'views/sale_order_views.xml',
+        'views/sales_report_views.xml',
+        'views/stock_move_views.xml',
         'views/menu_views.xml',
     ],
     'demo': [
@@ -1,3 +1,9 @@
 # -*- coding: utf-8 -*-
+from . import pricing_cache
 from . import product
 from . import sale_order
+from . import stock_move
+from . import sales_report
+from . import importer
+from . import dataset
+from . import benchmark
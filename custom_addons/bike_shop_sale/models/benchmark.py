@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api, exceptions
+
+
+class BikeShopBenchmark(models.AbstractModel):
+    """Mesures des chemins critiques de la vente"""
+    _inherit = 'bike.shop.benchmark'
+
+    @api.model
+    def _get_sized_models(self):
+        return super()._get_sized_models() + ['shop.product', 'shop.order', 'shop.order.line', 'shop.stock.move',
+                                              'shop.sales.report']
+
+    @api.model
+    def _get_sample_products(self, sample, used=False):
+        """sample produits confirmés tirés au hasard (used : présents dans des commandes actives)"""
+        condition = """
+            AND EXISTS (
+                SELECT 1 FROM shop_order_line l
+                  JOIN shop_order o ON o.id = l.order_id
+                 WHERE l.product_id = p.id AND o.state NOT IN ('cancelled', 'done')
+            )
+        """ if used else ""
+        self._cr.execute(f"""
+            SELECT p.id FROM shop_product p
+             WHERE p.active AND p.state = 'confirmed' {condition}
+             ORDER BY random()
+             LIMIT %s
+        """, [sample])
+        return self.env['shop.product'].browse([row[0] for row in self._cr.fetchall()])
+
+    @api.model
+    def _get_sample_search_terms(self, sample):
+        """sample fragments de noms de produits (saisie partielle dans le sélecteur)"""
+        self._cr.execute("""
+            SELECT substr(name, 3, 8) FROM shop_product
+             WHERE active AND length(name) > 6
+             ORDER BY random()
+             LIMIT %s
+        """, [sample])
+        return [row[0] for row in self._cr.fetchall()]
+
+    @api.model
+    def _bench_product_name_search_ilike(self, sample):
+        """Recherche ILIKE d'origine sur le nom, sample saisies (20 résultats)"""
+        Product = self.env['shop.product']
+        terms = self._get_sample_search_terms(sample)
+
+        def search():
+            for term in terms:
+                Product.search([('name', 'ilike', term)], limit=20)
+        return search
+
+    @api.model
+    def _bench_product_fuzzy_search(self, sample):
+        """Recherche approchée classée (index trigrammes), sample saisies (20 résultats)"""
+        Product = self.env['shop.product']
+        terms = self._get_sample_search_terms(sample)
+
+        def search():
+            for term in terms:
+                Product.search_fuzzy(term, limit=20)
+        return search
+
+    @api.model
+    def _bench_product_barcode_lookup(self, sample):
+        """sample lectures de code-barres (cache du worker déjà chaud)"""
+        Product = self.env['shop.product']
+        self._cr.execute("""
+            SELECT barcode FROM shop_product
+             WHERE active AND barcode IS NOT NULL
+             ORDER BY random()
+             LIMIT %s
+        """, [sample])
+        barcodes = [row[0] for row in self._cr.fetchall()]
+        for barcode in barcodes:
+            Product.lookup_barcode(barcode)
+
+        def lookup():
+            for barcode in barcodes:
+                Product.lookup_barcode(barcode)
+        return lookup
+
+    @api.model
+    def _get_validation_samples(self, sample):
+        ShopOrder = self.env['shop.order']
+        return super()._get_validation_samples(sample) + [ShopOrder.concat(*[ShopOrder.new({
+            'customer_name': 'Client Mesure',
+            'customer_email': 'client.mesure@example.com',
+            'customer_phone': '+33 6 12 34 56 78',
+        }) for __ in range(sample)])]
+
+    @api.model
+    def _bench_order_confirm(self, sample):
+        """Confirmation de sample commandes de 2 lignes (réservation du stock)"""
+        products = self._get_sample_products(sample * 2)
+        orders = self.env['shop.order'].create([{
+            'customer_name': 'Client Mesure',
+            'line_ids': [(0, 0, {'product_id': product.id, 'quantity': 1, 'unit_price': product.price})
+                         for product in products[i * 2:i * 2 + 2]],
+        } for i in range(len(products) // 2)])
+        return orders.action_confirm
+
+    @api.model
+    def _bench_sales_report_pivot(self, sample):
+        """Pivots de l'analyse des ventes (mois x type de produit, produit x état)"""
+        Report = self.env['shop.sales.report']
+
+        def pivot():
+            Report._read_group([], ['day:month', 'product_type'], ['revenue:sum', 'margin:sum', 'quantity:sum'])
+            Report._read_group([], ['product_id', 'state'], ['revenue:sum', 'margin:sum'])
+        return pivot
+
+    @api.model
+    def _bench_product_unlink(self, sample):
+        """Suppression de sample produits inutilisés"""
+        products = self.env['shop.product'].create([{
+            'name': f'Produit Mesure {i}',
+            'price': 10.0,
+        } for i in range(sample)])
+        return products.unlink
+
+    @api.model
+    def _bench_product_unlink_check(self, sample):
+        """Refus de suppression de sample produits utilisés dans des commandes actives"""
+        products = self._get_sample_products(sample, used=True)
+
+        def unlink():
+            try:
+                products.unlink()
+            except exceptions.ValidationError:
+                pass
+        return unlink
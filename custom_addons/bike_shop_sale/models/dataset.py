@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+from odoo import models, fields, api
+from odoo.addons.bike_shop_rental.models.dataset import SEASONAL_WEIGHT_SQL
+
+_logger = logging.getLogger(__name__)
+
+
+class BikeShopDataset(models.AbstractModel):
+    """Génération du catalogue, des commandes de vente et de leurs mouvements de stock"""
+    _inherit = 'bike.shop.dataset'
+
+    @api.model
+    def generate(self, products=500, orders=10000, order_chunk_size=50000, **kwargs):
+        """Complète la flotte et les locations par les ventes.
+
+        :param products: nombre de produits (5 % vélos, 55 % accessoires, 40 % pièces)
+        :param orders: nombre de commandes, de 1 à 4 lignes chacune
+        :param order_chunk_size: commandes insérées par requête
+        """
+        stats = super().generate(**kwargs)
+        started = time.monotonic()
+        commit = kwargs.get('commit', True)
+        now = fields.Datetime.now()
+        origin = now - timedelta(days=365 * kwargs.get('years', 3))
+
+        product_ids = self._generate_products(products, orders, origin)
+        stats['products'] = len(product_ids)
+        # Codes-barres insérés hors ORM : périme les codes inconnus mis en cache
+        self.env['bike.shop.pricing.cache']._invalidate(['barcodes'])
+        self._commit(commit)
+        stats['orders'] = 0
+        while stats['orders'] < orders:
+            count = min(order_chunk_size, orders - stats['orders'])
+            stats['orders'] += self._generate_orders(count, product_ids, origin, now)
+            self._commit(commit)
+            _logger.info("Jeu de données : %s commandes", stats['orders'])
+        # Les insertions en masse contournent la mise à jour incrémentale du cumul
+        self.env['shop.sales.report']._rebuild()
+        self._commit(commit)
+        self.env.invalidate_all()
+        stats['seconds'] += time.monotonic() - started
+        return stats
+
+    @api.model
+    def _generate_products(self, count, orders, origin):
+        """Insère le catalogue et une réception initiale couvrant toutes les commandes.
+
+        :return: ids des produits créés
+        """
+        initial_stock = 100 + (orders * 6) // max(count, 1)
+        self._cr.execute("""
+            WITH g AS (
+                SELECT nextval('shop_product_id_seq') AS id, random() AS r_type, random() AS r_price
+                  FROM generate_series(1, %(count)s)
+            ),
+            p AS (
+                SELECT g.id,
+                       CASE WHEN g.r_type < 0.05 THEN 'bike'
+                            WHEN g.r_type < 0.6 THEN 'accessory'
+                            ELSE 'part'
+                       END AS product_type,
+                       g.r_price
+                  FROM g
+            ),
+            inserted AS (
+                INSERT INTO shop_product (
+                    id, name, barcode, product_type, price, cost, active, state,
+                    create_uid, write_uid, create_date, write_date
+                )
+                SELECT p.id,
+                       CASE p.product_type WHEN 'bike' THEN 'Vélo ' WHEN 'accessory' THEN 'Accessoire ' ELSE 'Pièce ' END
+                           || p.id,
+                       '2' || lpad(p.id::text, 12, '0'),
+                       p.product_type, price.value, round((price.value * (0.5 + random() * 0.3))::numeric, 2),
+                       true, 'confirmed', %(uid)s, %(uid)s, %(origin)s, %(origin)s
+                  FROM p,
+                       LATERAL (
+                            SELECT round((CASE p.product_type
+                                              WHEN 'bike' THEN 400 + p.r_price * 2600
+                                              WHEN 'accessory' THEN 10 + p.r_price * 140
+                                              ELSE 5 + p.r_price * 75
+                                          END)::numeric, 2) AS value
+                       ) price
+             RETURNING id
+            )
+            INSERT INTO shop_stock_move (
+                product_id, date, quantity, move_type, note,
+                create_uid, write_uid, create_date, write_date
+            )
+            SELECT id, %(origin)s, %(stock)s, 'receipt', 'Stock initial (jeu de données)',
+                   %(uid)s, %(uid)s, %(origin)s, %(origin)s
+              FROM inserted
+         RETURNING product_id
+        """, {'count': count, 'origin': origin, 'stock': initial_stock, 'uid': self.env.uid})
+        return [row[0] for row in self._cr.fetchall()]
+
+    @api.model
+    def _generate_orders(self, count, product_ids, origin, now):
+        """Insère count commandes saisonnières, leurs lignes et leurs sorties de stock.
+
+        Les commandes de plus de 30 jours sont clôturées (livrées, payées,
+        facturées ou annulées), les plus récentes à tous les états.
+
+        :return: nombre de commandes créées
+        """
+        span = (now - origin).total_seconds()
+        seasonal = SEASONAL_WEIGHT_SQL.format(date='c.at')
+        self._cr.execute(f"""
+            WITH c AS (
+                SELECT %(origin)s + random() * %(span)s * interval '1 second' AS at, random() AS r_state
+                  FROM generate_series(1, %(oversample)s)
+            ),
+            o AS (
+                SELECT c.at, c.r_state FROM c
+                 WHERE random() < {seasonal}
+                 LIMIT %(count)s
+            ),
+            s AS (
+                SELECT nextval('shop_order_id_seq') AS id, o.at,
+                       CASE WHEN o.at < %(now)s - interval '30 days' THEN
+                                CASE WHEN o.r_state < 0.05 THEN 'cancelled'
+                                     WHEN o.r_state < 0.15 THEN 'invoiced'
+                                     WHEN o.r_state < 0.35 THEN 'paid'
+                                     ELSE 'done'
+                                END
+                            WHEN o.r_state < 0.3 THEN 'draft'
+                            WHEN o.r_state < 0.6 THEN 'confirmed'
+                            WHEN o.r_state < 0.8 THEN 'invoiced'
+                            ELSE 'paid'
+                       END AS state
+                  FROM o
+            )
+            INSERT INTO shop_order (
+                id, name, date, customer_name, state, total, invoice_date, payment_date,
+                create_uid, write_uid, create_date, write_date
+            )
+            SELECT s.id, 'GEN-CMD-' || s.id, s.at::date, 'Client ' || (1 + floor(random() * 100000)::int),
+                   s.state, 0,
+                   CASE WHEN s.state IN ('invoiced', 'paid', 'done') THEN s.at + interval '1 day' END,
+                   CASE WHEN s.state IN ('paid', 'done') THEN s.at + interval '5 days' END,
+                   %(uid)s, %(uid)s, s.at, s.at
+              FROM s
+         RETURNING id
+        """, {'origin': origin, 'now': now, 'span': span, 'count': count,
+              'oversample': count * 2, 'uid': self.env.uid})
+        order_ids = [row[0] for row in self._cr.fetchall()]
+        if not order_ids:
+            return 0
+        params = {'order_ids': order_ids, 'product_ids': product_ids,
+                  'products': len(product_ids), 'uid': self.env.uid}
+        # 1 à 4 lignes par commande ; les vélos se vendent à l'unité
+        self._cr.execute("""
+            WITH l AS (
+                SELECT o.id AS order_id, o.create_date,
+                       (%(product_ids)s::int[])[1 + floor(random() * %(products)s)::int] AS product_id,
+                       random() AS r_quantity
+                  FROM shop_order o,
+                       LATERAL generate_series(1, 1 + (o.id * 7919) %% 4)
+                 WHERE o.id = ANY(%(order_ids)s)
+            )
+            INSERT INTO shop_order_line (
+                order_id, product_id, quantity, unit_price, unit_cost, subtotal,
+                create_uid, write_uid, create_date, write_date
+            )
+            SELECT l.order_id, p.id, q.quantity, p.price, p.cost, q.quantity * p.price,
+                   %(uid)s, %(uid)s, l.create_date, l.create_date
+              FROM l
+              JOIN shop_product p ON p.id = l.product_id,
+                   LATERAL (
+                        SELECT CASE WHEN p.product_type = 'bike' THEN 1
+                                    ELSE 1 + floor(l.r_quantity * 3)::int
+                               END AS quantity
+                   ) q
+        """, params)
+        self._cr.execute("""
+            UPDATE shop_order o
+               SET total = t.total
+              FROM (
+                    SELECT order_id, SUM(subtotal) AS total
+                      FROM shop_order_line
+                     WHERE order_id = ANY(%(order_ids)s)
+                     GROUP BY order_id
+              ) t
+             WHERE o.id = t.order_id
+        """, params)
+        # Sorties de stock des commandes confirmées (cf. shop.order._reserve_stock)
+        self._cr.execute("""
+            INSERT INTO shop_stock_move (
+                product_id, date, quantity, move_type, order_id,
+                create_uid, write_uid, create_date, write_date
+            )
+            SELECT l.product_id, o.create_date, -l.quantity, 'order_confirm', o.id,
+                   %(uid)s, %(uid)s, o.create_date, o.create_date
+              FROM shop_order_line l
+              JOIN shop_order o ON o.id = l.order_id
+             WHERE o.id = ANY(%(order_ids)s)
+               AND o.state IN ('confirmed', 'invoiced', 'paid', 'done')
+        """, params)
+        return len(order_ids)
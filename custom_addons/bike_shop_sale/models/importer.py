@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import itertools
+from odoo import models, api
+
+
+class BikeShopImporter(models.AbstractModel):
+    """Import en flux des commandes de vente"""
+    _inherit = 'bike.shop.importer'
+
+    @api.model
+    def _import_lookups_shop_order(self):
+        self.env['shop.product'].flush_model(['name'])
+        return {
+            'product': self._import_lookup_table("""
+                SELECT DISTINCT ON (lower(name)) lower(name), id
+                  FROM shop_product
+                 ORDER BY lower(name), id
+            """),
+        }
+
+    @api.model
+    def _import_prepare_shop_order(self, rows, lookups):
+        """Une ligne par ligne de commande, regroupées par order_ref consécutifs.
+
+        Colonnes : order_ref, date, customer_name, customer_phone, customer_email,
+        state, product, quantity, unit_price
+        """
+        for order_ref, order_rows in itertools.groupby(rows, key=lambda row: row.get('order_ref')):
+            order_rows = list(order_rows)
+            header = order_rows[0]
+            errors = [] if order_ref else ["Colonne manquante ou vide : order_ref"]
+            lines = []
+            for row in order_rows:
+                line = {'product_id': lookups['product'].get((row.get('product') or '').lower())}
+                if not line['product_id']:
+                    errors.append(f"Produit inconnu : '{row.get('product') or ''}'")
+                try:
+                    line['quantity'] = int(row.get('quantity') or 1)
+                    line['unit_price'] = float(row.get('unit_price') or 0)
+                except ValueError as e:
+                    errors.append(f"Valeur numérique invalide : {e}")
+                lines.append((0, 0, line))
+            vals = {
+                'name': order_ref or 'Nouveau',
+                'date': header.get('date'),
+                'customer_name': header.get('customer_name'),
+                'customer_phone': header.get('customer_phone') or False,
+                'customer_email': header.get('customer_email') or False,
+                'state': header.get('state') or 'draft',
+                'line_ids': lines,
+            }
+            yield len(order_rows), vals, errors
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+from odoo.addons.bike_shop_rental.models.pricing_cache import MISS, get_cache
+
+
+class BikeShopPricingCache(models.AbstractModel):
+    """Codes-barres des produits dans le cache du worker (espace 'barcodes')"""
+    _inherit = 'bike.shop.pricing.cache'
+
+    @api.model
+    def _get_namespaces(self):
+        return super()._get_namespaces() + ['barcodes']
+
+    @api.model
+    def _get_barcode(self, barcode):
+        """Id du produit actif portant ce code-barres (None si aucun) ; les codes inconnus sont aussi mis en cache"""
+        generation = self._get_generations().get('barcodes')
+        cache = get_cache(self._cr.dbname)
+        key = ('barcodes', 'shop.product', barcode)
+        product_id = MISS if generation is None else cache.get(key, generation)
+        if product_id is MISS:
+            self.env['shop.product'].flush_model(['barcode', 'active'])
+            self._cr.execute("SELECT id FROM shop_product WHERE barcode = %s AND active", [barcode])
+            row = self._cr.fetchone()
+            product_id = row[0] if row else None
+            if generation is not None:
+                cache.put(key, generation, product_id)
+        return product_id
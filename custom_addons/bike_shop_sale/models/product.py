@@ -1,5 +1,11 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, exceptions
+from odoo.tools import SQL
+
+
+def _like_pattern(value):
+    """Motif ILIKE '%value%' (caractères spéciaux échappés)"""
+    return '%' + value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
 
 
 class ShopProduct(models.Model):
@@ -9,6 +15,7 @@ class ShopProduct(models.Model):
     _order = 'name'
 
     name = fields.Char(string='Nom', required=True)
+    barcode = fields.Char(string='Code-barres / SKU', copy=False)
     product_type = fields.Selection([
         ('bike', 'Vélo'),
         ('accessory', 'Accessoire'),
@@ -18,7 +25,10 @@ class ShopProduct(models.Model):
     description = fields.Text(string='Description')
     price = fields.Float(string='Prix de vente (€)', required=True, default=0.0)
     cost = fields.Float(string='Prix d\'achat (€)', default=0.0)
-    quantity = fields.Integer(string='Quantité en stock', default=0)
+    # Stock = dernier instantané + mouvements postérieurs (journal shop.stock.move)
+    quantity = fields.Integer(string='Quantité en stock', compute='_compute_quantity',
+                              inverse='_inverse_quantity')
+    stock_move_ids = fields.One2many('shop.stock.move', 'product_id', string='Mouvements de stock')
 
     active = fields.Boolean(string='Actif', default=True)
     state = fields.Selection([
@@ -26,6 +36,149 @@ class ShopProduct(models.Model):
         ('confirmed', 'Confirmé'),
     ], string='État', default='draft', required=True)
 
+    # Index unique : sert aussi la recherche exacte par code-barres
+    _barcode_unique = models.UniqueIndex('(barcode)', 'Le code-barres doit être unique!')
+
+    def init(self):
+        """Index trigrammes (pg_trgm) de la recherche approchée et des recherches ILIKE"""
+        self._cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS shop_product_name_trgm_idx
+            ON shop_product USING gin (name gin_trgm_ops)
+        """)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS shop_product_description_trgm_idx
+            ON shop_product USING gin (description gin_trgm_ops)
+        """)
+
+    @api.model
+    def search_fuzzy(self, query, limit=20, domain=None):
+        """Produits dont le nom ou la description ressemble à query, du plus au moins pertinent.
+
+        Une requête servie par les index trigrammes : sous-chaîne (ILIKE) ou
+        mots proches (opérateur <%, tolérant aux fautes de frappe). Le
+        code-barres exact passe en tête, puis les noms contenant query, puis
+        la similarité des mots du nom et de la description.
+
+        :param domain: filtre supplémentaire (règles d'accès et produits actifs appliqués)
+        :return: produits classés
+        """
+        query = (query or '').strip()
+        if not query:
+            return self.browse()
+        self.flush_model(['name', 'description', 'barcode'])
+        self._cr.execute(SQL("""
+            SELECT p.id
+              FROM shop_product p
+             WHERE p.id IN %(allowed)s
+               AND (p.barcode = %(query)s
+                    OR p.name ILIKE %(like)s
+                    OR %(query)s <%% p.name
+                    OR p.description ILIKE %(like)s
+                    OR %(query)s <%% p.description)
+             ORDER BY p.barcode = %(query)s IS TRUE DESC,
+                      p.name ILIKE %(like)s DESC,
+                      word_similarity(%(query)s, p.name)
+                          + 0.5 * word_similarity(%(query)s, COALESCE(p.description, '')) DESC,
+                      p.name, p.id
+             LIMIT %(limit)s
+        """, allowed=self._search(domain or []).subselect(), query=query, like=_like_pattern(query), limit=limit))
+        return self.browse([row[0] for row in self._cr.fetchall()])
+
+    @api.model
+    def lookup_barcode(self, barcode):
+        """Produit actif portant exactement ce code-barres / SKU, servi par le cache du worker"""
+        barcode = (barcode or '').strip()
+        if not barcode:
+            return self.browse()
+        product_id = self.env['bike.shop.pricing.cache']._get_barcode(barcode)
+        return self.browse(product_id) if product_id else self.browse()
+
+    @api.model
+    def name_search(self, name='', domain=None, operator='ilike', limit=100):
+        """Sélecteur de produit : code-barres scanné, sinon recherche approchée classée"""
+        if not name or operator != 'ilike':
+            return super().name_search(name, domain, operator, limit)
+        product = self.lookup_barcode(name)
+        if product and product.filtered_domain(domain or []):
+            return [(product.id, product.display_name)]
+        return [(product.id, product.display_name) for product in self.search_fuzzy(name, limit, domain)]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Périme les codes-barres en cache (codes inconnus jusqu'ici)"""
+        products = super().create(vals_list)
+        if any(vals.get('barcode') for vals in vals_list):
+            self.env['bike.shop.pricing.cache']._invalidate(['barcodes'])
+        return products
+
+    @api.depends('stock_move_ids.quantity')
+    def _compute_quantity(self):
+        product_ids = [product._origin.id for product in self if product._origin.id]
+        stock = self.get_stock_at(product_ids=product_ids) if product_ids else {}
+        for product in self:
+            product.quantity = stock.get(product._origin.id, 0)
+
+    def _inverse_quantity(self):
+        """Une saisie manuelle du stock est enregistrée comme un ajustement"""
+        current = self.get_stock_at(product_ids=self.ids)
+        self.env['shop.stock.move']._register('adjustment', {
+            product.id: product.quantity - current.get(product.id, 0) for product in self
+        })
+
+    @api.model
+    def get_stock_at(self, date=None, product_ids=None):
+        """Retourne le stock de tous les produits (ou de product_ids) à une date, en une requête.
+
+        Le stock est le dernier instantané antérieur à la date augmenté des
+        mouvements postérieurs ; les deux lectures sont servies par des index
+        couvrants (index-only scan). Avant le plus ancien instantané, les
+        mouvements repliés ne sont plus disponibles.
+
+        :param date: date de calcul (maintenant si vide)
+        :return: dict {product_id: quantité}
+        """
+        self.env['shop.stock.move'].flush_model()
+        at = fields.Datetime.to_datetime(date) if date else 'infinity'
+        where_ids = "WHERE p.id = ANY(%(product_ids)s)" if product_ids is not None else ""
+        self._cr.execute(f"""
+            SELECT p.id,
+                   COALESCE(s.quantity, 0) + COALESCE((
+                        SELECT SUM(m.quantity)
+                          FROM shop_stock_move m
+                         WHERE m.product_id = p.id
+                           AND m.date >= COALESCE(s.date, '-infinity')
+                           AND m.date < %(at)s
+                   ), 0)
+              FROM shop_product p
+              LEFT JOIN LATERAL (
+                    SELECT date, quantity
+                      FROM shop_stock_snapshot
+                     WHERE product_id = p.id AND date <= %(at)s
+                     ORDER BY date DESC
+                     LIMIT 1
+              ) s ON true
+            {where_ids}
+        """, {'at': at, 'product_ids': list(product_ids or [])})
+        return dict(self._cr.fetchall())
+
+    def _lock_stock(self):
+        """Verrouille les lignes de ces produits jusqu'à la fin de la transaction.
+
+        La ligne est réécrite à l'identique (et non seulement verrouillée) : si
+        une autre transaction a réservé ces produits depuis notre instantané
+        REPEATABLE READ, PostgreSQL lève une erreur de sérialisation et Odoo
+        rejoue la requête au lieu de lire un stock périmé. Les verrous sont
+        pris par id croissant pour éviter les interblocages.
+        """
+        if self:
+            self._cr.execute("""
+                UPDATE shop_product p
+                   SET write_date = p.write_date
+                  FROM (SELECT id FROM shop_product WHERE id = ANY(%s) ORDER BY id FOR UPDATE) l
+                 WHERE p.id = l.id
+            """, [sorted(self.ids)])
+
     @api.depends('price', 'cost')
     def _compute_margin(self):
         for product in self:
@@ -75,19 +228,31 @@ class ShopProduct(models.Model):
                     f"Prix de vente: {product.price}€, Prix d'achat: {product.cost}€"
                 )
 
+    def write(self, vals):
+        """Reclasse le cumul des ventes des produits changeant de type, périme les codes-barres en cache"""
+        if {'barcode', 'active'} & set(vals):
+            self.env['bike.shop.pricing.cache']._invalidate(['barcodes'])
+        moved = self.filtered(lambda product: product.product_type != vals['product_type']) \
+            if 'product_type' in vals else self.browse()
+        res = super().write(vals)
+        self.env['shop.sales.report']._move_product_type(moved, vals.get('product_type'))
+        return res
+
     def unlink(self):
         """Empêche la suppression des produits utilisés dans des commandes actives"""
+        # Lignes de commande actives de tous les produits, en une seule requête
+        counts = dict(self.env['shop.order.line']._read_group(
+            [('product_id', 'in', self.ids), ('order_id.state', 'not in', ['cancelled', 'done'])],
+            ['product_id'], ['__count'],
+        ))
         for product in self:
-            # Chercher les lignes de commande qui utilisent ce produit
-            order_lines = self.env['shop.order.line'].search([
-                ('product_id', '=', product.id),
-                ('order_id.state', 'not in', ['cancelled', 'done'])
-            ])
-            if order_lines:
+            if counts.get(product):
                 raise exceptions.ValidationError(
                     f"Impossible de supprimer le produit '{product.name}' car il est utilisé "
-                    f"dans {len(order_lines)} ligne(s) de commande active(s)."
+                    f"dans {counts[product]} ligne(s) de commande active(s)."
                 )
+        if any(self.mapped('barcode')):
+            self.env['bike.shop.pricing.cache']._invalidate(['barcodes'])
         return super().unlink()
 
     def action_confirm_and_return(self):
@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
-import re
+from collections import defaultdict
 from odoo import models, fields, api, exceptions
+from odoo.addons.bike_shop_rental.models.validation_mixin import email_error, phone_error, name_digits_error
 
 
 class ShopOrder(models.Model):
     """Commande de vente du magasin"""
     _name = 'shop.order'
+    _inherit = ['bike.shop.validation.mixin']
     _description = 'Commande de Vente'
     _order = 'date desc, id desc'
 
+    # Actions groupées pouvant être envoyées en arrière-plan (cf. bike.shop.job.enqueue.wizard)
+    _QUEUEABLE_ACTIONS = {
+        'action_confirm': "Confirmer",
+        'action_invoice': "Facturer",
+        'action_pay': "Marquer payé",
+        'action_done': "Marquer livré",
+        'action_cancel': "Annuler",
+    }
+
     name = fields.Char(string='Numéro', required=True, copy=False, readonly=True, default='Nouveau')
     date = fields.Date(string='Date', required=True, default=fields.Date.today)
 
@@ -33,6 +44,11 @@ class ShopOrder(models.Model):
         ('cancelled', 'Annulé'),
     ], string='État', default='draft', required=True, group_expand='_group_expand_states')
 
+    # Ordre par défaut des listes (_order)
+    _date_id_idx = models.Index('(date DESC, id DESC)')
+    # Commandes actives (suppression de produits, suivi des commandes)
+    _open_idx = models.Index("(id) WHERE state NOT IN ('cancelled', 'done')")
+
     @api.model
     def _group_expand_states(self, states, domain):
         """Force l'ordre des colonnes dans le kanban"""
@@ -49,64 +65,160 @@ class ShopOrder(models.Model):
         for order in self:
             order.total = sum(line.subtotal for line in order.line_ids)
 
-    @api.constrains('date')
-    def _check_order_date(self):
+    # Règles métier évaluées en une passe par bike.shop.validation.mixin :
+    # (champs déclencheurs, méthode règle)
+    _validation_rules = (
+        (('date',), '_rule_order_date'),
+        (('customer_name',), '_rule_customer_name'),
+        (('customer_email',), '_rule_email'),
+        (('customer_phone',), '_rule_phone'),
+    )
+
+    def _rule_order_date(self):
         """Vérifie que la date de commande n'est pas dans le passé pour les nouvelles commandes"""
-        for order in self:
-            # Seulement pour les nouvelles commandes en brouillon
-            if order.state == 'draft' and order.date and order.date < fields.Date.today():
-                raise exceptions.ValidationError(
-                    f"La date de commande ne peut pas être dans le passé. "
-                    f"Date saisie : {order.date}, Date actuelle : {fields.Date.today()}"
-                )
+        # Seulement pour les nouvelles commandes en brouillon
+        if self.state == 'draft' and self.date and self.date < fields.Date.today():
+            return (
+                f"La date de commande ne peut pas être dans le passé. "
+                f"Date saisie : {self.date}, Date actuelle : {fields.Date.today()}"
+            )
 
-    @api.constrains('customer_name')
-    def _check_customer_name(self):
+    def _rule_customer_name(self):
         """Vérifie que le nom du client ne contient pas de chiffres"""
-        for order in self:
-            if order.customer_name and any(char.isdigit() for char in order.customer_name):
-                raise exceptions.ValidationError(
-                    f"Le nom du client '{order.customer_name}' n'est pas valide. "
-                    "Le nom ne peut pas contenir de chiffres."
-                )
+        return name_digits_error(self.customer_name)
 
-    @api.constrains('customer_email')
-    def _check_email(self):
+    def _rule_email(self):
         """Vérifie le format de l'email"""
-        email_regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        for order in self:
-            if order.customer_email and not re.match(email_regex, order.customer_email):
-                raise exceptions.ValidationError(
-                    f"L'email '{order.customer_email}' n'est pas valide. "
-                    "Format attendu : exemple@domaine.com"
-                )
+        return email_error(self.customer_email)
 
-    @api.constrains('customer_phone')
-    def _check_phone(self):
+    def _rule_phone(self):
         """Vérifie le format du téléphone"""
-        phone_regex = r'^(\+\d{1,3}[\s.-]?)?\(?\d{1,4}\)?[\s.-]?\d{1,4}[\s.-]?\d{1,4}[\s.-]?\d{1,9}$'
-        for order in self:
-            if order.customer_phone:
-                # Enlever les espaces pour vérifier qu'il y a assez de chiffres
-                phone_digits = re.sub(r'[^\d]', '', order.customer_phone)
-                if len(phone_digits) < 10:
-                    raise exceptions.ValidationError(
-                        f"Le numéro de téléphone '{order.customer_phone}' n'est pas valide. "
-                        "Il doit contenir au moins 10 chiffres."
-                    )
-                if not re.match(phone_regex, order.customer_phone):
-                    raise exceptions.ValidationError(
-                        f"Le numéro de téléphone '{order.customer_phone}' n'est pas valide. "
-                        "Format attendu : +33612345678 ou 0612345678"
-                    )
+        return phone_error(self.customer_phone)
 
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('name', 'Nouveau') == 'Nouveau':
-                vals['name'] = self.env['ir.sequence'].next_by_code('shop.order') or 'Nouveau'
+        self.env['bike.shop.numbering']._assign_numbers(vals_list, 'name', 'shop.order', 'Nouveau', 'Nouveau')
         return super().create(vals_list)
 
+    def write(self, vals):
+        """Déplace la contribution des lignes au cumul des ventes si l'état ou la date change"""
+        if not {'state', 'date'} & set(vals):
+            return super().write(vals)
+        # Les lignes créées / supprimées ici mettent à jour le cumul elles-mêmes
+        if 'line_ids' in vals:
+            vals = dict(vals)
+            super().write({'line_ids': vals.pop('line_ids')})
+        Report = self.env['shop.sales.report']
+        contributions_before = Report._get_contributions(self.line_ids)
+        res = super().write(vals)
+        Report._apply_contributions(contributions_before, Report._get_contributions(self.line_ids))
+        return res
+
+    def unlink(self):
+        """Retranche les lignes (supprimées en cascade par la base) du cumul des ventes"""
+        Report = self.env['shop.sales.report']
+        Report._apply_contributions(Report._get_contributions(self.line_ids), {})
+        return super().unlink()
+
+    def _get_product_quantities(self):
+        """Retourne les quantités commandées agrégées par produit : {product_id: quantité}"""
+        quantities = defaultdict(int)
+        for line in self.line_ids:
+            if line.product_id:
+                quantities[line.product_id.id] += line.quantity
+        return dict(quantities)
+
+    def _reserve_stock(self):
+        """Réserve le stock des commandes en une instruction pour tout le lot.
+
+        Les lignes des produits concernés sont verrouillées avant toute lecture
+        du journal (cf. shop.product._lock_stock) : une confirmation concurrente
+        attend la nôtre puis échoue en erreur de sérialisation et est rejouée
+        avec un instantané à jour (par Odoo pour une requête HTTP, par
+        bike.shop.job._run pour un travail en arrière-plan).
+
+        Une seule insertion gardée enregistre ensuite les sorties : une
+        commande n'est réservée, tout ou rien, que si le cumul des quantités
+        des commandes réservables qui la précèdent (par id) et des siennes
+        tient dans le stock de chaque produit. Une commande dont une ligne
+        dépasse à elle seule le stock n'entre pas dans le cumul.
+
+        :return: dict {order_id: [(product_id, quantité demandée, stock restant)]}
+            des commandes non réservées, limité aux produits en cause
+        """
+        if not self:
+            return {}
+        self.env['shop.order.line'].flush_model(['order_id', 'product_id', 'quantity'])
+        self._cr.execute("""
+            SELECT DISTINCT product_id FROM shop_order_line WHERE order_id = ANY(%s)
+        """, [self.ids])
+        product_ids = [row[0] for row in self._cr.fetchall()]
+        if not product_ids:
+            return {}
+        Product = self.env['shop.product']
+        Product.browse(product_ids)._lock_stock()
+        stock = Product.get_stock_at(product_ids=product_ids)
+        self._cr.execute("""
+            WITH stock AS (
+                SELECT * FROM unnest(%(product_ids)s::int[], %(available)s::int[]) AS s(product_id, available)
+            ),
+            demand AS (
+                SELECT l.order_id, l.product_id, SUM(l.quantity) AS quantity, s.available
+                  FROM shop_order_line l
+                  JOIN stock s ON s.product_id = l.product_id
+                 WHERE l.order_id = ANY(%(order_ids)s)
+                 GROUP BY l.order_id, l.product_id, s.available
+                HAVING SUM(l.quantity) > 0
+            ),
+            allocated AS (
+                SELECT d.*, SUM(d.quantity) OVER (PARTITION BY d.product_id ORDER BY d.order_id) AS cumulative
+                  FROM demand d
+                 WHERE d.order_id IN (
+                        SELECT order_id FROM demand GROUP BY order_id HAVING bool_and(quantity <= available)
+                 )
+            ),
+            reserved AS (
+                SELECT order_id FROM allocated GROUP BY order_id HAVING bool_and(cumulative <= available)
+            ),
+            moves AS (
+                INSERT INTO shop_stock_move (
+                    product_id, date, quantity, move_type, order_id,
+                    create_uid, write_uid, create_date, write_date
+                )
+                SELECT a.product_id, now() AT TIME ZONE 'UTC', -a.quantity, 'order_confirm', a.order_id,
+                       %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+                  FROM allocated a
+                  JOIN reserved r ON r.order_id = a.order_id
+            )
+            SELECT d.order_id, d.product_id, d.quantity,
+                   GREATEST(d.available - COALESCE(a.cumulative - a.quantity, 0), 0)
+              FROM demand d
+              LEFT JOIN allocated a ON a.order_id = d.order_id AND a.product_id = d.product_id
+             WHERE d.order_id NOT IN (SELECT order_id FROM reserved)
+               AND (d.quantity > d.available OR a.cumulative > a.available)
+             ORDER BY d.order_id, d.product_id
+        """, {
+            'product_ids': list(stock),
+            'available': list(stock.values()),
+            'order_ids': self.ids,
+            'uid': self.env.uid,
+        })
+        failures = defaultdict(list)
+        for order_id, product_id, quantity, available in self._cr.fetchall():
+            failures[order_id].append((product_id, quantity, available))
+        self.env['shop.stock.move'].invalidate_model()
+        Product.invalidate_model(['quantity', 'stock_move_ids'])
+        return dict(failures)
+
+    def _restock(self):
+        """Remet en stock les quantités des commandes, en une seule insertion"""
+        self.env['shop.stock.move'].create([{
+            'product_id': product_id,
+            'quantity': quantity,
+            'move_type': 'order_cancel',
+            'order_id': order.id,
+        } for order in self for product_id, quantity in order._get_product_quantities().items()])
+
     def action_confirm(self):
         for order in self:
             # Vérifier qu'il y a au moins une ligne
@@ -115,55 +227,66 @@ class ShopOrder(models.Model):
                     "Impossible de confirmer une commande sans ligne de produit."
                 )
 
-            # Vérifier le stock disponible
-            for line in order.line_ids:
-                if line.product_id:
-                    if line.product_id.quantity < line.quantity:
-                        raise exceptions.ValidationError(
-                            f"Stock insuffisant pour le produit '{line.product_id.name}'. "
-                            f"Stock disponible : {line.product_id.quantity}, "
-                            f"Quantité demandée : {line.quantity}"
-                        )
-
-            # Déduire le stock
-            for line in order.line_ids:
-                if line.product_id:
-                    line.product_id.quantity -= line.quantity
-            order.state = 'confirmed'
+        # Réserver le stock de toutes les commandes en une fois (tout ou rien par commande)
+        drafts = self.filtered(lambda o: o.state == 'draft')
+        failures = drafts._reserve_stock()
+        confirmed = drafts.filtered(lambda o: o.id not in failures)
+        confirmed.write({'state': 'confirmed'})
+        if not failures:
+            return True
+
+        messages = []
+        for order in self.browse(list(failures)):
+            for product_id, quantity, available in failures[order.id]:
+                messages.append(
+                    f"{order.name} - '{self.env['shop.product'].browse(product_id).name}' : "
+                    f"stock disponible {available}, quantité demandée {quantity}"
+                )
+        if len(self) == 1:
+            raise exceptions.ValidationError(
+                "Stock insuffisant pour les produits suivants :\n" + "\n".join(messages)
+            )
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': "Stock insuffisant",
+                'message': f"{len(confirmed)} commande(s) confirmée(s), {len(failures)} non confirmée(s) :\n"
+                           + "\n".join(messages[:20]),
+                'type': 'warning',
+                'sticky': True,
+                # Commandes non confirmées (cf. bike.shop.job)
+                'failed_ids': list(failures),
+            },
+        }
 
     def action_invoice(self):
         """Crée la facture"""
-        for order in self:
-            if order.state == 'confirmed':
-                order.state = 'invoiced'
-                order.invoice_date = fields.Datetime.now()
+        self.filtered(lambda o: o.state == 'confirmed').write({
+            'state': 'invoiced',
+            'invoice_date': fields.Datetime.now(),
+        })
 
     def action_done(self):
         """Marque la commande comme livrée"""
-        for order in self:
-            if order.state == 'paid':
-                order.state = 'done'
+        self.filtered(lambda o: o.state == 'paid').write({'state': 'done'})
 
     def action_pay(self):
         """Marque la facture comme payée"""
-        for order in self:
-            if order.state == 'invoiced':
-                order.state = 'paid'
-                order.payment_date = fields.Datetime.now()
+        self.filtered(lambda o: o.state == 'invoiced').write({
+            'state': 'paid',
+            'payment_date': fields.Datetime.now(),
+        })
 
     def action_cancel(self):
-        for order in self:
-            # On ne peut annuler qu'avant facturation
-            if order.state not in ['draft', 'confirmed']:
-                raise exceptions.ValidationError(
-                    "Impossible d'annuler une commande déjà facturée, payée ou livrée."
-                )
-            # Remettre le stock si annulé depuis confirmé
-            if order.state == 'confirmed':
-                for line in order.line_ids:
-                    if line.product_id:
-                        line.product_id.quantity += line.quantity
-            order.state = 'cancelled'
+        # On ne peut annuler qu'avant facturation
+        if any(order.state not in ['draft', 'confirmed'] for order in self):
+            raise exceptions.ValidationError(
+                "Impossible d'annuler une commande déjà facturée, payée ou livrée."
+            )
+        # Remettre le stock des commandes confirmées, en une seule fois
+        self.filtered(lambda o: o.state == 'confirmed')._restock()
+        self.write({'state': 'cancelled'})
 
     def action_draft(self):
         for order in self:
@@ -175,12 +298,59 @@ class ShopOrderLine(models.Model):
     _name = 'shop.order.line'
     _description = 'Ligne de Commande'
 
-    order_id = fields.Many2one('shop.order', string='Commande', required=True, ondelete='cascade')
-    product_id = fields.Many2one('shop.product', string='Produit', required=True)
+    order_id = fields.Many2one('shop.order', string='Commande', required=True, ondelete='cascade', index=True)
+    product_id = fields.Many2one('shop.product', string='Produit', required=True, index=True)
     quantity = fields.Integer(string='Quantité', required=True, default=1)
     unit_price = fields.Float(string='Prix unitaire (€)', required=True)
+    # Prix d'achat du produit à la saisie de la ligne (marges du cumul des ventes)
+    unit_cost = fields.Float(string='Coût unitaire (€)', readonly=True)
     subtotal = fields.Float(string='Sous-total (€)', compute='_compute_subtotal', store=True)
 
+    # Champs dont la modification change la contribution au cumul des ventes
+    _REPORTING_FIELDS = {'order_id', 'product_id', 'quantity', 'unit_price', 'unit_cost'}
+
+    def init(self):
+        """Renseigne le coût des lignes antérieures au cumul des ventes"""
+        self._cr.execute("""
+            UPDATE shop_order_line l
+               SET unit_cost = p.cost
+              FROM shop_product p
+             WHERE p.id = l.product_id
+               AND l.unit_cost IS NULL
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Fige le coût du produit et ajoute les lignes au cumul des ventes"""
+        products = self.env['shop.product'].browse(
+            {vals['product_id'] for vals in vals_list if vals.get('product_id') and 'unit_cost' not in vals})
+        costs = {product.id: product.cost for product in products}
+        for vals in vals_list:
+            if 'unit_cost' not in vals:
+                vals['unit_cost'] = costs.get(vals.get('product_id'), 0.0)
+        lines = super().create(vals_list)
+        Report = self.env['shop.sales.report']
+        Report._apply_contributions({}, Report._get_contributions(lines))
+        return lines
+
+    def write(self, vals):
+        """Met à jour le cumul des ventes ; un changement de produit reprend son coût"""
+        if 'product_id' in vals and 'unit_cost' not in vals:
+            vals = dict(vals, unit_cost=self.env['shop.product'].browse(vals['product_id']).cost)
+        if not self._REPORTING_FIELDS & set(vals):
+            return super().write(vals)
+        Report = self.env['shop.sales.report']
+        contributions_before = Report._get_contributions(self)
+        res = super().write(vals)
+        Report._apply_contributions(contributions_before, Report._get_contributions(self))
+        return res
+
+    def unlink(self):
+        """Retranche les lignes du cumul des ventes"""
+        Report = self.env['shop.sales.report']
+        Report._apply_contributions(Report._get_contributions(self), {})
+        return super().unlink()
+
     @api.depends('quantity', 'unit_price')
     def _compute_subtotal(self):
         for line in self:
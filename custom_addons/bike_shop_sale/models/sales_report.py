@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from odoo import models, fields, api
+
+# Contribution vide d'une clé : (lignes, quantité, chiffre d'affaires, coût, marge)
+EMPTY_CONTRIBUTION = (0, 0, 0.0, 0.0, 0.0)
+
+
+class ShopSalesReport(models.Model):
+    """Cumul journalier des ventes (table de synthèse).
+
+    Une ligne par (jour, produit, type de produit, état de commande),
+    maintenue incrémentalement par shop.order et shop.order.line : chaque
+    modification ajoute la contribution nouvelle et retranche l'ancienne. Le
+    coût est celui enregistré sur la ligne (unit_cost) : un changement de prix
+    d'achat ne modifie pas les marges passées.
+    """
+    _name = 'shop.sales.report'
+    _description = 'Cumul Journalier des Ventes'
+    _auto = False
+    _order = 'day desc'
+
+    day = fields.Date(string='Jour', readonly=True)
+    product_id = fields.Many2one('shop.product', string='Produit', readonly=True)
+    product_type = fields.Selection([
+        ('bike', 'Vélo'),
+        ('accessory', 'Accessoire'),
+        ('part', 'Pièce Détachée'),
+    ], string='Type de Produit', readonly=True)
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('confirmed', 'Confirmé'),
+        ('done', 'Terminé'),
+        ('invoiced', 'Facturé'),
+        ('paid', 'Payé'),
+        ('cancelled', 'Annulé'),
+    ], string='État', readonly=True)
+    line_count = fields.Integer(string='Nombre de Lignes', readonly=True)
+    quantity = fields.Integer(string='Quantité', readonly=True)
+    revenue = fields.Float(string="Chiffre d'Affaires (€)", readonly=True)
+    cost = fields.Float(string='Coût (€)', readonly=True)
+    margin = fields.Float(string='Marge (€)', readonly=True)
+
+    def init(self):
+        """Crée la table de cumul et la remplit à l'installation"""
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS shop_sales_report (
+                id serial PRIMARY KEY,
+                day date NOT NULL,
+                product_id integer,
+                product_type varchar,
+                state varchar NOT NULL,
+                line_count integer NOT NULL DEFAULT 0,
+                quantity integer NOT NULL DEFAULT 0,
+                revenue double precision NOT NULL DEFAULT 0,
+                cost double precision NOT NULL DEFAULT 0,
+                margin double precision NOT NULL DEFAULT 0,
+                CONSTRAINT shop_sales_report_key
+                    UNIQUE NULLS NOT DISTINCT (day, product_id, product_type, state)
+            )
+        """)
+        # Changement de type d'un produit
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS shop_sales_report_product_idx
+            ON shop_sales_report (product_id)
+        """)
+        self._cr.execute("SELECT 1 FROM shop_sales_report LIMIT 1")
+        if not self._cr.fetchone():
+            self._rebuild()
+
+    @api.model
+    def _rebuild(self):
+        """Recalcule entièrement le cumul à partir des lignes de commande"""
+        self.env['shop.order'].flush_model()
+        self.env['shop.order.line'].flush_model()
+        self.env['shop.product'].flush_model(['product_type', 'cost'])
+        self._cr.execute("DELETE FROM shop_sales_report")
+        self._cr.execute("""
+            INSERT INTO shop_sales_report (
+                day, product_id, product_type, state,
+                line_count, quantity, revenue, cost, margin
+            )
+            SELECT o.date,
+                   l.product_id,
+                   p.product_type,
+                   o.state,
+                   COUNT(*),
+                   COALESCE(SUM(l.quantity), 0),
+                   COALESCE(SUM(l.subtotal), 0),
+                   COALESCE(SUM(l.quantity * COALESCE(l.unit_cost, p.cost, 0)), 0),
+                   COALESCE(SUM(l.subtotal - l.quantity * COALESCE(l.unit_cost, p.cost, 0)), 0)
+              FROM shop_order_line l
+              JOIN shop_order o ON o.id = l.order_id
+              LEFT JOIN shop_product p ON p.id = l.product_id
+             WHERE o.date IS NOT NULL
+             GROUP BY 1, 2, 3, 4
+        """)
+        self.invalidate_model()
+
+    @api.model
+    def _get_contributions(self, lines):
+        """Retourne la contribution de chaque ligne de commande au cumul, par clé"""
+        contributions = defaultdict(lambda: list(EMPTY_CONTRIBUTION))
+        for line in lines:
+            if not line.order_id.date:
+                continue
+            key = (line.order_id.date, line.product_id.id or None,
+                   line.product_id.product_type or None, line.order_id.state)
+            cost = line.quantity * line.unit_cost
+            values = contributions[key]
+            values[0] += 1
+            values[1] += line.quantity
+            values[2] += line.subtotal
+            values[3] += cost
+            values[4] += line.subtotal - cost
+        return contributions
+
+    @api.model
+    def _apply_contributions(self, before, after):
+        """Ajoute au cumul la différence entre deux contributions (upsert additif)"""
+        deltas = {}
+        for key in set(before) | set(after):
+            old = before.get(key, EMPTY_CONTRIBUTION)
+            new = after.get(key, EMPTY_CONTRIBUTION)
+            delta = [n - o for n, o in zip(new, old)]
+            if any(delta):
+                deltas[key] = delta
+        if not deltas:
+            return
+        keys, values = list(deltas), list(deltas.values())
+        self._cr.execute("""
+            INSERT INTO shop_sales_report AS r (
+                day, product_id, product_type, state,
+                line_count, quantity, revenue, cost, margin
+            )
+            SELECT * FROM unnest(
+                %s::date[], %s::int[], %s::varchar[], %s::varchar[],
+                %s::int[], %s::int[], %s::float8[], %s::float8[], %s::float8[]
+            )
+            ON CONFLICT ON CONSTRAINT shop_sales_report_key DO UPDATE
+               SET line_count = r.line_count + EXCLUDED.line_count,
+                   quantity = r.quantity + EXCLUDED.quantity,
+                   revenue = r.revenue + EXCLUDED.revenue,
+                   cost = r.cost + EXCLUDED.cost,
+                   margin = r.margin + EXCLUDED.margin
+        """, [[key[i] for key in keys] for i in range(4)] + [[value[i] for value in values] for i in range(5)])
+        self._cr.execute("""
+            DELETE FROM shop_sales_report
+             WHERE day = ANY(%s::date[]) AND line_count <= 0
+        """, [list({key[0] for key in keys})])
+        self.invalidate_model()
+
+    @api.model
+    def _move_product_type(self, products, product_type):
+        """Reclasse le cumul de products sous leur nouveau type (une requête, produit inclus dans la clé)"""
+        if not products:
+            return
+        self._cr.execute("""
+            UPDATE shop_sales_report SET product_type = %s WHERE product_id IN %s
+        """, [product_type, tuple(products.ids)])
+        self.invalidate_model(['product_type'])
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+from odoo import models, fields, api, exceptions
+
+_logger = logging.getLogger(__name__)
+
+
+class ShopStockMove(models.Model):
+    """Mouvement de stock (journal en ajout seul)"""
+    _name = 'shop.stock.move'
+    _description = 'Mouvement de Stock'
+    _order = 'date desc, id desc'
+
+    product_id = fields.Many2one('shop.product', string='Produit', required=True, ondelete='cascade')
+    date = fields.Datetime(string='Date', required=True, default=fields.Datetime.now, readonly=True)
+    quantity = fields.Integer(string='Quantité', required=True,
+                              help="Positive pour une entrée en stock, négative pour une sortie.")
+    move_type = fields.Selection([
+        ('order_confirm', 'Confirmation de commande'),
+        ('order_cancel', 'Annulation de commande'),
+        ('receipt', 'Réception'),
+        ('adjustment', 'Ajustement'),
+    ], string='Type', required=True, default='receipt')
+    order_id = fields.Many2one('shop.order', string='Commande', ondelete='set null', readonly=True)
+    note = fields.Char(string='Note')
+
+    def init(self):
+        """Index couvrant pour le calcul du stock et reprise des stocks existants"""
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS shop_stock_move_product_date_idx
+            ON shop_stock_move (product_id, date) INCLUDE (quantity)
+        """)
+        # Première installation du journal : le stock stocké sur le produit devient
+        # un ajustement initial
+        self._cr.execute("""
+            SELECT 1 FROM information_schema.columns
+             WHERE table_name = 'shop_product' AND column_name = 'quantity'
+        """)
+        if self._cr.fetchone():
+            self._cr.execute("SELECT 1 FROM shop_stock_move LIMIT 1")
+            if not self._cr.fetchone():
+                self._cr.execute("""
+                    INSERT INTO shop_stock_move (product_id, date, quantity, move_type, note)
+                    SELECT id, now() AT TIME ZONE 'UTC', quantity, 'adjustment', 'Stock initial'
+                      FROM shop_product
+                     WHERE COALESCE(quantity, 0) != 0
+                """)
+
+    @api.constrains('quantity')
+    def _check_quantity(self):
+        """Vérifie qu'un mouvement n'est pas vide"""
+        for move in self:
+            if not move.quantity:
+                raise exceptions.ValidationError(
+                    "La quantité d'un mouvement de stock ne peut pas être nulle."
+                )
+
+    def write(self, vals):
+        """Le journal est en ajout seul"""
+        raise exceptions.UserError(
+            "Un mouvement de stock ne peut pas être modifié. Enregistrez un ajustement."
+        )
+
+    def unlink(self):
+        """Le journal est en ajout seul"""
+        raise exceptions.UserError(
+            "Un mouvement de stock ne peut pas être supprimé. Enregistrez un ajustement."
+        )
+
+    @api.model
+    def _register(self, move_type, quantities, order=None, sign=1):
+        """Enregistre en une fois des mouvements pour plusieurs produits.
+
+        :param quantities: dict {product_id: quantité}
+        :param sign: -1 pour une sortie de stock
+        """
+        vals_list = [{
+            'product_id': product_id,
+            'quantity': sign * quantity,
+            'move_type': move_type,
+            'order_id': order.id if order else False,
+        } for product_id, quantity in quantities.items() if quantity]
+        return self.create(vals_list)
+
+    @api.model
+    def _cron_compact(self):
+        """Replie les mouvements anciens dans des instantanés par produit"""
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'bike_shop_sale.stock_compaction_days', 90))
+        cutoff = fields.Datetime.now() - timedelta(days=days)
+        self.flush_model()
+        # Les mouvements antérieurs au dernier instantané ont déjà été repliés :
+        # le nouvel instantané vaut le précédent plus les mouvements supprimés.
+        self._cr.execute("""
+            WITH folded AS (
+                DELETE FROM shop_stock_move
+                 WHERE date < %(cutoff)s
+             RETURNING product_id, quantity
+            ),
+            totals AS (
+                SELECT product_id, SUM(quantity) AS quantity
+                  FROM folded
+                 GROUP BY product_id
+            )
+            INSERT INTO shop_stock_snapshot (product_id, date, quantity)
+            SELECT t.product_id, %(cutoff)s, COALESCE(s.quantity, 0) + t.quantity
+              FROM totals t
+              LEFT JOIN LATERAL (
+                    SELECT quantity
+                      FROM shop_stock_snapshot
+                     WHERE product_id = t.product_id
+                     ORDER BY date DESC
+                     LIMIT 1
+              ) s ON true
+        """, {'cutoff': cutoff})
+        _logger.info("Stock : %s instantané(s) créé(s) au %s", self._cr.rowcount, cutoff)
+        self.invalidate_model()
+        self.env['shop.stock.snapshot'].invalidate_model()
+        self.env['shop.product'].invalidate_model(['quantity'])
+
+
+class ShopStockSnapshot(models.Model):
+    """Instantané du stock d'un produit (cumul des mouvements antérieurs à la date)"""
+    _name = 'shop.stock.snapshot'
+    _description = 'Instantané de Stock'
+    _order = 'date desc'
+    _log_access = False
+
+    product_id = fields.Many2one('shop.product', string='Produit', required=True, ondelete='cascade', readonly=True)
+    date = fields.Datetime(string='Date', required=True, readonly=True)
+    quantity = fields.Integer(string='Quantité', readonly=True)
+
+    def init(self):
+        """Index couvrant pour retrouver le dernier instantané d'un produit"""
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS shop_stock_snapshot_product_date_idx
+            ON shop_stock_snapshot (product_id, date DESC) INCLUDE (quantity)
+        """)
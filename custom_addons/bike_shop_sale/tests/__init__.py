@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from . import test_query_plans
+from . import test_stock_concurrency
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from odoo.addons.bike_shop_rental.tests.common import BikeShopDatasetCase
+
+
+@tagged('post_install', '-at_install')
+class TestQueryPlans(BikeShopDatasetCase):
+    """Les requêtes chaudes de la vente sont servies par des index"""
+    dataset = {'bikes': 50, 'rentals_per_bike': 10, 'years': 1, 'products': 200, 'orders': 3000}
+
+    def test_product_unlink(self):
+        product = self.env['shop.order.line'].search([('order_id.state', '=', 'confirmed')], limit=1).product_id
+        with self.capture_queries() as queries, self.assertRaises(ValidationError):
+            product.unlink()
+        plan = self.explain(*self.find_query(queries, '"shop_order_line"', 'GROUP BY'))
+        self.assertIndexScan(plan, 'shop_order_line')
+
+    def test_report_group_by(self):
+        product = self.env['shop.order.line'].search([], limit=1).product_id
+        with self.capture_queries() as queries:
+            self.env['shop.sales.report']._read_group([('product_id', '=', product.id)], ['state'], ['revenue:sum'])
+        self.assertIndexScan(self.explain(*self.find_query(queries, 'GROUP BY')), 'shop_sales_report')
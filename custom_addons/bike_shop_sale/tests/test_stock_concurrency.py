@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from odoo import api, SUPERUSER_ID
+from odoo.exceptions import ValidationError
+from odoo.service.model import retrying
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestStockConcurrency(TransactionCase):
+    """Confirmations simultanées sur un produit en stock faible.
+
+    Les données sont validées dans des curseurs séparés (les deux workers
+    ne voient pas la transaction du test) puis supprimées à la fin.
+    """
+    STOCK = 4
+    ORDERS_PER_WORKER = 5
+
+    def setUp(self):
+        super().setUp()
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            product = env['shop.product'].create({
+                'name': 'Chambre à air (test de concurrence)',
+                'product_type': 'part',
+                'price': 8.0,
+                'state': 'confirmed',
+            })
+            env['shop.stock.move']._register('receipt', {product.id: self.STOCK})
+            orders = env['shop.order'].create([{
+                'customer_name': 'Client Concurrent',
+                'line_ids': [(0, 0, {'product_id': product.id, 'quantity': 1, 'unit_price': 8.0})],
+            } for _i in range(2 * self.ORDERS_PER_WORKER)])
+            self.product_id, self.order_ids = product.id, orders.ids
+        self.addCleanup(self._delete_data)
+
+    def _delete_data(self):
+        with self.registry.cursor() as cr:
+            cr.execute("DELETE FROM shop_order WHERE id IN %s", [tuple(self.order_ids)])
+            cr.execute("DELETE FROM shop_sales_report WHERE product_id = %s", [self.product_id])
+            cr.execute("DELETE FROM shop_product WHERE id = %s", [self.product_id])
+
+    def _confirm_worker(self, order_ids, barrier, errors):
+        """Confirme les commandes une à une dans son propre curseur, comme un worker HTTP"""
+        try:
+            with self.registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                barrier.wait()
+                for order_id in order_ids:
+                    try:
+                        retrying(env['shop.order'].browse(order_id).action_confirm, env)
+                        cr.commit()
+                    except ValidationError:
+                        # Stock insuffisant : refus attendu une fois le stock épuisé
+                        cr.rollback()
+        except Exception as e:
+            errors.append(e)
+
+    def _job_worker(self, order_ids, barrier, errors):
+        """Confirme les commandes en un lot via un travail en arrière-plan (sans requête HTTP)"""
+        try:
+            with self.registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                job = env['bike.shop.job']._enqueue(env['shop.order'].browse(order_ids), 'action_confirm')
+                # Hors de portée de l'exécuteur : le travail est lancé ici
+                job.write({'state': 'running'})
+                self.job_ids.append(job.id)
+                cr.commit()
+                barrier.wait()
+                job._run()
+        except Exception as e:
+            errors.append(e)
+
+    def _run_workers(self, target):
+        barrier = threading.Barrier(2)
+        errors = []
+        chunks = [self.order_ids[:self.ORDERS_PER_WORKER], self.order_ids[self.ORDERS_PER_WORKER:]]
+        workers = [threading.Thread(target=target, args=(chunk, barrier, errors)) for chunk in chunks]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=60)
+        self.assertFalse(errors)
+        self._assert_stock_sold_out()
+
+    def _assert_stock_sold_out(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            stock = env['shop.product'].get_stock_at(product_ids=[self.product_id])[self.product_id]
+            confirmed = env['shop.order'].search_count([('id', 'in', self.order_ids), ('state', '=', 'confirmed')])
+        self.assertGreaterEqual(stock, 0, "Le stock est devenu négatif")
+        self.assertEqual(confirmed, self.STOCK)
+        self.assertEqual(stock, 0)
+
+    def test_parallel_confirmations_never_oversell(self):
+        self._run_workers(self._confirm_worker)
+
+    def test_parallel_batch_jobs_never_oversell(self):
+        self.job_ids = []
+        self.addCleanup(self._delete_jobs)
+        self._run_workers(self._job_worker)
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            jobs = env['bike.shop.job'].browse(self.job_ids)
+            # Un lot réserve 4 commandes sur 5, l'autre ne réserve rien
+            self.assertEqual(sorted(jobs.mapped('state')), ['failed', 'partial'])
+            self.assertEqual(sum(jobs.mapped('failed_count')), 2 * self.ORDERS_PER_WORKER - self.STOCK)
+
+    def _delete_jobs(self):
+        with self.registry.cursor() as cr:
+            cr.execute("DELETE FROM bike_shop_job WHERE id = ANY(%s)", [self.job_ids])